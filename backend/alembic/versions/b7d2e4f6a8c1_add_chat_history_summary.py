@@ -0,0 +1,29 @@
+"""add_chat_history_summary
+
+Revision ID: b7d2e4f6a8c1
+Revises: 3580c0dcd005
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4f6a8c1'
+down_revision: Union[str, None] = '3580c0dcd005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('history_summary', mysql.LONGTEXT(), nullable=True))
+    op.add_column('chats', sa.Column('summary_until_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chats', 'summary_until_message_id')
+    op.drop_column('chats', 'history_summary')
@@ -0,0 +1,30 @@
+"""add_knowledge_base_tombstone
+
+Revision ID: c4e6a8b0d2f3
+Revises: b7d2e4f6a8c1
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e6a8b0d2f3'
+down_revision: Union[str, None] = 'b7d2e4f6a8c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('knowledge_bases', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('knowledge_bases', sa.Column('deletion_progress', sa.JSON(), nullable=True))
+    op.create_index(op.f('ix_knowledge_bases_deleted_at'), 'knowledge_bases', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_knowledge_bases_deleted_at'), table_name='knowledge_bases')
+    op.drop_column('knowledge_bases', 'deletion_progress')
+    op.drop_column('knowledge_bases', 'deleted_at')
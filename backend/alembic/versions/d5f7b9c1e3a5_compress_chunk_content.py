@@ -0,0 +1,84 @@
+"""compress_chunk_content
+
+Moves chunk text out of document_chunks.chunk_metadata["page_content"]
+into the zlib-compressed compressed_content column, converting existing
+rows in id batches.
+
+Revision ID: d5f7b9c1e3a5
+Revises: c4e6a8b0d2f3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f7b9c1e3a5'
+down_revision: Union[str, None] = 'c4e6a8b0d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+chunks = sa.table(
+    'document_chunks',
+    sa.column('id', sa.String(64)),
+    sa.column('chunk_metadata', sa.JSON()),
+    sa.column('compressed_content', sa.LargeBinary()),
+)
+
+
+def _convert(pending, convert_row) -> None:
+    """Rewrite the rows matched by pending, BATCH_SIZE at a time in id order"""
+    bind = op.get_bind()
+    last_id = ''
+    while True:
+        rows = bind.execute(
+            sa.select(chunks.c.id, chunks.c.chunk_metadata, chunks.c.compressed_content)
+            .where(chunks.c.id > last_id, pending)
+            .order_by(chunks.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        bind.execute(
+            chunks.update()
+            .where(chunks.c.id == sa.bindparam('b_id'))
+            .values(
+                chunk_metadata=sa.bindparam('b_metadata'),
+                compressed_content=sa.bindparam('b_content'),
+            ),
+            [convert_row(row) for row in rows],
+        )
+
+
+def _compress_row(row):
+    metadata = dict(row.chunk_metadata or {})
+    content = metadata.pop('page_content', None)
+    return {
+        'b_id': row.id,
+        'b_metadata': metadata,
+        'b_content': None if content is None else zlib.compress(content.encode('utf-8')),
+    }
+
+
+def _decompress_row(row):
+    metadata = dict(row.chunk_metadata or {})
+    metadata['page_content'] = zlib.decompress(row.compressed_content).decode('utf-8')
+    return {'b_id': row.id, 'b_metadata': metadata, 'b_content': None}
+
+
+def upgrade() -> None:
+    op.add_column('document_chunks', sa.Column('compressed_content', mysql.LONGBLOB(), nullable=True))
+    _convert(chunks.c.compressed_content.is_(None), _compress_row)
+
+
+def downgrade() -> None:
+    _convert(chunks.c.compressed_content.isnot(None), _decompress_row)
+    op.drop_column('document_chunks', 'compressed_content')
@@ -0,0 +1,50 @@
+from typing import Any
+from fastapi import APIRouter, Depends
+from app.models.user import User
+from app.api.api_v1.auth import get_current_superuser
+from app.core.admission import llm_admission, user_rate_limiter, api_key_rate_limiter
+from app.schemas.admission import AdmissionLimitsUpdate, AdmissionStatus, RateLimit
+
+router = APIRouter()
+
+
+def _status() -> AdmissionStatus:
+    return AdmissionStatus(
+        max_concurrent=llm_admission.max_concurrent,
+        max_queue=llm_admission.max_queue,
+        queue_timeout=llm_admission.queue_timeout,
+        user_rate_limit=RateLimit(per_minute=user_rate_limiter.per_minute, burst=user_rate_limiter.burst),
+        api_key_rate_limit=RateLimit(per_minute=api_key_rate_limiter.per_minute, burst=api_key_rate_limiter.burst),
+        active=llm_admission.active,
+        queued=llm_admission.queued,
+    )
+
+
+@router.get("/limits", response_model=AdmissionStatus)
+def get_limits(current_user: User = Depends(get_current_superuser)) -> Any:
+    """
+    Current admission control and rate limit settings, with live queue state.
+    """
+    return _status()
+
+
+@router.put("/limits", response_model=AdmissionStatus)
+def update_limits(
+    *,
+    limits_in: AdmissionLimitsUpdate,
+    current_user: User = Depends(get_current_superuser)
+) -> Any:
+    """
+    Change limits at runtime. Omitted fields keep their current value;
+    changes last until the process restarts.
+    """
+    llm_admission.configure(
+        max_concurrent=limits_in.max_concurrent or llm_admission.max_concurrent,
+        max_queue=llm_admission.max_queue if limits_in.max_queue is None else limits_in.max_queue,
+        queue_timeout=llm_admission.queue_timeout if limits_in.queue_timeout is None else limits_in.queue_timeout,
+    )
+    if limits_in.user_rate_limit:
+        user_rate_limiter.configure(limits_in.user_rate_limit.per_minute, limits_in.user_rate_limit.burst)
+    if limits_in.api_key_rate_limit:
+        api_key_rate_limiter.configure(limits_in.api_key_rate_limit.per_minute, limits_in.api_key_rate_limit.burst)
+    return _status()
@@ -1,12 +1,15 @@
+import json
 from typing import List, Any
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
-from app.db.session import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.db.session import AsyncSessionLocal, get_async_db
 from app.models.user import User
 from app.models.chat import Chat, Message
 from app.models.knowledge import KnowledgeBase
-from app.schemas.chat import AgentRequest
+from app.schemas.chat import AgentBatchRequest, AgentRequest
 from app.schemas.chat import (
     ChatCreate,
     ChatResponse,
@@ -14,26 +17,52 @@ from app.schemas.chat import (
     MessageCreate,
     MessageResponse
 )
-from app.services.chat_service import generate_response
+from app.services.chat_service import (
+    BatchQuestion,
+    answer_questions,
+    generate_response,
+    searchable_knowledge_base_ids,
+)
+from app.services.chat_history import to_langchain_messages, window_messages
+from app.core.config import settings
+from app.core.admission import api_key_rate_limiter, client_address, llm_slot, user_rate_limiter
+from app.core.security import api_key_bucket, api_key_header, get_api_key_user
 from fastapi.responses import JSONResponse
 import os
 
 router = APIRouter()
 CHAT_ID = int(os.environ.get("CHAT_ID", "1"))  # Set a default/fallback chat_id for testing
 
+async def _get_agent_chat(db: AsyncSession) -> Chat:
+    result = await db.execute(
+        select(Chat)
+        .options(selectinload(Chat.knowledge_bases))
+        .where(Chat.id == CHAT_ID)
+    )
+    return result.scalars().first()
+
+
+def check_agent_rate_limit(request: Request, request_data: AgentRequest) -> None:
+    """
+    The agent endpoint is unauthenticated, so rate limit by client address;
+    the ids in the body only split that address's traffic further
+    """
+    address = client_address(request)
+    user_rate_limiter.check(f"agent:{address}")
+    if request_data.userId or request_data.appId:
+        user_rate_limiter.check(f"agent:{address}:{request_data.appId}:{request_data.userId}")
+
+
 @router.post("/agentRequest")
 async def test_agent_message(
     *,
-    db: Session = Depends(get_db),
-    request_data: AgentRequest
+    db: AsyncSession = Depends(get_async_db),
+    request_data: AgentRequest,
+    _limit: None = Depends(check_agent_rate_limit),
+    _slot: None = Depends(llm_slot)
 ):
     chat_id = CHAT_ID
-    chat = (
-        db.query(Chat)
-        .options(joinedload(Chat.knowledge_bases))
-        .filter(Chat.id == chat_id)
-        .first()
-    )
+    chat = await _get_agent_chat(db)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -58,11 +87,98 @@ async def test_agent_message(
             messages={"messages": full_messages},
             knowledge_base_ids=knowledge_base_ids,
             chat_id=chat_id,
-            db=db
+            db=db,
+            mmr_lambda=request_data.mmrLambda,
+            mmr_fetch_k=request_data.mmrFetchK,
         ):
         response_content += chunk
 
     return JSONResponse(content={"reply": response_content})
 
 
+def check_agent_batch_rate_limit(
+    request_data: AgentBatchRequest,
+    api_key: str = Security(api_key_header),
+    _user: User = Depends(get_api_key_user),
+) -> None:
+    """
+    Batches need an API key and cost one token of its rate limit per item,
+    so a batch draws on the key's limit like the same number of requests
+    """
+    if len(request_data.items) > settings.AGENT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may hold at most {settings.AGENT_BATCH_MAX_ITEMS} items",
+        )
+    api_key_rate_limiter.check(api_key_bucket(api_key), cost=len(request_data.items))
+
+
+@router.post("/agentRequest/batch")
+async def batch_agent_messages(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    request_data: AgentBatchRequest,
+    _limit: None = Depends(check_agent_batch_rate_limit),
+):
+    """
+    Answer many agent requests in one call. Needs an X-API-Key header.
+
+    Results stream back as NDJSON, one line per item in completion order:
+    {"index", "appId", "sessionId", "userId", "reply"} or, if the item
+    failed, "error" instead of "reply". Retrieval is batched across items
+    and generation runs with bounded concurrency under LLM admission
+    control, so a batch does not hold a single slot for its whole duration.
+    """
+    chat = await _get_agent_chat(db)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    kb_ids = await searchable_knowledge_base_ids(db, [kb.id for kb in chat.knowledge_bases])
+    items = request_data.items
+    questions = [
+        BatchQuestion(
+            query=item.message,
+            chat_history=to_langchain_messages(window_messages(
+                [{"role": h.role, "content": h.content} for h in item.history or []]
+            )),
+            mmr_lambda=item.mmrLambda,
+            mmr_fetch_k=item.mmrFetchK,
+        )
+        for item in items
+    ]
+    concurrency = min(request_data.concurrency or settings.AGENT_BATCH_CONCURRENCY, settings.AGENT_BATCH_CONCURRENCY)
+
+    async def results():
+        if not kb_ids:
+            for index in range(len(items)):
+                yield index, "I don't have any knowledge base to help answer your question.", None
+            return
+        async for result in answer_questions(questions, kb_ids, concurrency):
+            yield result
+
+    async def stream():
+        write_db = AsyncSessionLocal()
+        try:
+            async for index, reply, error in results():
+                item = items[index]
+                line = {
+                    "index": index,
+                    "appId": item.appId,
+                    "sessionId": item.sessionId,
+                    "userId": item.userId,
+                }
+                if error is None:
+                    line["reply"] = reply
+                    # Keep the same message log as /agentRequest
+                    write_db.add_all([
+                        Message(content=item.message, role="user", chat_id=CHAT_ID),
+                        Message(content=reply, role="assistant", chat_id=CHAT_ID),
+                    ])
+                    await write_db.commit()
+                else:
+                    line["error"] = error
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            await write_db.close()
 
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.api_v1 import auth, knowledge_base, chat, api_keys, agent
+from app.api.api_v1 import auth, knowledge_base, chat, api_keys, agent, admission
 
 api_router = APIRouter()
 
@@ -7,4 +7,5 @@ api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(knowledge_base.router, prefix="/knowledge-base", tags=["knowledge-base"])
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(api_keys.router, prefix="/api-keys", tags=["api-keys"])
-api_router.include_router(agent.router, prefix="/agent", tags=["agent"])
\ No newline at end of file
+api_router.include_router(agent.router, prefix="/agent", tags=["agent"])
+api_router.include_router(admission.router, prefix="/admission", tags=["admission"])
\ No newline at end of file
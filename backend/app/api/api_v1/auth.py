@@ -9,35 +9,26 @@ from requests.exceptions import RequestException
 
 from app.core import security
 from app.core.config import settings
+from app.core.tracing import traced
 from app.db.session import get_db
 from app.models.user import User
 from app.schemas.token import Token
-from app.schemas.user import UserCreate, UserResponse
+from app.schemas.user import UserActiveUpdate, UserCreate, UserResponse
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+@traced("auth.jwt")
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    return security.authenticate_token(db, token)
+
+def get_current_superuser(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return current_user
 
 @router.post("/register", response_model=UserResponse)
 def register(*, db: Session = Depends(get_db), user_in: UserCreate) -> Any:
@@ -110,3 +101,24 @@ def test_token(current_user: User = Depends(get_current_user)) -> Any:
     Test access token by getting current user.
     """
     return current_user
+
+@router.put("/users/{user_id}/active", response_model=UserResponse)
+def update_user_active(
+    *,
+    db: Session = Depends(get_db),
+    user_id: int,
+    user_in: UserActiveUpdate,
+    current_user: User = Depends(get_current_superuser),
+) -> Any:
+    """
+    Activate or deactivate a user. Deactivation takes effect at once: the
+    user's cached logins and API keys are dropped.
+    """
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.is_active = user_in.is_active
+    db.commit()
+    db.refresh(user)
+    security.invalidate_user_caches(user)
+    return user
@@ -1,23 +1,36 @@
-from typing import List, Any
-from fastapi import APIRouter, Depends, HTTPException
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
-from app.db.session import get_db
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.db.session import get_async_db, get_db
 from app.models.user import User
-from app.models.chat import Chat, Message
+from app.models.chat import Chat, Message, chat_knowledge_bases
 from app.models.knowledge import KnowledgeBase
 from app.schemas.chat import (
     ChatCreate,
     ChatResponse,
     ChatUpdate,
+    ChatMessagesRequest,
+    ChatSummary,
     MessageCreate,
+    MessagePreview,
     MessageResponse
 )
+from app.schemas.pagination import Page
 from app.api.api_v1.auth import get_current_user
+from app.core.admission import llm_slot, rate_limited_user
 from app.services.chat_service import generate_response
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 500
+MESSAGE_PREVIEW_CHARS = 200
+# Separates the base64 context header from the answer in stored bot messages
+RESPONSE_MARKER = "__LLM_RESPONSE__"
+
 @router.post("/", response_model=ChatResponse)
 def create_chat(
     *,
@@ -29,13 +42,12 @@ def create_chat(
     knowledge_bases = (
         db.query(KnowledgeBase)
         .filter(
-            KnowledgeBase.id.in_(chat_in.knowledge_base_ids)
+            KnowledgeBase.id.in_(chat_in.knowledge_base_ids),
+            KnowledgeBase.deleted_at.is_(None)
         )
         .all()
     )
 
-    print("knowledge_bases: ", chat_in)
-    print("data_database: ", knowledge_bases)
     if len(knowledge_bases) != len(chat_in.knowledge_base_ids):
         raise HTTPException(
             status_code=400,
@@ -54,77 +66,173 @@ def create_chat(
     db.refresh(chat)       # Load lại quan hệ knowledge_bases mới
     return chat
 
-@router.get("/", response_model=List[ChatResponse])
+def _chat_summaries(db: Session, query, limit: int) -> Page[ChatSummary]:
+    """
+    Page of chat summaries for a Chat query ordered by id descending.
+
+    Message counts and the last message id come from correlated subqueries,
+    and the knowledge base ids and last message previews are fetched for the
+    whole page at once, so no chat's history is loaded.
+    """
+    message_count = (
+        select(func.count(Message.id))
+        .where(Message.chat_id == Chat.id)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    last_message_id = (
+        select(func.max(Message.id))
+        .where(Message.chat_id == Chat.id)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    rows = (
+        query.with_entities(
+            Chat.id, Chat.title, Chat.user_id, Chat.created_at, Chat.updated_at,
+            message_count.label("message_count"),
+            last_message_id.label("last_message_id"),
+        )
+        .limit(limit + 1)
+        .all()
+    )
+    page = Page.from_rows(rows, limit, cursor_of=lambda row: row.id)
+
+    chat_ids = [row.id for row in page.items]
+    kb_ids: Dict[int, List[int]] = defaultdict(list)
+    if chat_ids:
+        for chat_id, kb_id in db.execute(
+            select(chat_knowledge_bases.c.chat_id, chat_knowledge_bases.c.knowledge_base_id)
+            .where(chat_knowledge_bases.c.chat_id.in_(chat_ids))
+        ):
+            kb_ids[chat_id].append(kb_id)
+
+    last_ids = [row.last_message_id for row in page.items if row.last_message_id]
+    previews = {}
+    if last_ids:
+        # Assistant messages start with the base64 retrieval context; keep the
+        # answer after the marker only
+        preview_text = func.substr(
+            func.substring_index(Message.content, RESPONSE_MARKER, -1), 1, MESSAGE_PREVIEW_CHARS
+        )
+        for message in db.execute(
+            select(Message.id, Message.role, preview_text.label("content"), Message.created_at)
+            .where(Message.id.in_(last_ids))
+        ):
+            previews[message.id] = MessagePreview(**message._mapping)
+
+    return Page[ChatSummary](
+        items=[
+            ChatSummary(
+                id=row.id,
+                title=row.title,
+                user_id=row.user_id,
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+                knowledge_base_ids=sorted(kb_ids[row.id]),
+                message_count=row.message_count,
+                last_message=previews.get(row.last_message_id),
+            )
+            for row in page.items
+        ],
+        next_cursor=page.next_cursor,
+    )
+
+@router.get("/", response_model=Page[ChatSummary])
 def get_chats(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
 ) -> Any:
-    chats = (
-        db.query(Chat)
-        .filter(Chat.user_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    return chats
+    query = db.query(Chat).filter(Chat.user_id == current_user.id)
+    if cursor is not None:
+        query = query.filter(Chat.id < cursor)
+    return _chat_summaries(db, query.order_by(Chat.id.desc()), limit)
 
-@router.get("/{chat_id}", response_model=ChatResponse)
+@router.get("/{chat_id}", response_model=ChatSummary)
 def get_chat(
     *,
     db: Session = Depends(get_db),
     chat_id: int,
     current_user: User = Depends(get_current_user)
 ) -> Any:
-    chat = (
-        db.query(Chat)
-        .filter(
-            Chat.id == chat_id,
-            Chat.user_id == current_user.id
-        )
-        .first()
+    query = db.query(Chat).filter(
+        Chat.id == chat_id,
+        Chat.user_id == current_user.id
     )
+    page = _chat_summaries(db, query, 1)
+    if not page.items:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return page.items[0]
+
+@router.get("/{chat_id}/messages", response_model=Page[MessageResponse])
+def get_chat_messages(
+    *,
+    db: Session = Depends(get_db),
+    chat_id: int,
+    current_user: User = Depends(get_current_user),
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+) -> Any:
+    """
+    Messages of a chat, newest page first. Each page walks further back in
+    the history, while the messages within a page are oldest first.
+    """
+    chat = db.query(Chat.id).filter(
+        Chat.id == chat_id,
+        Chat.user_id == current_user.id
+    ).first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat
+
+    query = db.query(Message).filter(Message.chat_id == chat_id)
+    if cursor is not None:
+        query = query.filter(Message.id < cursor)
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    page = Page[MessageResponse].from_rows(rows, limit, cursor_of=lambda message: message.id)
+    page.items.reverse()
+    return page
 
 from fastapi.responses import JSONResponse
 
 @router.post("/{chat_id}/messages")
 async def create_message(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     chat_id: int,
-    messages: dict,
-    current_user: User = Depends(get_current_user)
+    messages: ChatMessagesRequest,
+    current_user: User = Depends(rate_limited_user(get_current_user)),
+    _slot: None = Depends(llm_slot)
 ):
-    chat = (
-        db.query(Chat)
-        .options(joinedload(Chat.knowledge_bases))
-        .filter(
+    chat = (await db.execute(
+        select(Chat)
+        .options(selectinload(Chat.knowledge_bases))
+        .where(
             Chat.id == chat_id,
             Chat.user_id == current_user.id
         )
-        .first()
-    )
+    )).scalars().first()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
-    last_message = messages["messages"][-1]
-    if last_message["role"] != "user":
+    last_message = messages.messages[-1]
+    if last_message.role != "user":
         raise HTTPException(status_code=400, detail="Last message must be from user")
     
     knowledge_base_ids = [kb.id for kb in chat.knowledge_bases]
 
-    # Accumulate the full response from the async generator
+    # Accumulate the full response from the async generator. Earlier turns
+    # are loaded server-side from the chat's stored messages, so only the
+    # last message of the request is used.
     response_content = ""
     async for chunk in generate_response(
-            query=last_message["content"],
-            messages=messages,
+            query=last_message.content,
+            messages=None,
             knowledge_base_ids=knowledge_base_ids,
             chat_id=chat_id,
-            db=db
+            db=db,
+            mmr_lambda=messages.mmr_lambda,
+            mmr_fetch_k=messages.mmr_fetch_k,
         ):
         response_content += chunk
     
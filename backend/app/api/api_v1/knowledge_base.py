@@ -1,42 +1,60 @@
 import hashlib
-from typing import List, Any, Dict
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
+from collections import defaultdict
+from typing import List, Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from langchain_chroma import Chroma
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, text
 import logging
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import selectinload
 import time
 import asyncio
+import json
 
-from app.db.session import get_db
+from fastapi.concurrency import run_in_threadpool
+from app.db.session import AsyncSessionLocal, get_async_db, get_db
 from app.models.user import User
-from app.core.security import get_current_user
+from app.core.security import AccessibleKnowledgeBases, get_accessible_kbs, get_current_user
 from app.models.knowledge import KnowledgeBase, Document, ProcessingTask, DocumentChunk, DocumentUpload
 from app.schemas.knowledge import (
     KnowledgeBaseCreate,
     KnowledgeBaseResponse,
+    KnowledgeBaseSummary,
     KnowledgeBaseUpdate,
+    DocumentBrief,
     DocumentResponse,
     PreviewRequest
 )
-from app.services.document_processor import process_document_background, upload_document, preview_document, PreviewResult
+from app.schemas.pagination import Page
+from app.services.upload_janitor import upload_janitor
+from app.services.kb_deletion import new_deletion_progress, schedule_deletion
+from app.services.document_processor import process_document_background, upload_document, preview_document, task_state, PreviewResult
 from app.core.config import settings
 from app.core.minio import get_minio_client
+from app.core.pubsub import task_events
+from app.core.tracing import current_link
 from minio.error import MinioException
 from app.services.vector_store import VectorStoreFactory
 from app.services.embedding.embedding_factory import EmbeddingsFactory
+from app.services.retrieval.search import hybrid_retrieve
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+MAX_PAGE_SIZE = 500
+# Documents shown on each knowledge base of a listing
+RECENT_DOCUMENTS = 9
+
 class TestRetrievalRequest(BaseModel):
     query: str
     kb_id: int
     top_k: int
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    mmr_fetch_k: Optional[int] = Field(None, ge=1, le=settings.MMR_MAX_FETCH_K)
 
 @router.post("", response_model=KnowledgeBaseResponse)
 def create_knowledge_base(
@@ -59,26 +77,83 @@ def create_knowledge_base(
     logger.info(f"Knowledge base created: {kb.name} for user {current_user.id}")
     return kb
 
-@router.get("", response_model=List[KnowledgeBaseResponse])
+def _kb_summaries(db: Session, query, limit: int) -> Page[KnowledgeBaseSummary]:
+    """
+    Page of knowledge base summaries for a KnowledgeBase query ordered by id
+    descending. Document counts come from a correlated subquery and the
+    recent documents of the whole page from one windowed query.
+    """
+    document_count = (
+        select(func.count(Document.id))
+        .where(Document.knowledge_base_id == KnowledgeBase.id)
+        .correlate(KnowledgeBase)
+        .scalar_subquery()
+    )
+    rows = (
+        query.with_entities(
+            KnowledgeBase.id, KnowledgeBase.name, KnowledgeBase.description,
+            KnowledgeBase.user_id, KnowledgeBase.created_at, KnowledgeBase.updated_at,
+            document_count.label("document_count"),
+        )
+        .limit(limit + 1)
+        .all()
+    )
+    page = Page.from_rows(rows, limit, cursor_of=lambda row: row.id)
+
+    kb_ids = [row.id for row in page.items]
+    recent: Dict[int, List[DocumentBrief]] = defaultdict(list)
+    if kb_ids:
+        ranked = (
+            select(
+                Document.id, Document.knowledge_base_id, Document.file_name,
+                Document.content_type, Document.created_at,
+                func.row_number().over(
+                    partition_by=Document.knowledge_base_id,
+                    order_by=Document.id.desc()
+                ).label("doc_rank"),
+            )
+            .where(Document.knowledge_base_id.in_(kb_ids))
+            .subquery()
+        )
+        for doc in db.execute(
+            select(ranked)
+            .where(ranked.c.doc_rank <= RECENT_DOCUMENTS)
+            .order_by(ranked.c.knowledge_base_id, ranked.c.doc_rank)
+        ):
+            recent[doc.knowledge_base_id].append(DocumentBrief(
+                id=doc.id,
+                file_name=doc.file_name,
+                content_type=doc.content_type,
+                created_at=doc.created_at,
+            ))
+
+    return Page[KnowledgeBaseSummary](
+        items=[
+            KnowledgeBaseSummary(**row._mapping, recent_documents=recent[row.id])
+            for row in page.items
+        ],
+        next_cursor=page.next_cursor,
+    )
+
+@router.get("", response_model=Page[KnowledgeBaseSummary])
 def get_knowledge_bases(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
 ) -> Any:
     """
     Retrieve knowledge bases.
     """
-    knowledge_bases = (
-        db.query(KnowledgeBase)
-        .filter(KnowledgeBase.user_id == current_user.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
+    query = db.query(KnowledgeBase).filter(
+        KnowledgeBase.user_id == current_user.id,
+        KnowledgeBase.deleted_at.is_(None)
     )
-    return knowledge_bases
+    if cursor is not None:
+        query = query.filter(KnowledgeBase.id < cursor)
+    return _kb_summaries(db, query.order_by(KnowledgeBase.id.desc()), limit)
 
-@router.get("/{kb_id}", response_model=KnowledgeBaseResponse)
+@router.get("/{kb_id}", response_model=KnowledgeBaseSummary)
 def get_knowledge_base(
     *,
     db: Session = Depends(get_db),
@@ -86,27 +161,42 @@ def get_knowledge_base(
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
-    Get knowledge base by ID.
+    Get knowledge base by ID. Its documents are listed by
+    GET /{kb_id}/documents.
     """
-    from sqlalchemy.orm import joinedload
-    
-    kb = (
-        db.query(KnowledgeBase)
-        .options(
-            joinedload(KnowledgeBase.documents)
-            .joinedload(Document.processing_tasks)
-        )
-        .filter(
-            KnowledgeBase.id == kb_id,
-            KnowledgeBase.user_id == current_user.id
-        )
-        .first()
+    query = db.query(KnowledgeBase).filter(
+        KnowledgeBase.id == kb_id,
+        KnowledgeBase.user_id == current_user.id,
+        KnowledgeBase.deleted_at.is_(None)
     )
-
-    if not kb:
+    page = _kb_summaries(db, query, 1)
+    if not page.items:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
-    
-    return kb
+    return page.items[0]
+
+@router.get("/{kb_id}/documents", response_model=Page[DocumentResponse])
+def get_kb_documents(
+    *,
+    db: Session = Depends(get_db),
+    kb_id: int,
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs),
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+) -> Any:
+    """
+    List a knowledge base's documents with their processing tasks, newest
+    first.
+    """
+    accessible_kbs.check(kb_id)
+    query = (
+        db.query(Document)
+        .options(selectinload(Document.processing_tasks))
+        .filter(Document.knowledge_base_id == kb_id)
+    )
+    if cursor is not None:
+        query = query.filter(Document.id < cursor)
+    rows = query.order_by(Document.id.desc()).limit(limit + 1).all()
+    return Page[DocumentResponse].from_rows(rows, limit, cursor_of=lambda doc: doc.id)
 
 @router.put("/{kb_id}", response_model=KnowledgeBaseResponse)
 def update_knowledge_base(
@@ -121,7 +211,8 @@ def update_knowledge_base(
     """
     kb = db.query(KnowledgeBase).filter(
         KnowledgeBase.id == kb_id,
-        KnowledgeBase.user_id == current_user.id
+        KnowledgeBase.user_id == current_user.id,
+        KnowledgeBase.deleted_at.is_(None)
     ).first()
     
     if not kb:
@@ -136,7 +227,7 @@ def update_knowledge_base(
     logger.info(f"Knowledge base updated: {kb.name} for user {current_user.id}")
     return kb
 
-@router.delete("/{kb_id}")
+@router.delete("/{kb_id}", status_code=202)
 async def delete_knowledge_base(
     *,
     db: Session = Depends(get_db),
@@ -145,90 +236,68 @@ async def delete_knowledge_base(
 ) -> Any:
     """
     Delete knowledge base and all associated resources.
+
+    The knowledge base is hidden at once and removed by a background job;
+    GET /{kb_id}/deletion reports its progress until it is gone.
     """
-    logger = logging.getLogger(__name__)
-    
     kb = (
         db.query(KnowledgeBase)
         .filter(
             KnowledgeBase.id == kb_id,
-            KnowledgeBase.user_id == current_user.id
+            KnowledgeBase.user_id == current_user.id,
+            KnowledgeBase.deleted_at.is_(None)
         )
         .first()
     )
     if not kb:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
-    
-    try:
-        # Get all document file paths before deletion
-        document_paths = [doc.file_path for doc in kb.documents]
-        
-        # Initialize services
-        minio_client = get_minio_client()
-        embeddings = EmbeddingsFactory.create()
 
-        vector_store = VectorStoreFactory.create(
-            store_type=settings.VECTOR_STORE_TYPE,
-            collection_name=f"kb_{kb_id}",
-            embedding_function=embeddings,
+    kb.deleted_at = datetime.utcnow()
+    kb.deletion_progress = new_deletion_progress()
+    db.commit()
+
+    schedule_deletion(kb_id)
+    logger.info(f"Knowledge base {kb_id} tombstoned for user {current_user.id}")
+    return {
+        "message": "Knowledge base deletion started",
+        "status_url": f"{settings.API_V1_STR}/knowledge-base/{kb_id}/deletion"
+    }
+
+@router.get("/{kb_id}/deletion")
+def get_knowledge_base_deletion(
+    *,
+    db: Session = Depends(get_db),
+    kb_id: int,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Progress of a knowledge base deletion; 404 once it has finished.
+    """
+    kb = (
+        db.query(KnowledgeBase.deleted_at, KnowledgeBase.deletion_progress)
+        .filter(
+            KnowledgeBase.id == kb_id,
+            KnowledgeBase.user_id == current_user.id,
+            KnowledgeBase.deleted_at.isnot(None)
         )
-        
-        # Clean up external resources first
-        cleanup_errors = []
-        
-        # 1. Clean up MinIO files
-        try:
-            # Delete all objects with prefix kb_{kb_id}/
-            objects = minio_client.list_objects(settings.MINIO_BUCKET_NAME, prefix=f"kb_{kb_id}/")
-            for obj in objects:
-                minio_client.remove_object(settings.MINIO_BUCKET_NAME, obj.object_name)
-            logger.info(f"Cleaned up MinIO files for knowledge base {kb_id}")
-        except MinioException as e:
-            cleanup_errors.append(f"Failed to clean up MinIO files: {str(e)}")
-            logger.error(f"MinIO cleanup error for kb {kb_id}: {str(e)}")
-        
-        # 2. Clean up vector store
-        try:
-            vector_store._store.delete_collection(f"kb_{kb_id}")
-            logger.info(f"Cleaned up vector store for knowledge base {kb_id}")
-        except Exception as e:
-            cleanup_errors.append(f"Failed to clean up vector store: {str(e)}")
-            logger.error(f"Vector store cleanup error for kb {kb_id}: {str(e)}")
-        
-        # Finally, delete database records in a single transaction
-        db.delete(kb)
-        db.commit()
-        
-        # Report any cleanup errors in the response
-        if cleanup_errors:
-            return {
-                "message": "Knowledge base deleted with cleanup warnings",
-                "warnings": cleanup_errors
-            }
-        
-        return {"message": "Knowledge base and all associated resources deleted successfully"}
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Failed to delete knowledge base {kb_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to delete knowledge base: {str(e)}")
+        .first()
+    )
+    if not kb:
+        raise HTTPException(status_code=404, detail="Knowledge base deletion not found")
+    return {"kb_id": kb_id, "deleted_at": kb.deleted_at, **(kb.deletion_progress or {})}
 
 # Batch upload documents
 @router.post("/{kb_id}/documents/upload")
 async def upload_kb_documents(
     kb_id: int,
     files: List[UploadFile],
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ):
     """
     Upload multiple documents to MinIO.
     """
-    kb = db.query(KnowledgeBase).filter(
-        KnowledgeBase.id == kb_id,
-        KnowledgeBase.user_id == current_user.id
-    ).first()
-    if not kb:
-        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    accessible_kbs.check(kb_id)
     
     results = []
     for file in files:
@@ -260,7 +329,8 @@ async def upload_kb_documents(
         try:
             minio_client = get_minio_client()
             file_size = len(file_content)  # 使用之前读取的文件内容长度
-            minio_client.put_object(
+            await run_in_threadpool(
+                minio_client.put_object,
                 bucket_name=settings.MINIO_BUCKET_NAME,
                 object_name=temp_path,
                 data=file.file,
@@ -281,8 +351,7 @@ async def upload_kb_documents(
             temp_path=temp_path
         )
         db.add(upload)
-        db.commit()
-        db.refresh(upload)
+        await db.commit()
         
         results.append({
             "upload_id": upload.id,
@@ -299,26 +368,26 @@ async def preview_kb_documents(
     kb_id: int,
     preview_request: PreviewRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ) -> Dict[int, PreviewResult]:
     """
     Preview multiple documents' chunks.
     """
+    # Ownership is checked once for the knowledge base, not per document
+    accessible_kbs.check(kb_id)
     results = {}
     for doc_id in preview_request.document_ids:
-        document = db.query(Document).join(KnowledgeBase).filter(
+        document = db.query(Document).filter(
             Document.id == doc_id,
-            Document.knowledge_base_id == kb_id,
-            KnowledgeBase.user_id == current_user.id
+            Document.knowledge_base_id == kb_id
         ).first()
         
         if document:
             file_path = document.file_path
         else:
-            upload = db.query(DocumentUpload).join(KnowledgeBase).filter(
+            upload = db.query(DocumentUpload).filter(
                 DocumentUpload.id == doc_id,
-                DocumentUpload.knowledge_base_id == kb_id,
-                KnowledgeBase.user_id == current_user.id
+                DocumentUpload.knowledge_base_id == kb_id
             ).first()
             
             if not upload:
@@ -341,20 +410,14 @@ async def process_kb_documents(
     upload_results: List[dict],
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ):
     """
     Process multiple documents asynchronously.
     """
     start_time = time.time()
     
-    kb = db.query(KnowledgeBase).filter(
-        KnowledgeBase.id == kb_id,
-        KnowledgeBase.user_id == current_user.id
-    ).first()
-    
-    if not kb:
-        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    accessible_kbs.check(kb_id)
     
     task_info = []
     upload_ids = []
@@ -411,12 +474,13 @@ async def process_kb_documents(
     background_tasks.add_task(
         add_processing_tasks_to_queue,
         task_data,
-        kb_id
+        kb_id,
+        current_link()
     )
     
     return {"tasks": task_info}
 
-async def add_processing_tasks_to_queue(task_data, kb_id):
+async def add_processing_tasks_to_queue(task_data, kb_id, trace_parent=None):
     """Helper function to add document processing tasks to the queue without blocking the main response."""
     for data in task_data:
         asyncio.create_task(
@@ -425,82 +489,156 @@ async def add_processing_tasks_to_queue(task_data, kb_id):
                 data["file_name"],
                 kb_id,
                 data["task_id"],
-                None
+                None,
+                trace_parent=trace_parent
             )
         )
     logger.info(f"Added {len(task_data)} document processing tasks to queue")
 
 @router.post("/cleanup")
 async def cleanup_temp_files(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Clean up expired temporary files.
+    Clean up expired temporary files now instead of waiting for the janitor.
     """
-    expired_time = datetime.utcnow() - timedelta(hours=24)
-    expired_uploads = db.query(DocumentUpload).filter(
-        DocumentUpload.created_at < expired_time
-    ).all()
-    
-    minio_client = get_minio_client()
-    for upload in expired_uploads:
-        try:
-            minio_client.remove_object(
-                bucket_name=settings.MINIO_BUCKET_NAME,
-                object_name=upload.temp_path
-            )
-        except MinioException as e:
-            logger.error(f"Failed to delete temp file {upload.temp_path}: {str(e)}")
-        
-        db.delete(upload)
-    
-    db.commit()
-    
-    return {"message": f"Cleaned up {len(expired_uploads)} expired uploads"}
+    result = await asyncio.to_thread(upload_janitor.sweep)
+    return {
+        "message": f"Cleaned up {result.expired_uploads} expired uploads",
+        "expired_uploads": result.expired_uploads,
+        "orphaned_objects": result.orphaned_objects
+    }
+
+def _parse_task_ids(task_ids: str) -> List[int]:
+    return [int(id.strip()) for id in task_ids.split(",")]
+
+async def _load_task_states(db: AsyncSession, kb_id: int, task_ids: List[int]) -> Dict[int, Dict]:
+    tasks = (await db.execute(
+        select(ProcessingTask)
+        .options(
+            selectinload(ProcessingTask.document_upload)
+        )
+        .where(
+            ProcessingTask.id.in_(task_ids),
+            ProcessingTask.knowledge_base_id == kb_id
+        )
+    )).scalars().all()
+    return {
+        task.id: task_state(
+            task.id,
+            task.status,
+            upload_id=task.document_upload_id,
+            file_name=task.document_upload.file_name if task.document_upload else None,
+            document_id=task.document_id,
+            error_message=task.error_message,
+        )
+        for task in tasks
+    }
 
 @router.get("/{kb_id}/documents/tasks")
 async def get_processing_tasks(
     kb_id: int,
     task_ids: str = Query(..., description="Comma-separated list of task IDs to check status for"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ):
     """
     Get status of multiple processing tasks.
     """
-    task_id_list = [int(id.strip()) for id in task_ids.split(",")]
-    
-    kb = db.query(KnowledgeBase).filter(
-        KnowledgeBase.id == kb_id,
-        KnowledgeBase.user_id == current_user.id
-    ).first()
+    task_id_list = _parse_task_ids(task_ids)
     
-    if not kb:
-        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    accessible_kbs.check(kb_id)
         
-    tasks = (
-        db.query(ProcessingTask)
-        .options(
-            selectinload(ProcessingTask.document_upload)
-        )
-        .filter(
-            ProcessingTask.id.in_(task_id_list),
-            ProcessingTask.knowledge_base_id == kb_id
-        )
-        .all()
+    return await _load_task_states(db, kb_id, task_id_list)
+
+@router.get("/{kb_id}/documents/tasks/stream")
+async def stream_processing_tasks(
+    request: Request,
+    kb_id: int,
+    task_ids: str = Query(..., description="Comma-separated list of task IDs to follow"),
+    db: AsyncSession = Depends(get_async_db),
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
+):
+    """
+    Stream processing task updates as server-sent events.
+
+    Each `task` event carries the same fields as GET /documents/tasks plus
+    the ingestion stage and an overall progress estimate. The current state
+    of every task is sent first; the stream ends with a `done` event once
+    all tasks have completed or failed.
+    """
+    task_id_list = _parse_task_ids(task_ids)
+
+    accessible_kbs.check(kb_id)
+
+    # Subscribe before reading the snapshot so no transition is missed
+    subscription = task_events.subscribe(kb_id)
+    try:
+        snapshot = await _load_task_states(db, kb_id, task_id_list)
+    except BaseException:
+        subscription.close()
+        raise
+    # Give the connection back now rather than when the stream ends
+    await db.close()
+
+    return StreamingResponse(
+        _task_event_stream(request, subscription, kb_id, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    return {
-        task.id: {
-            "document_id": task.document_id,
-            "status": task.status,
-            "error_message": task.error_message,
-            "upload_id": task.document_upload_id,
-            "file_name": task.document_upload.file_name if task.document_upload else None
-        }
-        for task in tasks
-    }
+
+def _task_status(state: Dict):
+    return state["status"], state["document_id"], state["error_message"]
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _task_event_stream(request: Request, subscription, kb_id: int, snapshot: Dict[int, Dict]):
+    last_sent: Dict[int, Dict] = {}
+    pending = set(snapshot)
+
+    def changed(state: Dict, status_only: bool = False) -> bool:
+        task_id = state["task_id"]
+        if task_id not in pending or last_sent.get(task_id) == state:
+            return False
+        # Re-read rows carry no stage or progress; only report real transitions
+        if status_only and task_id in last_sent and _task_status(last_sent[task_id]) == _task_status(state):
+            return False
+        last_sent[task_id] = state
+        if state["status"] in ("completed", "failed"):
+            pending.discard(task_id)
+        return True
+
+    try:
+        for state in snapshot.values():
+            if changed(state):
+                yield _sse("task", state)
+
+        while pending:
+            event = await subscription.get(timeout=settings.TASK_STREAM_RESYNC_INTERVAL)
+            if await request.is_disconnected():
+                return
+            if event is not None and not subscription.lagged:
+                if changed(event):
+                    yield _sse("task", event)
+                continue
+
+            # Quiet for a while, or events were dropped: re-read the tasks.
+            # This also covers tasks processed by another worker process.
+            subscription.lagged = False
+            async with AsyncSessionLocal() as db:
+                states = await _load_task_states(db, kb_id, list(pending))
+            # Tasks deleted meanwhile will never finish
+            pending.intersection_update(states)
+            updates = [state for state in states.values() if changed(state, status_only=True)]
+            for state in updates:
+                yield _sse("task", state)
+            if not updates:
+                yield ": keep-alive\n\n"
+
+        yield _sse("done", {"task_ids": sorted(snapshot)})
+    finally:
+        subscription.close()
 
 @router.get("/{kb_id}/documents/{doc_id}", response_model=DocumentResponse)
 async def get_document(
@@ -508,18 +646,17 @@ async def get_document(
     db: Session = Depends(get_db),
     kb_id: int,
     doc_id: int,
-    current_user: User = Depends(get_current_user)
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ) -> Any:
     """
     Get document details by ID.
     """
+    accessible_kbs.check(kb_id, detail="Document not found")
     document = (
         db.query(Document)
-        .join(KnowledgeBase)
         .filter(
             Document.id == doc_id,
-            Document.knowledge_base_id == kb_id,
-            KnowledgeBase.user_id == current_user.id
+            Document.knowledge_base_id == kb_id
         )
         .first()
     )
@@ -533,23 +670,13 @@ async def get_document(
 async def test_retrieval(
     request: TestRetrievalRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    accessible_kbs: AccessibleKnowledgeBases = Depends(get_accessible_kbs)
 ) -> Any:
     """
     Test retrieval quality for a given query against a knowledge base.
     """
     try:
-        kb = db.query(KnowledgeBase).filter(
-            KnowledgeBase.id == request.kb_id,
-            KnowledgeBase.user_id == current_user.id
-        ).first()
-        
-        if not kb:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Knowledge base {request.kb_id} not found",
-            )
+        accessible_kbs.check(request.kb_id, detail=f"Knowledge base {request.kb_id} not found")
         
         embeddings = EmbeddingsFactory.create()
         
@@ -559,7 +686,7 @@ async def test_retrieval(
             embedding_function=embeddings,
         )
         
-        results = vector_store.similarity_search_with_score(request.query, k=request.top_k)
+        results = await vector_store.asimilarity_search_with_score(request.query, k=request.top_k)
         
         response = []
         for doc, score in results:
@@ -588,6 +715,7 @@ async def test_hybrid_retrieval(
     try:
         kb = db.query(KnowledgeBase).filter(
             KnowledgeBase.id == request.kb_id,
+            KnowledgeBase.deleted_at.is_(None),
         ).first()
         
         if not kb:
@@ -606,7 +734,13 @@ async def test_hybrid_retrieval(
         
         # Ensure BM25 retriever is built only once on startup in vector_store
         
-        results = vector_store.hybrid_search(request.query, k=request.top_k)
+        results = await hybrid_retrieve(
+            vector_store,
+            request.query,
+            k=request.top_k,
+            mmr_lambda=request.mmr_lambda,
+            mmr_fetch_k=request.mmr_fetch_k,
+        )
         
         response = []
         for doc in results:
@@ -1,51 +1,86 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from langchain_chroma import Chroma
-from app.services.vector_store import VectorStoreFactory
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.vector_store import BaseVectorStore, VectorStoreFactory
 
 from app import models
-from app.db.session import get_db
-from app.core.security import get_api_key_user
+from app.db.session import get_async_db
+from app.core.security import get_rate_limited_api_key_user
 from app.core.config import settings
 from app.services.embedding.embedding_factory import EmbeddingsFactory
+from app.schemas.knowledge import BatchQueryRequest
+from app.services.retrieval.search import hybrid_retrieve
+from app.core.singleflight import SingleFlight, normalize_query
+from app.core.tracing import span
 
 router = APIRouter()
 
+# Identical concurrent queries against a knowledge base share one search
+_query_flight = SingleFlight("openapi_query")
+
+
+async def _kb_exists(db: AsyncSession, knowledge_base_id: int) -> bool:
+    """
+    Whether the knowledge base exists and is not being deleted. Closes the
+    session afterwards: the search that follows does not need it.
+    """
+    with span("kb.lookup"):
+        kb_id = (await db.execute(
+            select(models.KnowledgeBase.id).where(
+                models.KnowledgeBase.id == knowledge_base_id,
+                models.KnowledgeBase.deleted_at.is_(None),
+                # Uncomment if user restriction is needed: models.KnowledgeBase.user_id == current_user.id
+            )
+        )).scalar_one_or_none()
+    await db.close()
+    return kb_id is not None
+
+
+def _create_store(knowledge_base_id: int) -> BaseVectorStore:
+    return VectorStoreFactory.create(
+        store_type=settings.VECTOR_STORE_TYPE,
+        collection_name=f"kb_{knowledge_base_id}",
+        embedding_function=EmbeddingsFactory.create(),
+    )
+
+
+async def _open_store(knowledge_base_id: int) -> BaseVectorStore:
+    """
+    The knowledge base's vector store, built in the threadpool: creating it
+    connects to the backend and gets or creates the collection
+    """
+    with span("vector_store.open"):
+        return await run_in_threadpool(_create_store, knowledge_base_id)
+
+
 @router.get("/{knowledge_base_id}/query")
-def query_knowledge_base(
+async def query_knowledge_base(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     knowledge_base_id: int,
     query: str,
-    top_k: int = 3,
-    current_user: models.User = Depends(get_api_key_user),
+    top_k: int = Query(3, ge=1, le=settings.QUERY_MAX_TOP_K),
+    current_user: models.User = Depends(get_rate_limited_api_key_user),
 ) -> Any:
     """
     Query a specific knowledge base using API key authentication
     """
     try:
-        kb = db.query(models.KnowledgeBase).filter(
-            models.KnowledgeBase.id == knowledge_base_id,
-            # models.KnowledgeBase.user_id == current_user.id
-        ).first()
-        
-        if not kb:
+        if not await _kb_exists(db, knowledge_base_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"Knowledge base {knowledge_base_id} not found",
             )
         
-        embeddings = EmbeddingsFactory.create()
+        vector_store = await _open_store(knowledge_base_id)
         
-        vector_store = VectorStoreFactory.create(
-            store_type=settings.VECTOR_STORE_TYPE,
-            collection_name=f"kb_{knowledge_base_id}",
-            embedding_function=embeddings,
+        results = await _query_flight.do(
+            ("vector", knowledge_base_id, normalize_query(query), top_k),
+            lambda: vector_store.asimilarity_search_with_score(query, k=top_k),
         )
         
-        results = vector_store.similarity_search_with_score(query, k=top_k)
-        
         response = []
         for doc, score in results:
             response.append({
@@ -61,39 +96,38 @@ def query_knowledge_base(
 
 
 @router.get("/{knowledge_base_id}/hybrid-query")
-def query_knowledge_base_hybrid(
+async def query_knowledge_base_hybrid(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     knowledge_base_id: int,
     query: str,
-    top_k: int = 3,
-    current_user: models.User = Depends(get_api_key_user),
+    top_k: int = Query(3, ge=1, le=settings.QUERY_MAX_TOP_K),
+    mmr_lambda: Optional[float] = Query(None, ge=0.0, le=1.0),
+    mmr_fetch_k: Optional[int] = Query(None, ge=1, le=settings.MMR_MAX_FETCH_K),
+    current_user: models.User = Depends(get_rate_limited_api_key_user),
 ) -> Any:
     """
     Query a specific knowledge base with hybrid search (BM25 + vector) using API key authentication.
+
+    Set mmr_lambda below 1 to diversify the results with maximal marginal
+    relevance over a pool of mmr_fetch_k candidates.
     """
     try:
-        kb = db.query(models.KnowledgeBase).filter(
-            models.KnowledgeBase.id == knowledge_base_id,
-            # Uncomment if user restriction is needed: models.KnowledgeBase.user_id == current_user.id
-        ).first()
-        
-        if not kb:
+        if not await _kb_exists(db, knowledge_base_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"Knowledge base {knowledge_base_id} not found",
             )
         
-        embeddings = EmbeddingsFactory.create()
+        vector_store = await _open_store(knowledge_base_id)
         
-        vector_store = VectorStoreFactory.create(
-            store_type=settings.VECTOR_STORE_TYPE,
-            collection_name=f"kb_{knowledge_base_id}",
-            embedding_function=embeddings,
+        results = await _query_flight.do(
+            ("hybrid", knowledge_base_id, normalize_query(query), top_k, mmr_lambda, mmr_fetch_k),
+            lambda: hybrid_retrieve(
+                vector_store, query, k=top_k, mmr_lambda=mmr_lambda, mmr_fetch_k=mmr_fetch_k
+            ),
         )
         
-        results = vector_store.hybrid_search(query, k=top_k)
-        
         response = []
         for doc in results:
             response.append({
@@ -106,3 +140,52 @@ def query_knowledge_base_hybrid(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{knowledge_base_id}/batch-query")
+async def batch_query_knowledge_base(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    knowledge_base_id: int,
+    request: BatchQueryRequest,
+    current_user: models.User = Depends(get_rate_limited_api_key_user),
+) -> Any:
+    """
+    Run many queries against a knowledge base in one call using API key authentication.
+
+    Queries are embedded in a single batch and searched together; with hybrid
+    enabled, BM25 results are fused in and scores are fused rank scores.
+    """
+    try:
+        if not await _kb_exists(db, knowledge_base_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Knowledge base {knowledge_base_id} not found",
+            )
+
+        vector_store = await _open_store(knowledge_base_id)
+
+        batch_results = await vector_store.abatch_search(
+            request.queries, k=request.top_k, hybrid=request.hybrid
+        )
+
+        response = []
+        for query, results in zip(request.queries, batch_results):
+            response.append({
+                "query": query,
+                "results": [
+                    {
+                        "content": doc.page_content,
+                        "metadata": doc.metadata,
+                        "score": float(score)
+                    }
+                    for doc, score in results
+                ]
+            })
+
+        return {"results": response}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
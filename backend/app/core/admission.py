@@ -0,0 +1,251 @@
+"""
+Admission control in front of the LLM backend and per-principal rate limits.
+
+A burst larger than the backend can serve is better refused quickly with a
+Retry-After hint than queued until every request times out.
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.models.user import User
+
+admission_rejected = Counter(
+    "admission_rejected_total",
+    "Requests refused by admission control",
+    ("reason",),
+)
+rate_limited = Counter(
+    "rate_limited_total",
+    "Requests refused by a token-bucket rate limit",
+    ("scope",),
+)
+admission_state = Gauge(
+    "admission",
+    "Admission control state: running and queued requests and current limits",
+    ("value",),
+)
+rate_limit_config = Gauge(
+    "rate_limit",
+    "Configured token-bucket rate limits",
+    ("scope", "value"),
+)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded FIFO wait queue.
+
+    Up to max_concurrent requests run at once; up to max_queue more wait for
+    at most queue_timeout seconds. Anything beyond that is rejected at once.
+    Limits can be changed while running.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long an admitted request holds its slot
+        self._avg_duration = 5.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, for the Retry-After header"""
+        backlog = self.queued + 1
+        return max(1, math.ceil(self._avg_duration * backlog / max(self.max_concurrent, 1)))
+
+    def _reject(self, reason: str, detail: str) -> HTTPException:
+        admission_rejected.inc(reason=reason)
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self) -> None:
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full", "Server is busy, please retry later")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("timeout", "Timed out waiting for capacity, please retry later")
+        except asyncio.CancelledError:
+            # A slot handed over just as the client went away is passed on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def acquire_with_retry(self, max_wait: float) -> None:
+        """
+        Like acquire, but on rejection back off and try again for up to
+        max_wait seconds, for work that can wait rather than fail (batches)
+        """
+        deadline = time.monotonic() + max_wait
+        delay = 1.0
+        while True:
+            try:
+                return await self.acquire()
+            except HTTPException as e:
+                remaining = deadline - time.monotonic()
+                if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE or remaining <= 0:
+                    raise
+                retry_after = float((e.headers or {}).get("Retry-After", delay))
+                await asyncio.sleep(min(max(delay, retry_after) * random.uniform(0.5, 1.0), remaining))
+                delay = min(delay * 2, 60.0)
+
+    def release(self, duration: Optional[float] = None) -> None:
+        if duration is not None:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Hand free slots to the oldest waiters"""
+        while self._waiters and self.active < self.max_concurrent:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def configure(self, max_concurrent: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._wake()
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets refilled at `per_minute` tokens a minute, holding
+    at most `burst`. A per_minute of 0 disables the limit.
+    """
+
+    # Buckets kept before idle (full) ones are dropped
+    max_buckets = 10000
+
+    def __init__(self, scope: str, per_minute: float, burst: int):
+        self.scope = scope
+        self.per_minute = per_minute
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> Optional[float]:
+        """
+        Take cost tokens for key; returns seconds to wait if none is left.
+        A cost above what is left is allowed once a token is available and
+        leaves the bucket in debt, so later requests wait it off.
+        """
+        if self.per_minute <= 0:
+            return None
+        rate = self.per_minute / 60.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * rate)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                return (1.0 - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            if len(self._buckets) > self.max_buckets:
+                self._evict(now, rate)
+        return None
+
+    def _evict(self, now: float, rate: float) -> None:
+        for key, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * rate >= self.burst:
+                del self._buckets[key]
+
+    def check(self, key: str, cost: float = 1.0) -> None:
+        """Raise 429 with Retry-After when key is over its limit"""
+        wait = self.acquire(key, cost)
+        if wait is not None:
+            rate_limited.inc(scope=self.scope)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+    def configure(self, per_minute: float, burst: int) -> None:
+        with self._lock:
+            self.per_minute = per_minute
+            self.burst = burst
+
+
+llm_admission = AdmissionController(
+    max_concurrent=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+)
+user_rate_limiter = TokenBucketLimiter(
+    "user", settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_BURST
+)
+api_key_rate_limiter = TokenBucketLimiter(
+    "api_key", settings.RATE_LIMIT_API_KEY_PER_MINUTE, settings.RATE_LIMIT_API_KEY_BURST
+)
+
+admission_state.set_function(lambda: llm_admission.active, value="active")
+admission_state.set_function(lambda: llm_admission.queued, value="queued")
+admission_state.set_function(lambda: llm_admission.max_concurrent, value="max_concurrent")
+admission_state.set_function(lambda: llm_admission.max_queue, value="max_queue")
+for _limiter in (user_rate_limiter, api_key_rate_limiter):
+    rate_limit_config.set_function(lambda l=_limiter: l.per_minute, scope=_limiter.scope, value="per_minute")
+    rate_limit_config.set_function(lambda l=_limiter: l.burst, scope=_limiter.scope, value="burst")
+
+
+async def llm_slot() -> AsyncIterator[None]:
+    """Dependency holding an LLM admission slot for the duration of the request"""
+    await llm_admission.acquire()
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        llm_admission.release(time.monotonic() - start)
+
+
+def rate_limited_user(get_user: Callable[..., User]) -> Callable[..., User]:
+    """Wrap a current-user dependency with the per-user rate limit"""
+
+    def dependency(user: User = Depends(get_user)) -> User:
+        user_rate_limiter.check(f"user:{user.id}")
+        return user
+
+    return dependency
+
+
+def client_address(request: Request) -> str:
+    """
+    The address the request came from, for keying rate limits.
+
+    nginx overwrites X-Real-IP with the peer it accepted the connection from,
+    so the header cannot be chosen by the client when the backend is only
+    reachable through the proxy (TRUST_PROXY_HEADERS).
+    """
+    if settings.TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-real-ip", "").strip()
+        if forwarded:
+            return forwarded
+    return request.client.host if request.client else "unknown"
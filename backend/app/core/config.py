@@ -26,13 +26,46 @@ class Settings(BaseSettings):
             f"@{self.MYSQL_SERVER}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
         )
 
+    @property
+    def get_async_database_url(self) -> str:
+        """get_database_url with the aiomysql driver, for the async engine"""
+        url = self.get_database_url
+        scheme, _, rest = url.partition("://")
+        if scheme.startswith("mysql"):
+            return f"mysql+aiomysql://{rest}"
+        return url
+
+    # Connection pool shared by every engine user (see app/db/engine.py);
+    # the sync and async engines each get a pool of this size
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Seconds after which connections are replaced, below MySQL's wait_timeout
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_CONNECT_TIMEOUT: int = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+
     # JWT settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "Ab123456")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))
+    # Validated API keys are cached this many seconds (0 disables); their
+    # last_used_at is written in one batched UPDATE every flush interval
+    API_KEY_CACHE_TTL: float = float(os.getenv("API_KEY_CACHE_TTL", "60"))
+    API_KEY_LAST_USED_FLUSH_INTERVAL: float = float(os.getenv("API_KEY_LAST_USED_FLUSH_INTERVAL", "30"))
+    # Users resolved from a bearer token are cached this many seconds (0 disables)
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
 
     # Chat Provider settings
     CHAT_PROVIDER: str = os.getenv("CHAT_PROVIDER", "ollama")
+    # Shared HTTP connection pool of the LLM clients
+    LLM_POOL_MAX_CONNECTIONS: int = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+    LLM_POOL_MAX_KEEPALIVE: int = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+    LLM_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "300"))
+    # Load the models at startup instead of on the first request
+    LLM_WARMUP: bool = os.getenv("LLM_WARMUP", "true").lower() == "true"
 
     # Embeddings settings
     EMBEDDINGS_PROVIDER: str = os.getenv("EMBEDDINGS_PROVIDER", "ollama")
@@ -43,11 +76,11 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = os.getenv("MINIO_SECRET_KEY", "minioadmin")
     MINIO_BUCKET_NAME: str = os.getenv("MINIO_BUCKET_NAME", "documents")
 
-    # # OpenAI settings
-    # OPENAI_API_BASE: str = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-    # OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "your-openai-api-key-here")
-    # OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4")
-    # OPENAI_EMBEDDINGS_MODEL: str = os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002")
+    # OpenAI settings
+    OPENAI_API_BASE: str = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "your-openai-api-key-here")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4")
+    OPENAI_EMBEDDINGS_MODEL: str = os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002")
 
     # DashScope settings
     # DASH_SCOPE_API_KEY: str = os.getenv("DASH_SCOPE_API_KEY", "")
@@ -55,6 +88,14 @@ class Settings(BaseSettings):
 
     # Vector Store settings
     VECTOR_STORE_TYPE: str = os.getenv("VECTOR_STORE_TYPE", "chroma")
+    # Threads used to run blocking vector store calls off the event loop
+    VECTOR_STORE_MAX_WORKERS: int = int(os.getenv("VECTOR_STORE_MAX_WORKERS", "8"))
+    # Sub-collections per knowledge base; changing it rebalances existing data
+    VECTOR_STORE_SHARDS: int = int(os.getenv("VECTOR_STORE_SHARDS", "1"))
+    # Seconds a shard's cached BM25 index is used before it is rebuilt (0
+    # disables the cache); writes from this process rebuild it at once,
+    # writes from other workers show up within this time
+    BM25_INDEX_TTL: float = float(os.getenv("BM25_INDEX_TTL", "60"))
 
     # Chroma DB settings
     CHROMA_DB_HOST: str = os.getenv("CHROMA_DB_HOST", "chromadb")
@@ -63,6 +104,105 @@ class Settings(BaseSettings):
     # Qdrant DB settings
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
     QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+    # Vector quantization for new collections: none, scalar (int8) or product.
+    # Full-precision vectors are kept on disk and used to re-score candidates.
+    VECTOR_STORE_QUANTIZATION: str = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+    VECTOR_STORE_RESCORE_OVERSAMPLING: float = float(os.getenv("VECTOR_STORE_RESCORE_OVERSAMPLING", "2.0"))
+
+    # Retrieval settings
+    # MMR diversification of hybrid search results: 1.0 keeps pure relevance
+    # order (stage disabled), lower values trade relevance for diversity.
+    # Both can be overridden per request.
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "1.0"))
+    MMR_FETCH_K: int = int(os.getenv("MMR_FETCH_K", "20"))
+    # Largest candidate pool a request may ask MMR to select from
+    MMR_MAX_FETCH_K: int = int(os.getenv("MMR_MAX_FETCH_K", "100"))
+    # Knowledge base queries over the API: queries per batch call and hits
+    # returned per query
+    QUERY_BATCH_MAX_QUERIES: int = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "100"))
+    QUERY_MAX_TOP_K: int = int(os.getenv("QUERY_MAX_TOP_K", "50"))
+    # Reranking of the retrieved pool before it reaches the LLM: none,
+    # lexical (term and trigram overlap only, no extra dependencies) or
+    # cross-encoder (sentence-transformers)
+    RERANKER: str = os.getenv("RERANKER", "none")
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_FETCH_K: int = int(os.getenv("RERANK_FETCH_K", "20"))
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    # Concurrent reranks allowed; beyond this requests skip the stage
+    RERANK_MAX_INFLIGHT: int = int(os.getenv("RERANK_MAX_INFLIGHT", "4"))
+    # Prompt size of the chat model (sent to Ollama as num_ctx). Retrieved
+    # context fills what is left after LLM_RESERVED_TOKENS for the system
+    # prompt and the answer, and after the query and history.
+    LLM_CONTEXT_WINDOW: int = int(os.getenv("LLM_CONTEXT_WINDOW", "4096"))
+    LLM_RESERVED_TOKENS: int = int(os.getenv("LLM_RESERVED_TOKENS", "1024"))
+
+    # Admission control in front of the LLM backend: requests running at
+    # once, requests allowed to wait, and how long they may wait (seconds)
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    # Token-bucket rate limits (requests per minute, burst); 0 disables
+    RATE_LIMIT_USER_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "30"))
+    RATE_LIMIT_USER_BURST: int = int(os.getenv("RATE_LIMIT_USER_BURST", "10"))
+    RATE_LIMIT_API_KEY_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_API_KEY_PER_MINUTE", "120"))
+    RATE_LIMIT_API_KEY_BURST: int = int(os.getenv("RATE_LIMIT_API_KEY_BURST", "30"))
+    # Take the client address for rate limits from the X-Real-IP header set
+    # by the nginx proxy; disable when the backend is reachable directly
+    TRUST_PROXY_HEADERS: bool = os.getenv("TRUST_PROXY_HEADERS", "true").lower() == "true"
+    # Batch agent requests: questions per call, answers generated at once
+    # (each still takes an admission slot), questions embedded per call, and
+    # seconds a question keeps retrying while admission control turns it away
+    AGENT_BATCH_MAX_ITEMS: int = int(os.getenv("AGENT_BATCH_MAX_ITEMS", "500"))
+    AGENT_BATCH_CONCURRENCY: int = int(os.getenv("AGENT_BATCH_CONCURRENCY", "4"))
+    AGENT_BATCH_RETRIEVAL_SIZE: int = int(os.getenv("AGENT_BATCH_RETRIEVAL_SIZE", "64"))
+    AGENT_BATCH_ADMISSION_WAIT: float = float(os.getenv("AGENT_BATCH_ADMISSION_WAIT", "600"))
+
+    # Run retrieval on the raw question while the history-aware rewrite is
+    # generated; retrieve again only if the rewrite's terms differ at least
+    # this much (1 - Jaccard of the term sets)
+    SPECULATIVE_RETRIEVAL: bool = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+    REWRITE_MIN_DIVERGENCE: float = float(os.getenv("REWRITE_MIN_DIVERGENCE", "0.3"))
+
+    # Create the sample user and knowledge base in the background at startup
+    SEED_ON_STARTUP: bool = os.getenv("SEED_ON_STARTUP", "false").lower() == "true"
+    # Required startup steps (MinIO bucket, migrations) are tried this many
+    # times, waiting STARTUP_RETRY_DELAY seconds (doubling) between tries,
+    # before the process exits
+    STARTUP_RETRY_ATTEMPTS: int = int(os.getenv("STARTUP_RETRY_ATTEMPTS", "5"))
+    STARTUP_RETRY_DELAY: float = float(os.getenv("STARTUP_RETRY_DELAY", "2"))
+
+    # Rows deleted (and MinIO objects removed) per statement when a knowledge
+    # base is deleted in the background
+    KB_DELETE_BATCH_SIZE: int = int(os.getenv("KB_DELETE_BATCH_SIZE", "1000"))
+    # Upload janitor: uploads and kb_*/temp/ objects older than
+    # UPLOAD_TTL_HOURS are removed every UPLOAD_JANITOR_INTERVAL seconds
+    # (0 disables the schedule), in batches of UPLOAD_JANITOR_BATCH_SIZE with
+    # UPLOAD_JANITOR_BATCH_PAUSE seconds between them
+    UPLOAD_TTL_HOURS: float = float(os.getenv("UPLOAD_TTL_HOURS", "24"))
+    UPLOAD_JANITOR_INTERVAL: float = float(os.getenv("UPLOAD_JANITOR_INTERVAL", "3600"))
+    UPLOAD_JANITOR_BATCH_SIZE: int = int(os.getenv("UPLOAD_JANITOR_BATCH_SIZE", "500"))
+    UPLOAD_JANITOR_BATCH_PAUSE: float = float(os.getenv("UPLOAD_JANITOR_BATCH_PAUSE", "0.5"))
+    # Processing task streams re-read task state from the database after
+    # this many quiet seconds (also the keep-alive interval)
+    TASK_STREAM_RESYNC_INTERVAL: float = float(os.getenv("TASK_STREAM_RESYNC_INTERVAL", "15"))
+
+    # Chat history settings
+    # Recent turns sent with each question; older ones are folded into a
+    # rolling summary once CHAT_SUMMARY_MIN_MESSAGES of them have accumulated
+    CHAT_HISTORY_MAX_TOKENS: int = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "1024"))
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "50"))
+    CHAT_SUMMARY_MIN_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_MIN_MESSAGES", "4"))
+
+    # Tracing settings
+    # Finished request traces are written as OTLP/JSON lines to
+    # TRACE_EXPORT_FILE and/or posted to an OTLP/HTTP collector (e.g.
+    # http://otel-collector:4318/v1/traces); both empty disables export.
+    # Requests sending TRACE_DEBUG_HEADER get span timings back in X-Trace.
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "rag-backend")
+    TRACE_EXPORT_FILE: str = os.getenv("TRACE_EXPORT_FILE", "")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "")
+    TRACE_DEBUG_HEADER: str = os.getenv("TRACE_DEBUG_HEADER", "X-Debug-Trace")
 
     # Deepseek settings
     DEEPSEEK_API_KEY: str = ""
@@ -73,6 +213,8 @@ class Settings(BaseSettings):
     OLLAMA_API_BASE: str = os.getenv("OLLAMA_API_BASE", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "gemma3:4b")
     OLLAMA_EMBEDDINGS_MODEL: str = os.getenv("OLLAMA_EMBEDDINGS_MODEL", "nomic-embed-text")
+    # How long Ollama keeps the chat model loaded after a request
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
     # Ollama settings
     # OLLAMA_API_BASE: str = "http://10.2.145.205:30080/ollama"  # Ollama API 地址
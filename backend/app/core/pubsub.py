@@ -0,0 +1,108 @@
+"""
+In-process publish/subscribe for pushing state changes to open streams.
+
+Publishers call `publish(topic, event)` from any thread; every subscriber of
+the topic gets the event on its own bounded queue, delivered on the event
+loop it subscribed from. A subscriber that falls behind has events dropped
+and is flagged `lagged`, so it can re-read the current state instead.
+
+Only subscribers in this process are reached. Streams served by one worker
+do not see events published by another, so consumers should also re-read
+state from the database now and then.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Optional, Set
+
+from app.core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+pubsub_subscribers = Gauge(
+    "pubsub_subscribers",
+    "Open subscriptions",
+    ("channel",),
+)
+pubsub_events = Counter(
+    "pubsub_events_total",
+    "Events delivered to subscribers, or dropped because a subscriber fell behind",
+    ("channel", "outcome"),
+)
+
+
+class Subscription:
+    """A subscriber's queue of events for one topic; close() when done"""
+
+    def __init__(self, pubsub: "PubSub", topic: Hashable, maxsize: int):
+        self._pubsub = pubsub
+        self.topic = topic
+        self.lagged = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._loop = asyncio.get_running_loop()
+
+    def _deliver(self, event: Any) -> None:
+        try:
+            self._queue.put_nowait(event)
+            pubsub_events.inc(channel=self._pubsub.channel, outcome="delivered")
+        except asyncio.QueueFull:
+            self.lagged = True
+            pubsub_events.inc(channel=self._pubsub.channel, outcome="dropped")
+
+    async def get(self, timeout: float) -> Optional[Any]:
+        """Next event, or None if none arrives within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self._pubsub._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PubSub:
+    def __init__(self, channel: str, maxsize: int = 256):
+        self.channel = channel
+        self.maxsize = maxsize
+        self._subscribers: Dict[Hashable, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: Hashable) -> Subscription:
+        """Subscribe from a running event loop"""
+        subscription = Subscription(self, topic, self.maxsize)
+        with self._lock:
+            self._subscribers[topic].add(subscription)
+        pubsub_subscribers.inc(channel=self.channel)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.topic]
+        pubsub_subscribers.dec(channel=self.channel)
+
+    def publish(self, topic: Hashable, event: Any) -> None:
+        """Send event to the topic's subscribers; never blocks"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                logger.debug(f"Dropping {self.channel} event for closed loop")
+
+
+# ProcessingTask state changes, published by ingestion per knowledge base id
+task_events = PubSub("processing_tasks")
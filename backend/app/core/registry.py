@@ -0,0 +1,65 @@
+"""
+Name-to-implementation registry that imports implementations on first use.
+
+Providers, vector stores and document loaders each pull in a heavy client
+library, while a deployment uses one or two of them. Registering them as
+"module:attribute" paths keeps the unused ones (and their dependencies) out
+of the process entirely; only what is configured gets imported.
+"""
+import importlib
+import threading
+from typing import Any, Dict, Generic, List, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+
+class LazyRegistry(Generic[T]):
+    def __init__(self, kind: str, entries: Optional[Dict[str, Union[str, T]]] = None):
+        self.kind = kind
+        self._entries: Dict[str, Union[str, T]] = {}
+        self._lock = threading.Lock()
+        for name, target in (entries or {}).items():
+            self.register(name, target)
+
+    def register(self, name: str, target: Union[str, T]) -> None:
+        """Register an implementation, or its "module:attribute" path"""
+        with self._lock:
+            self._entries[name.lower()] = target
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._entries
+
+    def get(self, name: str) -> T:
+        """
+        The implementation registered under name, imported on first use
+
+        Raises:
+            ValueError: If nothing is registered under name
+            ImportError: If the implementation's dependencies are not installed
+        """
+        key = name.lower()
+        target = self._entries.get(key)
+        if target is None:
+            raise ValueError(
+                f"Unsupported {self.kind}: {name}. "
+                f"Supported types are: {', '.join(self._entries)}"
+            )
+        if not isinstance(target, str):
+            return target
+        with self._lock:
+            target = self._entries[key]
+            if isinstance(target, str):
+                target = self._entries[key] = _import(target, f"{self.kind} {key}")
+        return target
+
+
+def _import(path: str, what: str) -> Any:
+    module_name, _, attribute = path.partition(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"The {what} needs {module_name}, which could not be imported: {e}") from e
+    return getattr(module, attribute)
@@ -1,5 +1,8 @@
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Hashable, Optional, Set, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
@@ -8,7 +11,10 @@ from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.user import User
-from app.services.api_key import APIKeyService
+from app.models.knowledge import KnowledgeBase
+from app.services.api_key import APIKeyService, api_key_cache
+from app.core.admission import api_key_rate_limiter
+from app.core.tracing import traced
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -27,14 +33,58 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # iat keys the principal cache, so each login gets its own entry
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt 
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
+class PrincipalCache:
+    """
+    Short-TTL cache of authenticated users keyed by token subject and issue
+    time, so a burst of requests with one token looks the user up once.
+    Entries are dropped when the user is deactivated; other processes see
+    the change after at most PRINCIPAL_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: Dict[Tuple[str, Hashable], Tuple[User, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Hashable]) -> Optional[User]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def put(self, key: Tuple[str, Hashable], user: User) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                now = time.monotonic()
+                self._entries = {k: e for k, e in self._entries.items() if e[1] >= now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            self._entries = {k: e for k, e in self._entries.items() if k[0] != username}
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_user_caches(user: User) -> None:
+    """Forget cached logins and API keys of a user, e.g. on deactivation"""
+    principal_cache.invalidate_user(user.username)
+    api_key_cache.invalidate_user(user.id)
+
+
+def authenticate_token(db: Session, token: str) -> User:
+    """Active user of a bearer token, served from the principal cache when possible"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,7 +97,13 @@ def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+
+    # Tokens issued before iat was added are keyed by their expiry
+    key = (username, payload.get("iat", payload.get("exp")))
+    user = principal_cache.get(key)
+    if user is not None:
+        return user
+
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         raise credentials_exception
@@ -57,8 +113,58 @@ def get_current_user(
             detail="Inactive user",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user 
+    # Detach it so commits in this or later sessions never expire the
+    # shared instance
+    db.expunge(user)
+    principal_cache.put(key, user)
+    return user
 
+@traced("auth.jwt")
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    return authenticate_token(db, token)
+
+
+class AccessibleKnowledgeBases:
+    """
+    Ids of the knowledge bases the current user owns, loaded once per
+    request by get_accessible_kbs, so repeated ownership checks cost a
+    single query and never touch the database from async handlers.
+    """
+
+    def __init__(self, ids: Set[int]):
+        self.ids = ids
+
+    def __contains__(self, kb_id: int) -> bool:
+        return kb_id in self.ids
+
+    def check(self, kb_id: int, detail: str = "Knowledge base not found") -> None:
+        """Raise 404 unless the user owns kb_id"""
+        if kb_id not in self.ids:
+            raise HTTPException(status_code=404, detail=detail)
+
+
+def get_accessible_kbs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> AccessibleKnowledgeBases:
+    """
+    Request-scoped dependency; FastAPI resolves it once per request, in the
+    threadpool since it is sync.
+    """
+    rows = db.query(KnowledgeBase.id).filter(
+        KnowledgeBase.user_id == current_user.id,
+        KnowledgeBase.deleted_at.is_(None)
+    ).all()
+    # Give the connection back now: get_db only closes the session after
+    # the response, which for a stream is when the client goes away. The
+    # session still works for handlers that use it afterwards.
+    db.close()
+    return AccessibleKnowledgeBases({row.id for row in rows})
+
+@traced("auth.api_key")
 def get_api_key_user(
     db: Session = Depends(get_db),
     api_key: str = Security(api_key_header),
@@ -69,7 +175,8 @@ def get_api_key_user(
             detail="API key header missing",
         )
     
-    api_key_obj = APIKeyService.get_api_key_by_key(db=db, key=api_key)
+    # Served from the API key cache; the DB is only queried on a miss
+    api_key_obj = APIKeyService.get_cached_api_key(db=db, key=api_key)
     if not api_key_obj:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -82,5 +189,17 @@ def get_api_key_user(
             detail="Inactive API key",
         )
     
-    APIKeyService.update_last_used(db=db, api_key=api_key_obj)
-    return api_key_obj.user 
\ No newline at end of file
+    APIKeyService.update_last_used(api_key_obj.id)
+    return api_key_obj.user
+
+def api_key_bucket(api_key: str) -> str:
+    """Rate-limit key of an API key, without keeping the key itself"""
+    return f"api_key:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+def get_rate_limited_api_key_user(
+    api_key: str = Security(api_key_header),
+    user: User = Depends(get_api_key_user),
+) -> User:
+    """get_api_key_user with the per-API-key rate limit applied"""
+    api_key_rate_limiter.check(api_key_bucket(api_key))
+    return user
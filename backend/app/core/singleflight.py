@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+from app.core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+singleflight_requests = Counter(
+    "singleflight_requests_total",
+    "Requests handled by request coalescing, by whether they ran the work or joined it",
+    ("group", "role"),
+)
+singleflight_inflight = Gauge(
+    "singleflight_inflight",
+    "Distinct computations currently running",
+    ("group",),
+)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one computation.
+
+    The first caller for a key starts the work as a separate task; callers
+    arriving while it runs await the same task and get the same result (or
+    exception). The work is shielded, so one caller disconnecting does not
+    cancel it for the others. Nothing is cached once the work has finished.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            singleflight_inflight.inc(group=self.group)
+            singleflight_requests.inc(group=self.group, role="leader")
+            task.add_done_callback(lambda _: self._finish(key, task))
+        else:
+            singleflight_requests.inc(group=self.group, role="folded")
+            logger.debug(f"Coalesced duplicate {self.group} request")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        singleflight_inflight.dec(group=self.group)
+        # Retrieve the exception so an abandoned task does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace insensitive form of a query, for coalescing keys"""
+    return " ".join(query.lower().split())
+
+
+def fingerprint(texts: Iterable[str]) -> str:
+    """Short stable digest of a sequence of texts, e.g. a chat history"""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
@@ -0,0 +1,298 @@
+"""
+Lightweight per-request tracing.
+
+Spans are timed with `span("name")` blocks and collected on the trace of
+the current request (held in a context variable, so it follows awaits,
+tasks and `run_in_context` thread-pool calls). Finished traces are exported
+as OTLP/JSON — one `{"resourceSpans": [...]}` document per trace — to a
+local JSONL file and/or an OpenTelemetry collector's /v1/traces endpoint,
+from a background thread so requests never wait on the export.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    spans: List[Span] = field(default_factory=list)
+
+
+# (trace, current span) of the running request or background job
+_current: contextvars.ContextVar[Optional[Tuple[Trace, Span]]] = contextvars.ContextVar(
+    "trace_current", default=None
+)
+
+
+def _new_id(n_bytes: int) -> str:
+    return secrets.token_hex(n_bytes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a block as a child of the current span; a no-op outside a trace"""
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    trace, parent = current
+    child = Span(name, trace.trace_id, _new_id(8), parent.span_id, time.time_ns(), attributes=attributes)
+    trace.spans.append(child)
+    token = _current.set((trace, child))
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator form of span() for sync and async functions"""
+
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def start_trace(name: str, parent: Optional[Tuple[str, str]] = None, **attributes: Any) -> Iterator[Trace]:
+    """
+    Start a trace with a root span and export it when the block exits.
+
+    Args:
+        parent: (trace_id, span_id) from current_link() of the request that
+            started this work, so background jobs join the request's trace.
+    """
+    trace_id, parent_id = parent if parent else (_new_id(16), None)
+    trace = Trace(trace_id)
+    root = Span(name, trace_id, _new_id(8), parent_id, time.time_ns(), attributes=attributes)
+    trace.spans.append(root)
+    token = _current.set((trace, root))
+    try:
+        yield trace
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _current.reset(token)
+        export(trace)
+
+
+def current_link() -> Optional[Tuple[str, str]]:
+    """(trace_id, span_id) of the current span, to hand to background work"""
+    current = _current.get()
+    if current is None:
+        return None
+    trace, active = current
+    return trace.trace_id, active.span_id
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current[0] if current else None
+
+
+def run_in_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """Bind fn to the caller's context so spans opened in a worker thread are kept"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def summary_header(trace: Trace) -> str:
+    """JSON list of finished spans with offsets and durations, for the debug header"""
+    origin = trace.spans[0].start_ns if trace.spans else 0
+    return json.dumps([
+        {
+            "name": s.name,
+            "start_ms": round((s.start_ns - origin) / 1e6, 1),
+            "ms": round(s.duration_ms, 1),
+            **({"error": s.error} if s.error else {}),
+        }
+        for s in trace.spans
+        if s.end_ns is not None
+    ], ensure_ascii=True)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(trace: Trace) -> Dict[str, Any]:
+    """Trace in the OTLP/JSON encoding accepted by OpenTelemetry collectors"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                        "attributes": [
+                            {"key": key, "value": _otlp_value(value)}
+                            for key, value in s.attributes.items()
+                        ],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    }
+                    for s in trace.spans
+                ],
+            }],
+        }]
+    }
+
+
+# Export runs on one daemon thread fed by a bounded queue; traces are dropped
+# rather than blocking requests when the exporter falls behind
+_export_queue: "queue.Queue[Trace]" = queue.Queue(maxsize=1000)
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def export(trace: Trace) -> None:
+    if not (settings.TRACE_EXPORT_FILE or settings.TRACE_OTLP_ENDPOINT):
+        return
+    _ensure_exporter()
+    try:
+        _export_queue.put_nowait(trace)
+    except queue.Full:
+        logger.warning("Trace export queue full, dropping trace")
+
+
+def _ensure_exporter() -> None:
+    global _exporter_started
+    if _exporter_started:
+        return
+    with _exporter_lock:
+        if not _exporter_started:
+            threading.Thread(target=_export_loop, name="trace-exporter", daemon=True).start()
+            _exporter_started = True
+
+
+def _export_loop() -> None:
+    import httpx
+
+    client = httpx.Client(timeout=5.0) if settings.TRACE_OTLP_ENDPOINT else None
+    while True:
+        trace = _export_queue.get()
+        payload = to_otlp_json(trace)
+        try:
+            if settings.TRACE_EXPORT_FILE:
+                os.makedirs(os.path.dirname(settings.TRACE_EXPORT_FILE) or ".", exist_ok=True)
+                with open(settings.TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload) + "\n")
+            if client is not None:
+                client.post(settings.TRACE_OTLP_ENDPOINT, json=payload)
+        except Exception as e:
+            logger.warning(f"Failed to export trace {trace.trace_id}: {str(e)}")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware running each HTTP request in its own trace.
+
+    Every response carries X-Trace-Id. A request sending the
+    TRACE_DEBUG_HEADER gets its span timings in X-Trace; the response is
+    then held back until its body is complete, so spans recorded while a
+    streaming body is generated are included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.debug_header = settings.TRACE_DEBUG_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        debug = any(name == self.debug_header for name, _ in scope.get("headers", []))
+        name = f"{scope['method']} {scope['path']}"
+        with start_trace(name, **{"http.method": scope["method"], "http.target": scope["path"]}) as trace:
+            root = trace.spans[0]
+            held: List[Dict[str, Any]] = []
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    root.attributes["http.status_code"] = message["status"]
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-trace-id", trace.trace_id.encode("latin-1"))
+                    ]
+                    if debug:
+                        held.append(message)
+                        return
+                elif debug and message["type"] == "http.response.body":
+                    held.append(message)
+                    if message.get("more_body", False):
+                        return
+                    root.end_ns = time.time_ns()
+                    start = held[0]
+                    start["headers"].append((b"x-trace", summary_header(trace).encode("latin-1")))
+                    await send(start)
+                    body = b"".join(m.get("body", b"") for m in held[1:])
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
@@ -0,0 +1,108 @@
+"""
+Process-wide database engines.
+
+Every part of the app — request sessions, ingestion helpers such as
+ChunkRecord, the startup migrator — gets its engine from here, so one
+connection pool per database URL is shared instead of each caller opening
+its own. Pool sizing comes from the DB_POOL_* settings, and pool usage and
+checkout wait time are exported as metrics.
+"""
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+
+pool_state = Gauge(
+    "db_pool",
+    "Database connection pool state: configured size, connections in use, idle and overflow",
+    ("engine", "value"),
+)
+pool_checkouts = Counter(
+    "db_pool_checkouts_total",
+    "Connections checked out of the pool",
+    ("engine",),
+)
+pool_checkout_wait = Counter(
+    "db_pool_checkout_wait_seconds_total",
+    "Time spent waiting for a pooled connection; divide by db_pool_checkouts_total for the mean",
+    ("engine",),
+)
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout waited for a connection"""
+
+    metrics_name = ""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkouts.inc(engine=self.metrics_name)
+            pool_checkout_wait.inc(time.perf_counter() - start, engine=self.metrics_name)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    metrics_name = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def _pool_kwargs() -> Dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {"connect_timeout": settings.DB_CONNECT_TIMEOUT},
+    }
+
+
+def _register_pool_metrics(name: str, engine: Engine) -> None:
+    # Read through the engine: dispose() replaces its pool
+    pool_state.set_function(lambda: engine.pool.size(), engine=name, value="size")
+    pool_state.set_function(lambda: engine.pool.checkedout(), engine=name, value="in_use")
+    pool_state.set_function(lambda: engine.pool.checkedin(), engine=name, value="idle")
+    pool_state.set_function(lambda: max(engine.pool.overflow(), 0), engine=name, value="overflow")
+
+
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+_lock = threading.Lock()
+
+
+def get_engine(url: str = None) -> Engine:
+    """The shared sync engine for url (default: the configured database)"""
+    url = url or settings.get_database_url
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, poolclass=TimedQueuePool, **_pool_kwargs())
+            if not _engines:
+                _register_pool_metrics(TimedQueuePool.metrics_name, engine)
+            _engines[url] = engine
+    return engine
+
+
+def get_async_engine(url: str = None) -> AsyncEngine:
+    """The shared async engine for url (default: the configured database)"""
+    url = url or settings.get_async_database_url
+    with _lock:
+        engine = _async_engines.get(url)
+        if engine is None:
+            engine = create_async_engine(url, poolclass=TimedAsyncQueuePool, **_pool_kwargs())
+            if not _async_engines:
+                _register_pool_metrics(TimedAsyncQueuePool.metrics_name, engine.sync_engine)
+            _async_engines[url] = engine
+    return engine
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import os
 
 from app.api.api_v1.api import api_router
 from app.api.openapi.api import router as openapi_router
@@ -6,13 +8,22 @@ from app.core.config import settings
 from app.core.minio import init_minio
 from app.startup.migarate import DatabaseMigrator
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.metrics import REGISTRY
+from app.core.tracing import TracingMiddleware
 from app.db.session import SessionLocal
+from app.startup.readiness import readiness
 from app.startup.seed_data import seed_knowledge_base
+from app.services.llm.llm_factory import LLMFactory
+from app.services.api_key import last_used_tracker
+from app.services.kb_deletion import resume_deletions
+from app.services.upload_janitor import upload_janitor
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -20,30 +31,106 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
 )
 
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(api_router, prefix=settings.API_V1_STR)
 app.include_router(openapi_router, prefix="/openapi")
 
 
-@app.on_event("startup")
-async def startup_event():
-    # Initialize MinIO
-    init_minio()
-    
-    # Run database migrations
-    migrator = DatabaseMigrator(settings.get_database_url)
-    migrator.run_migrations()
-
-       # Tạo session DB
+async def seed_data() -> None:
     db = SessionLocal()
     try:
         # Gọi hàm seed data tạo user, knowledge base, upload document
         await seed_knowledge_base(db)
     except Exception as e:
-        print(f"Seed data failed: {e}")
+        logger.error(f"Seed data failed: {e}")
     finally:
         db.close()
-    
+
+
+async def run_required(name: str, step) -> None:
+    """
+    Run a blocking startup step the instance cannot serve without, retrying
+    with backoff. If it keeps failing the process exits with an error, as
+    it did when startup ran these steps inline, so it gets restarted
+    instead of staying alive and never ready.
+    """
+    delay = settings.STARTUP_RETRY_DELAY
+    for attempt in range(1, settings.STARTUP_RETRY_ATTEMPTS + 1):
+        if await readiness.run(name, asyncio.to_thread(step)):
+            return
+        if attempt < settings.STARTUP_RETRY_ATTEMPTS:
+            logger.warning(
+                f"Retrying startup step {name} in {delay:.0f}s "
+                f"(attempt {attempt} of {settings.STARTUP_RETRY_ATTEMPTS})"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+    logger.critical(f"Startup step {name} failed {settings.STARTUP_RETRY_ATTEMPTS} times, exiting")
+    logging.shutdown()
+    os._exit(1)
+
+
+async def initialize() -> None:
+    """
+    Startup steps run behind /api/ready. MinIO and the database are set up
+    concurrently; what needs the schema runs once the migrations are done.
+    """
+    migrator = DatabaseMigrator(settings.get_database_url)
+    await asyncio.gather(
+        run_required("minio", init_minio),
+        run_required("migrations", migrator.run_migrations),
+    )
+
+    # Finish knowledge base deletions interrupted by a restart
+    try:
+        await resume_deletions()
+    except Exception as e:
+        logger.error(f"Failed to resume knowledge base deletions: {e}")
+
+    # Opt-in sample data; it processes a document, so it runs in the
+    # background and does not hold up readiness
+    if settings.SEED_ON_STARTUP:
+        app.state.seed = asyncio.create_task(seed_data())
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Registered up front so /api/ready reports them before they run
+    readiness.expect("minio", "migrations")
+
+    # Load the LLM in the background; the instance is ready once it is warm
+    if settings.LLM_WARMUP:
+        app.state.llm_warmup = asyncio.create_task(
+            readiness.run("llm_warmup", LLMFactory.warmup(), required=False)
+        )
+
+    # Batched write-behind of API key last_used_at
+    app.state.last_used_flusher = asyncio.create_task(last_used_tracker.run())
+
+    # Periodic removal of expired uploads and orphaned temp objects
+    if settings.UPLOAD_JANITOR_INTERVAL > 0:
+        app.state.upload_janitor = asyncio.create_task(upload_janitor.run())
+
+    # The server starts accepting connections (and answering /api/health)
+    # while these run
+    app.state.initialize = asyncio.create_task(initialize())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Cancelling the flusher writes out the pending API key uses
+    flusher = app.state.last_used_flusher
+    flusher.cancel()
+    try:
+        await flusher
+    except asyncio.CancelledError:
+        pass
+
+    janitor = getattr(app.state, "upload_janitor", None)
+    if janitor is not None:
+        janitor.cancel()
 
 
 @app.get("/")
@@ -57,3 +144,16 @@ async def health_check():
         "status": "healthy",
         "version": settings.VERSION,
     }
+
+
+@app.get("/api/ready")
+async def ready_check():
+    """200 once startup has finished, 503 with the pending steps until then"""
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if readiness.ready else 503)
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Process metrics in Prometheus text format"""
+    return REGISTRY.render()
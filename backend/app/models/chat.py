@@ -17,6 +17,9 @@ class Chat(Base, TimestampMixin):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Rolling summary of turns that fell out of the history window
+    history_summary = Column(LONGTEXT, nullable=True)
+    summary_until_message_id = Column(Integer, nullable=True)
 
     # Relationships
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
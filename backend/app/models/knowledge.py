@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, JSON, BigInteger, TIMESTAMP, text
-from sqlalchemy.dialects.mysql import LONGTEXT
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.mysql import LONGBLOB, LONGTEXT
+from sqlalchemy.orm import deferred, relationship
 from app.models.base import Base, TimestampMixin
 from datetime import datetime
 import sqlalchemy as sa
@@ -14,6 +14,10 @@ class KnowledgeBase(Base, TimestampMixin):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when deletion is requested; the row is hidden from then on and
+    # removed by the background deletion job, which reports its progress
+    deleted_at = Column(DateTime, nullable=True, index=True)
+    deletion_progress = Column(JSON, nullable=True)
     
     # Relationships
     documents = relationship("Document", back_populates="knowledge_base", cascade="all, delete-orphan")
@@ -86,6 +90,9 @@ class DocumentChunk(Base, TimestampMixin):
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     file_name = Column(String(255), nullable=False)
     chunk_metadata = Column(JSON, nullable=True)
+    # zlib-compressed chunk text, kept out of chunk_metadata; deferred so
+    # chunk queries do not load it
+    compressed_content = deferred(Column(LONGBLOB, nullable=True))
     hash = Column(String(64), nullable=False, index=True)  # Content hash for change detection
     
     # Relationships
@@ -0,0 +1,28 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class RateLimit(BaseModel):
+    per_minute: float = Field(..., ge=0)
+    burst: int = Field(..., ge=1)
+
+
+class AdmissionLimits(BaseModel):
+    max_concurrent: int = Field(..., ge=1)
+    max_queue: int = Field(..., ge=0)
+    queue_timeout: float = Field(..., ge=0)
+    user_rate_limit: RateLimit
+    api_key_rate_limit: RateLimit
+
+
+class AdmissionLimitsUpdate(BaseModel):
+    max_concurrent: Optional[int] = Field(None, ge=1)
+    max_queue: Optional[int] = Field(None, ge=0)
+    queue_timeout: Optional[float] = Field(None, ge=0)
+    user_rate_limit: Optional[RateLimit] = None
+    api_key_rate_limit: Optional[RateLimit] = None
+
+
+class AdmissionStatus(AdmissionLimits):
+    active: int
+    queued: int
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
+from app.core.config import settings
+
 class MessageBase(BaseModel):
     content: str
     role: str
@@ -17,6 +19,22 @@ class AgentRequest(BaseModel):
     userId: Optional[str]
     message: str
     history: Optional[List[ChatMessageRequest]] = None 
+    # MMR diversification of retrieved context (see settings.MMR_LAMBDA)
+    mmrLambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    mmrFetchK: Optional[int] = Field(None, ge=1, le=settings.MMR_MAX_FETCH_K)
+
+
+class ChatMessagesRequest(BaseModel):
+    messages: List[ChatMessageRequest] = Field(..., min_length=1)
+    # MMR diversification of retrieved context (see settings.MMR_LAMBDA)
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    mmr_fetch_k: Optional[int] = Field(None, ge=1, le=settings.MMR_MAX_FETCH_K)
+
+
+class AgentBatchRequest(BaseModel):
+    items: List[AgentRequest] = Field(..., min_length=1)
+    # Answers generated at once; capped by settings.AGENT_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
 
 
 class MessageCreate(MessageBase):
@@ -50,4 +68,19 @@ class ChatResponse(ChatBase):
 
     class Config:
         from_attributes = True 
-    
\ No newline at end of file
+
+class MessagePreview(BaseModel):
+    id: int
+    role: str
+    # Answer text only (no context header), truncated
+    content: str
+    created_at: datetime
+
+class ChatSummary(ChatBase):
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    knowledge_base_ids: List[int] = []
+    message_count: int = 0
+    last_message: Optional[MessagePreview] = None
@@ -1,6 +1,8 @@
 from typing import Optional, List
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
 
 class KnowledgeBaseBase(BaseModel):
     name: str
@@ -79,7 +81,27 @@ class KnowledgeBaseResponse(KnowledgeBaseBase):
     class Config:
         from_attributes = True
 
+class DocumentBrief(BaseModel):
+    id: int
+    file_name: str
+    content_type: str
+    created_at: datetime
+
+class KnowledgeBaseSummary(KnowledgeBaseBase):
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    document_count: int = 0
+    # Most recently added documents, newest first
+    recent_documents: List[DocumentBrief] = []
+
 class PreviewRequest(BaseModel):
     document_ids: List[int]
     chunk_size: int = 1000
-    chunk_overlap: int = 200 
\ No newline at end of file
+    chunk_overlap: int = 200 
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=settings.QUERY_BATCH_MAX_QUERIES)
+    top_k: int = Field(3, ge=1, le=settings.QUERY_MAX_TOP_K)
+    hybrid: bool = True
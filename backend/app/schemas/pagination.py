@@ -0,0 +1,26 @@
+from typing import Callable, Generic, List, Optional, Sequence, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """
+    One page of a keyset-paginated listing.
+
+    Pass next_cursor back as `cursor` to get the following page; it is
+    None on the last page.
+    """
+    items: List[T]
+    next_cursor: Optional[int] = None
+
+    @classmethod
+    def from_rows(cls, rows: Sequence, limit: int, cursor_of: Callable[..., int]) -> "Page":
+        """
+        Build a page from up to limit + 1 rows fetched in listing order;
+        the extra row only signals that another page exists.
+        """
+        items = list(rows[:limit])
+        next_cursor = cursor_of(items[-1]) if len(rows) > limit else None
+        return cls(items=items, next_cursor=next_cursor)
@@ -14,6 +14,9 @@ class UserCreate(UserBase):
 class UserUpdate(UserBase):
     password: Optional[str] = None
 
+class UserActiveUpdate(BaseModel):
+    is_active: bool
+
 class UserResponse(UserBase):
     id: int
     created_at: datetime
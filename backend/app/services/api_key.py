@@ -1,11 +1,125 @@
-from typing import List, Optional
+from typing import Dict, List, NamedTuple, Optional
 from datetime import datetime
+import asyncio
+import logging
 import secrets
+import threading
+import time
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.db.session import SessionLocal
 from app.models.api_key import APIKey
+from app.models.user import User
 from app.schemas.api_key import APIKeyCreate, APIKeyUpdate
 
+logger = logging.getLogger(__name__)
+
+
+class CachedAPIKey(NamedTuple):
+    id: int
+    is_active: bool
+    # Detached, fully loaded owner; read-only outside its original session
+    user: User
+    expires_at: float
+
+
+class APIKeyCache:
+    """
+    TTL cache of looked-up API keys, so authenticated OpenAPI calls skip the
+    api_keys query. Entries are dropped on update/delete of the key or
+    deactivation of its owner; other processes see changes after at most
+    API_KEY_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: Dict[str, CachedAPIKey] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedAPIKey]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
+            return None
+        return entry
+
+    def put(self, key: str, api_key: APIKey) -> CachedAPIKey:
+        entry = CachedAPIKey(api_key.id, api_key.is_active, api_key.user, time.monotonic() + self.ttl)
+        if self.ttl <= 0:
+            return entry
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                now = time.monotonic()
+                self._entries = {k: e for k, e in self._entries.items() if e.expires_at >= now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._entries = {k: e for k, e in self._entries.items() if e.user.id != user_id}
+
+
+class LastUsedTracker:
+    """
+    Write-behind for api_keys.last_used_at: uses are recorded in memory and
+    flushed every API_KEY_LAST_USED_FLUSH_INTERVAL seconds as one UPDATE.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, api_key_id: int) -> None:
+        with self._lock:
+            self._pending[api_key_id] = datetime.utcnow()
+
+    def flush(self) -> int:
+        """Write the pending timestamps; returns the number of keys updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(APIKey)
+                .where(APIKey.id.in_(list(pending)))
+                .values(last_used_at=case(pending, value=APIKey.id))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to flush API key last_used_at: {str(e)}")
+            # Keep the timestamps for the next flush unless newer ones arrived
+            with self._lock:
+                for api_key_id, used_at in pending.items():
+                    self._pending.setdefault(api_key_id, used_at)
+            return 0
+        finally:
+            db.close()
+        return len(pending)
+
+    async def run(self) -> None:
+        """Flush periodically until cancelled, then once more"""
+        try:
+            while True:
+                await asyncio.sleep(settings.API_KEY_LAST_USED_FLUSH_INTERVAL)
+                await asyncio.to_thread(self.flush)
+        finally:
+            await asyncio.to_thread(self.flush)
+
+
+api_key_cache = APIKeyCache(settings.API_KEY_CACHE_TTL)
+last_used_tracker = LastUsedTracker()
+
 class APIKeyService:
     @staticmethod
     def get_api_keys(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[APIKey]:
@@ -38,6 +152,20 @@ class APIKeyService:
     def get_api_key_by_key(db: Session, key: str) -> Optional[APIKey]:
         return db.query(APIKey).filter(APIKey.key == key).first()
 
+    @staticmethod
+    def get_cached_api_key(db: Session, key: str) -> Optional[CachedAPIKey]:
+        """get_api_key_by_key through the TTL cache"""
+        cached = api_key_cache.get(key)
+        if cached is not None:
+            return cached
+        api_key = APIKeyService.get_api_key_by_key(db=db, key=key)
+        if not api_key:
+            return None
+        # Load the owner and detach it, so a commit in this or a later
+        # session never expires the cached instance
+        db.expunge(api_key.user)
+        return api_key_cache.put(key, api_key)
+
     @staticmethod
     def update_api_key(db: Session, api_key: APIKey, update_data: APIKeyUpdate) -> APIKey:
         for field, value in update_data.model_dump(exclude_unset=True).items():
@@ -45,17 +173,16 @@ class APIKeyService:
         db.add(api_key)
         db.commit()
         db.refresh(api_key)
+        api_key_cache.invalidate(api_key.key)
         return api_key
 
     @staticmethod
     def delete_api_key(db: Session, api_key: APIKey) -> None:
         db.delete(api_key)
         db.commit()
+        api_key_cache.invalidate(api_key.key)
 
     @staticmethod
-    def update_last_used(db: Session, api_key: APIKey) -> APIKey:
-        api_key.last_used_at = datetime.utcnow()
-        db.add(api_key)
-        db.commit()
-        db.refresh(api_key)
-        return api_key 
\ No newline at end of file
+    def update_last_used(api_key_id: int) -> None:
+        """Record a use; written to last_used_at by the next batched flush"""
+        last_used_tracker.touch(api_key_id) 
\ No newline at end of file
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.chat import Chat, Message
+from app.services.llm.llm_factory import LLMFactory
+from app.services.retrieval.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chats whose summary is being refreshed, and the running tasks (kept so
+# they are not garbage collected before finishing)
+_refreshing: Set[int] = set()
+_tasks: Set[asyncio.Task] = set()
+
+SUMMARY_PROMPT = (
+    "Bạn là trợ lý tóm tắt hội thoại. Hãy cập nhật bản tóm tắt bên dưới bằng "
+    "các lượt hội thoại mới, giữ lại các sự kiện, yêu cầu và kết luận quan trọng. "
+    "Chỉ trả về bản tóm tắt, ngắn gọn, bằng tiếng việt.\n\n"
+    "Tóm tắt hiện tại:\n{summary}\n\n"
+    "Hội thoại mới:\n{transcript}\n\n"
+    "Tóm tắt cập nhật:"
+)
+
+
+def message_text(message: Dict) -> str:
+    """Content of a stored turn without the base64 context prefix"""
+    content = message["content"]
+    if message["role"] == "assistant" and "__LLM_RESPONSE__" in content:
+        content = content.split("__LLM_RESPONSE__")[-1]
+    return content
+
+
+def to_langchain_messages(messages: List[Dict]) -> List[BaseMessage]:
+    """Convert {"role", "content"} dicts into LangChain chat messages"""
+    history = []
+    for message in messages:
+        if message["role"] == "user":
+            history.append(HumanMessage(content=message_text(message)))
+        elif message["role"] == "assistant":
+            history.append(AIMessage(content=message_text(message)))
+    return history
+
+
+def window_messages(messages: List[Dict], max_tokens: Optional[int] = None) -> List[Dict]:
+    """Most recent messages whose combined size fits in max_tokens"""
+    max_tokens = settings.CHAT_HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+    window, used = [], 0
+    for message in reversed(messages):
+        tokens = count_tokens(message_text(message))
+        if used + tokens > max_tokens:
+            break
+        window.append(message)
+        used += tokens
+    return window[::-1]
+
+
+async def load_chat_history(db: AsyncSession, chat: Chat, before_message_id: int) -> List[BaseMessage]:
+    """
+    Build the prompt history of a chat from the Message table.
+
+    Returns the rolling summary (if any) as a system message followed by the
+    newest turns that fit in CHAT_HISTORY_MAX_TOKENS. When enough turns have
+    fallen out of the window without being summarized, a summary refresh is
+    scheduled in the background; this request does not wait for it.
+    """
+    summary_until = chat.summary_until_message_id or 0
+    rows = (await db.execute(
+        select(Message.id, Message.role, Message.content)
+        .where(
+            Message.chat_id == chat.id,
+            Message.id > summary_until,
+            Message.id < before_message_id,
+        )
+        .order_by(Message.id.desc())
+        .limit(settings.CHAT_HISTORY_MAX_MESSAGES)
+    )).all()
+    messages = [
+        {"id": row.id, "role": row.role, "content": row.content}
+        for row in reversed(rows)
+        if row.content
+    ]
+    window = window_messages(messages)
+
+    unsummarized = len(messages) - len(window)
+    if unsummarized >= settings.CHAT_SUMMARY_MIN_MESSAGES:
+        schedule_summary_refresh(chat.id, upto_message_id=window[0]["id"] - 1 if window else before_message_id - 1)
+
+    history = []
+    if chat.history_summary:
+        history.append(SystemMessage(content=f"Tóm tắt hội thoại trước đó:\n{chat.history_summary}"))
+    return history + to_langchain_messages(window)
+
+
+def schedule_summary_refresh(chat_id: int, upto_message_id: int) -> None:
+    """Refresh a chat's rolling summary in the background, once at a time per chat"""
+    if chat_id in _refreshing:
+        return
+    _refreshing.add(chat_id)
+    task = asyncio.create_task(refresh_summary(chat_id, upto_message_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def refresh_summary(chat_id: int, upto_message_id: int) -> None:
+    """
+    Fold the turns after the current summary, up to upto_message_id, into the
+    chat's rolling summary. The transcript is capped to what fits in the
+    model window; anything left over is folded by a later refresh.
+    """
+    db = AsyncSessionLocal()
+    try:
+        chat = await db.get(Chat, chat_id)
+        if not chat:
+            return
+        summary_until = chat.summary_until_message_id or 0
+        rows = (await db.execute(
+            select(Message.id, Message.role, Message.content)
+            .where(
+                Message.chat_id == chat_id,
+                Message.id > summary_until,
+                Message.id <= upto_message_id,
+            )
+            .order_by(Message.id)
+        )).all()
+
+        budget = settings.LLM_CONTEXT_WINDOW - settings.LLM_RESERVED_TOKENS - count_tokens(chat.history_summary or "")
+        lines, last_id, used = [], None, 0
+        for row in rows:
+            if not row.content:
+                continue
+            text = message_text({"role": row.role, "content": row.content})
+            line = f"{'Người dùng' if row.role == 'user' else 'Trợ lý'}: {text}"
+            tokens = count_tokens(line)
+            if lines and used + tokens > budget:
+                break
+            lines.append(line)
+            last_id = row.id
+            used += tokens
+        if last_id is None:
+            return
+
+        llm = LLMFactory.create(streaming=False)
+        result = await llm.ainvoke(SUMMARY_PROMPT.format(
+            summary=chat.history_summary or "(chưa có)",
+            transcript="\n".join(lines),
+        ))
+        chat.history_summary = getattr(result, "content", result).strip()
+        chat.summary_until_message_id = last_id
+        await db.commit()
+        logger.info(f"Chat {chat_id}: history summarized up to message {last_id}")
+    except Exception as e:
+        logger.warning(f"Chat {chat_id}: failed to refresh history summary: {str(e)}")
+    finally:
+        _refreshing.discard(chat_id)
+        await db.close()
@@ -1,203 +1,341 @@
+import asyncio
 import json
+import logging
+import time
 import base64
-from typing import List, AsyncGenerator
-from sqlalchemy.orm import Session
-from langchain_openai import ChatOpenAI
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from typing import List, AsyncGenerator, AsyncIterator, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.output_parsers import StrOutputParser
 from app.core.config import settings
-from app.models.chat import Message
+from app.models.chat import Chat, Message
 from app.models.knowledge import KnowledgeBase, Document
-from langchain.globals import set_verbose, set_debug
 from app.services.vector_store import VectorStoreFactory
 from app.services.embedding.embedding_factory import EmbeddingsFactory
 from app.services.llm.llm_factory import LLMFactory
-from app.services.vector_store.chroma import StaticListRetriever
-set_verbose(True)
-set_debug(True)
+from app.services.vector_store.base import StaticListRetriever
+from app.services.retrieval.search import diversify, hybrid_retrieve, merge_candidates, query_divergence, uses_mmr
+from app.services.retrieval.rerank import candidate_pool_size, get_reranker, rerank_documents
+from app.services.retrieval.context_packing import context_token_budget, pack_context
+from app.services.chat_history import load_chat_history, to_langchain_messages, window_messages
+from app.core.singleflight import SingleFlight, fingerprint, normalize_query
+from app.core.tracing import current_link, span, start_trace
+from app.core.admission import llm_admission
+
+logger = logging.getLogger(__name__)
+
+_chat_flight = SingleFlight("chat")
+
+# Context chunks kept for the prompt after reranking
+TOP_K = 5
+
+# Create contextualize question prompt
+contextualize_q_system_prompt = (
+    "Dựa trên lịch sử hội thoại và câu hỏi mới nhất của người dùng "
+    "có thể tham chiếu đến ngữ cảnh trong lịch sử hội thoại, "
+    "hãy xây dựng lại câu hỏi sao cho nó có thể hiểu được độc lập "
+    "mà không cần đến lịch sử hội thoại. KHÔNG trả lời câu hỏi, chỉ "
+    "định dạng lại câu hỏi nếu cần, hoặc giữ nguyên nếu đã rõ. Bạn chỉ trả lời bằng tiếng việt "
+)
+contextualize_q_prompt = ChatPromptTemplate.from_messages([
+    ("system", contextualize_q_system_prompt),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}")
+])
+
+
+async def rewrite_query(llm, query: str, chat_history: List[BaseMessage]) -> str:
+    """Rewrite the latest question into one that stands without the history"""
+    rewrite_chain = contextualize_q_prompt | llm | StrOutputParser()
+    with span("rewrite", history=len(chat_history)):
+        rewritten = await rewrite_chain.ainvoke({"input": query, "chat_history": chat_history})
+    return rewritten.strip() or query
+
 
 async def generate_response(
     query: str,
-    messages: dict,
+    messages: Optional[dict],
     knowledge_base_ids: List[int],
     chat_id: int,
-    db: Session
+    db: AsyncSession,
+    mmr_lambda: Optional[float] = None,
+    mmr_fetch_k: Optional[int] = None,
 ) -> AsyncGenerator[str, None]:
     try:
-        # Create user message
-        user_message = Message(
-            content=query,
-            role="user",
-            chat_id=chat_id
-        )
-        db.add(user_message)
-        db.commit()
-        
-        # Create bot message placeholder
-        bot_message = Message(
-            content="",
-            role="assistant",
-            chat_id=chat_id
-        )
-        db.add(bot_message)
-        db.commit()
-        
-        # Get knowledge bases and their documents
-        knowledge_bases = (
-            db.query(KnowledgeBase)
-            .filter(KnowledgeBase.id.in_(knowledge_base_ids))
-            .all()
-        )
-        
-        # Initialize embeddings
-        embeddings = EmbeddingsFactory.create()
-
-        # top_k = 3
-        # score_threshold = 0.6
-
-        # vector_stores = []
-        # for kb in knowledge_bases:
-        #     documents = db.query(Document).filter(Document.knowledge_base_id == kb.id).all()
-        #     if documents:
-        #         vector_store = VectorStoreFactory.create(
-        #             store_type=settings.VECTOR_STORE_TYPE,
-        #             collection_name=f"kb_{kb.id}",
-        #             embedding_function=embeddings,
-        #         )
-        #         vector_stores.append(vector_store)
-
-        # if not vector_stores:
-        #     error_msg = "I don't have any knowledge base to help answer your question."
-        #     yield f'0:"{error_msg}"\n'
-        #     bot_message.content = error_msg
-        #     db.commit()
-        #     return
-
-        # # Truy vấn và lọc score
-        # vs = vector_stores[0]
-        # print("Vector store:", vs)
-        # results = vs.similarity_search_with_score(query, k=top_k)  # [(doc, score), ...]
-        # print("Raw results:", results)
-        # filtered_docs = [doc for doc, score in results if score >= score_threshold]
-        # print("Filtered results:", filtered_docs)
-
-        # if not filtered_docs:
-        #     error_msg = "Information is missing on related topic."
-        #     yield f'0:"{error_msg}"\n'
-        #     bot_message.content = error_msg
-        #     db.commit()
-        #     return
-        top_k = 5
-
-        vector_stores = []
-        for kb in knowledge_bases:
-            documents = db.query(Document).filter(Document.knowledge_base_id == kb.id).all()
-            if documents:
-                vector_store = VectorStoreFactory.create(
-                    store_type=settings.VECTOR_STORE_TYPE,
-                    collection_name=f"kb_{kb.id}",
-                    embedding_function=embeddings,
-                )
-                vector_stores.append(vector_store)
-
-        if not vector_stores:
+        with span("db.write", table="messages"):
+            # Create user message
+            user_message = Message(
+                content=query,
+                role="user",
+                chat_id=chat_id
+            )
+            db.add(user_message)
+
+            # Create bot message placeholder
+            bot_message = Message(
+                content="",
+                role="assistant",
+                chat_id=chat_id
+            )
+            db.add(bot_message)
+            await db.commit()
+
+        kb_ids = await searchable_knowledge_base_ids(db, knowledge_base_ids)
+
+        if not kb_ids:
             error_msg = "I don't have any knowledge base to help answer your question."
             yield f'0:"{error_msg}"\n'
-            bot_message.content = error_msg
-            db.commit()
+            with span("db.write", table="messages"):
+                bot_message.content = error_msg
+                await db.commit()
             return
 
-        # Thay vì dùng similarity_search_with_score và lọc score thủ công
-        # ta dùng phương thức hybrid_search đã tích hợp BM25 với vector
-        vs = vector_stores[0]
-        print("Vector store:", vs)
+        # Conversation history: loaded from the database by chat_id unless
+        # the caller supplies its own, windowed to CHAT_HISTORY_MAX_TOKENS
+        if messages is None:
+            with span("history.load"):
+                chat = await db.get(Chat, chat_id)
+                chat_history = await load_chat_history(db, chat, before_message_id=user_message.id)
+        else:
+            chat_history = to_langchain_messages(window_messages(messages["messages"][:-1]))
 
-        # Gọi hybrid_search với top_k và trọng số weights để cân bằng vector và bm25
-        results = vs.hybrid_search(query, k=top_k, weights=[0.4, 0.6])  # trả về danh sách Document, không có score
+        # Identical concurrent questions share one retrieval and LLM call
+        key = (
+            tuple(sorted(kb_ids)),
+            normalize_query(query),
+            fingerprint(f"{m.type}:{m.content}" for m in chat_history),
+            mmr_lambda,
+            mmr_fetch_k,
+        )
+        full_response = await _chat_flight.do(
+            key,
+            lambda: answer_question(query, chat_history, kb_ids, mmr_lambda, mmr_fetch_k),
+        )
 
-        print("Hybrid search results:", results)
+        # Escape ký tự đặc biệt, xuống dòng
+        escaped_response = full_response.replace('"', '\\"').replace('\n', '\\n')
+        # Yield đúng format 1 lần duy nhất với toàn bộ response
+        yield f'0:"{escaped_response}"\n'
+        # Update bot message content
+        with span("db.write", table="messages"):
+            bot_message.content = full_response
+            await db.commit()
 
-        if not results:
-            error_msg = "Information is missing on related topic."
-            yield f'0:"{error_msg}"\n'
-            bot_message.content = error_msg
-            db.commit()
-            return
-        # Initialize the language model
-        llm = LLMFactory.create()
+    except Exception as e:
+        error_message = f"Error generating response: {str(e)}"
+        logger.exception(error_message)
+        yield '3:{text}\n'.format(text=error_message)
         
-        # Create contextualize question prompt
-        contextualize_q_system_prompt = (
-            "Dựa trên lịch sử hội thoại và câu hỏi mới nhất của người dùng "
-            "có thể tham chiếu đến ngữ cảnh trong lịch sử hội thoại, "
-            "hãy xây dựng lại câu hỏi sao cho nó có thể hiểu được độc lập "
-            "mà không cần đến lịch sử hội thoại. KHÔNG trả lời câu hỏi, chỉ "
-            "định dạng lại câu hỏi nếu cần, hoặc giữ nguyên nếu đã rõ. Bạn chỉ trả lời bằng tiếng việt "
-        )
-        contextualize_q_prompt = ChatPromptTemplate.from_messages([
-            ("system", contextualize_q_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}")
-        ])
+        # Update bot message with error
+        if 'bot_message' in locals():
+            await db.rollback()
+            bot_message.content = error_message
+            db.add(bot_message)
+            await db.commit()
+    finally:
+        await db.close()
 
-        filtered_retriever = StaticListRetriever(docs=results)
 
-        
-        # Create history aware retriever
-        history_aware_retriever = create_history_aware_retriever(
-            llm, 
-            filtered_retriever,
-            contextualize_q_prompt
+async def searchable_knowledge_base_ids(db: AsyncSession, knowledge_base_ids: List[int]) -> List[int]:
+    """
+    Ids of the given knowledge bases that have documents to search, in id
+    order, skipping ones being deleted
+    """
+    with span("kb.lookup", requested=len(knowledge_base_ids)):
+        result = await db.execute(
+            select(Document.knowledge_base_id)
+            .join(KnowledgeBase, KnowledgeBase.id == Document.knowledge_base_id)
+            .where(
+                Document.knowledge_base_id.in_(knowledge_base_ids),
+                KnowledgeBase.deleted_at.is_(None)
+            )
+            .distinct()
+            .order_by(Document.knowledge_base_id)
         )
+        return list(result.scalars())
 
-        # Create QA prompt
-        # Prompt trả lời QA tối ưu (chuyên nghiệp, có trích dẫn)
-        qa_system_prompt = (
-            "Bạn là một trợ lý AI chuyên tra cứu QUY TRÌNH NỘI BỘ.\n"
-            "Bạn chỉ được phép sử dụng thông tin trong QUY TRÌNH NỘI BỘ để trả lời câu hỏi.\n"
-            "Nếu không tìm thấy thông tin hoặc không chắc chắn, hãy báo rõ.\n"
-            "Trả lời ngắn gọn, chính xác, lịch sự, có trích dẫn đoạn tham chiếu theo định dạng [Trích dẫn: đoạn số X].\n"
-            "Bạn chỉ trả lời bằng tiếng việt \n"
-            "QUY TRÌNH NỘI BỘ:\n{context}"
-        )
 
-        qa_prompt = ChatPromptTemplate.from_messages([
-            ("system", qa_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}")
-        ])
-
-        # 修改 create_stuff_documents_chain 来自定义 context 格式
-        document_prompt = PromptTemplate.from_template("\n\n- {page_content}\n\n")
-
-        # Create QA chain
-        question_answer_chain = create_stuff_documents_chain(
-            llm,
-            qa_prompt,
-            document_variable_name="context",
-            document_prompt=document_prompt
+async def answer_question(
+    query: str,
+    chat_history: List[BaseMessage],
+    kb_ids: List[int],
+    mmr_lambda: Optional[float] = None,
+    mmr_fetch_k: Optional[int] = None,
+    candidates: Optional[List[LangchainDocument]] = None,
+) -> str:
+    """
+    Retrieve context from the knowledge bases and answer with the LLM.
+
+    candidates, when given, are the hybrid search results for the raw query
+    already fetched by the caller (see answer_questions); that retrieval is
+    then skipped.
+    """
+    # Initialize embeddings
+    embeddings = EmbeddingsFactory.create()
+
+    # top_k = 3
+    # score_threshold = 0.6
+
+    # vector_stores = []
+    # for kb in knowledge_bases:
+    #     documents = db.query(Document).filter(Document.knowledge_base_id == kb.id).all()
+    #     if documents:
+    #         vector_store = VectorStoreFactory.create(
+    #             store_type=settings.VECTOR_STORE_TYPE,
+    #             collection_name=f"kb_{kb.id}",
+    #             embedding_function=embeddings,
+    #         )
+    #         vector_stores.append(vector_store)
+
+    # if not vector_stores:
+    #     error_msg = "I don't have any knowledge base to help answer your question."
+    #     yield f'0:"{error_msg}"\n'
+    #     bot_message.content = error_msg
+    #     db.commit()
+    #     return
+
+    # # Truy vấn và lọc score
+    # vs = vector_stores[0]
+    # print("Vector store:", vs)
+    # results = vs.similarity_search_with_score(query, k=top_k)  # [(doc, score), ...]
+    # print("Raw results:", results)
+    # filtered_docs = [doc for doc, score in results if score >= score_threshold]
+    # print("Filtered results:", filtered_docs)
+
+    # if not filtered_docs:
+    #     error_msg = "Information is missing on related topic."
+    #     yield f'0:"{error_msg}"\n'
+    #     bot_message.content = error_msg
+    #     db.commit()
+    #     return
+    top_k = TOP_K
+
+    vector_stores = [
+        VectorStoreFactory.create(
+            store_type=settings.VECTOR_STORE_TYPE,
+            collection_name=f"kb_{kb_id}",
+            embedding_function=embeddings,
         )
+        for kb_id in kb_ids
+    ]
+
+    # Thay vì dùng similarity_search_with_score và lọc score thủ công
+    # ta dùng phương thức hybrid_search đã tích hợp BM25 với vector
+    vs = vector_stores[0]
+
+    # Initialize the language model
+    llm = LLMFactory.create()
+
+    # With a reranker, MMR runs after it over the reranked pool: reranking
+    # an MMR selection would sort the diversity back out
+    rerank_first = get_reranker() is not None
+    pool_size = candidate_pool_size(top_k)
+    if rerank_first and uses_mmr(mmr_lambda):
+        pool_size = max(pool_size, mmr_fetch_k or settings.MMR_FETCH_K)
+
+    # Gọi hybrid_search với top_k và trọng số weights để cân bằng vector và bm25
+    async def retrieve(search_query: str):
+        with span("retrieve", collection=f"kb_{kb_ids[0]}"):
+            return await hybrid_retrieve(
+                vs,
+                search_query,
+                k=pool_size,
+                weights=[0.4, 0.6],
+                mmr_lambda=1.0 if rerank_first else mmr_lambda,
+                mmr_fetch_k=mmr_fetch_k,
+            )  # trả về danh sách Document, không có score
+
+    # With history, the question is rewritten into a standalone one. In
+    # speculative mode retrieval on the raw query runs while the rewrite is
+    # generated; a second retrieval runs only if the rewrite differs enough.
+    search_query = query
+    if not chat_history:
+        results = candidates if candidates is not None else await retrieve(query)
+    else:
+        if candidates is not None:
+            results = candidates
+            search_query = await rewrite_query(llm, query, chat_history)
+        elif settings.SPECULATIVE_RETRIEVAL:
+            raw_retrieval = asyncio.create_task(retrieve(query))
+            try:
+                search_query = await rewrite_query(llm, query, chat_history)
+            except BaseException:
+                raw_retrieval.cancel()
+                raise
+            results = await raw_retrieval
+        else:
+            results = await retrieve(query)
+            search_query = await rewrite_query(llm, query, chat_history)
+        if query_divergence(query, search_query) >= settings.REWRITE_MIN_DIVERGENCE:
+            results = merge_candidates([results, await retrieve(search_query)])
 
-        # Create retrieval chain
-        rag_chain = create_retrieval_chain(
-            history_aware_retriever,
-            question_answer_chain,
+    # Rerank the wider candidate pool, then keep top_k of it, diversified
+    # by MMR when requested
+    if rerank_first:
+        results = await rerank_documents(search_query, results, top_n=len(results))
+        with span("mmr", candidates=len(results)):
+            results = await diversify(vs, results, top_k, mmr_lambda)
+    else:
+        results = results[:top_k]
+
+    # Merge neighbouring chunks and keep the context within the model window
+    with span("pack_context", candidates=len(results)):
+        token_budget = context_token_budget(
+            query, *(message.content for message in chat_history)
         )
+        results = pack_context(results, token_budget)
+
+    logger.debug("Packed %d context documents for query %r", len(results), search_query)
+
+    if not results:
+        return "Information is missing on related topic."
+
+    # The question was already rewritten above, so the chain just serves the
+    # packed documents
+    filtered_retriever = StaticListRetriever(docs=results)
+
+    # Create QA prompt
+    # Prompt trả lời QA tối ưu (chuyên nghiệp, có trích dẫn)
+    qa_system_prompt = (
+        "Bạn là một trợ lý AI chuyên tra cứu QUY TRÌNH NỘI BỘ.\n"
+        "Bạn chỉ được phép sử dụng thông tin trong QUY TRÌNH NỘI BỘ để trả lời câu hỏi.\n"
+        "Nếu không tìm thấy thông tin hoặc không chắc chắn, hãy báo rõ.\n"
+        "Trả lời ngắn gọn, chính xác, lịch sự, có trích dẫn đoạn tham chiếu theo định dạng [Trích dẫn: đoạn số X].\n"
+        "Bạn chỉ trả lời bằng tiếng việt \n"
+        "QUY TRÌNH NỘI BỘ:\n{context}"
+    )
 
-        # Generate response
-        chat_history = []
-        for message in messages["messages"]:
-            if message["role"] == "user":
-                chat_history.append(HumanMessage(content=message["content"]))
-            elif message["role"] == "assistant":
-                # if include __LLM_RESPONSE__, only use the last part
-                if "__LLM_RESPONSE__" in message["content"]:
-                    message["content"] = message["content"].split("__LLM_RESPONSE__")[-1]
-                chat_history.append(AIMessage(content=message["content"]))
-
-        full_response = ""
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", qa_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}")
+    ])
+
+    # 修改 create_stuff_documents_chain 来自定义 context 格式
+    document_prompt = PromptTemplate.from_template("\n\n- {page_content}\n\n")
+
+    # Create QA chain
+    question_answer_chain = create_stuff_documents_chain(
+        llm,
+        qa_prompt,
+        document_variable_name="context",
+        document_prompt=document_prompt
+    )
+
+    # Create retrieval chain
+    rag_chain = create_retrieval_chain(
+        filtered_retriever,
+        question_answer_chain,
+    )
+
+    # Generate response
+    full_response = ""
+    with span("generate", provider=settings.CHAT_PROVIDER):
         async for chunk in rag_chain.astream({
             "input": query,
             "chat_history": chat_history
@@ -210,7 +348,7 @@ async def generate_response(
             #             "metadata": context.metadata,
             #         }
             #         serializable_context.append(serializable_doc)
-                
+            
             #     # 先替换引号，再序列化
             #     escaped_context = json.dumps({
             #         "context": serializable_context
@@ -221,28 +359,115 @@ async def generate_response(
 
             #     # 连接符号
             #     separator = "__LLM_RESPONSE__"
-                
+            
             #     yield f'0:"{base64_context}{separator}"\n'
             #     full_response += base64_context + separator
 
             if "answer" in chunk:
                 full_response += chunk["answer"]
-        # Escape ký tự đặc biệt, xuống dòng
-        escaped_response = full_response.replace('"', '\\"').replace('\n', '\\n')
-        # Yield đúng format 1 lần duy nhất với toàn bộ response
-        yield f'0:"{escaped_response}"\n'
-        # Update bot message content
-        bot_message.content = full_response
-        db.commit()
-            
-    except Exception as e:
-        error_message = f"Error generating response: {str(e)}"
-        print(error_message)
-        yield '3:{text}\n'.format(text=error_message)
-        
-        # Update bot message with error
-        if 'bot_message' in locals():
-            bot_message.content = error_message
-            db.commit()
+    return full_response
+
+
+class BatchQuestion(NamedTuple):
+    query: str
+    chat_history: List[BaseMessage]
+    mmr_lambda: Optional[float] = None
+    mmr_fetch_k: Optional[int] = None
+
+
+async def answer_questions(
+    questions: Sequence[BatchQuestion],
+    kb_ids: List[int],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Answer many questions against the same knowledge bases, yielding
+    (index, answer, error) as each one finishes.
+
+    Raw-query retrieval runs in groups of AGENT_BATCH_RETRIEVAL_SIZE with one
+    embedding call and one BM25 pass per group; questions asking for MMR
+    retrieve on their own. At most `concurrency` answers are generated at a
+    time, each holding an LLM admission slot, and retrieval runs at most about
+    one group ahead of generation. A question turned away by admission control
+    backs off and retries for up to AGENT_BATCH_ADMISSION_WAIT seconds. Each answer is traced separately, linked
+    to the caller's span.
+    """
+    concurrency = max(1, concurrency or settings.AGENT_BATCH_CONCURRENCY)
+    group_size = max(1, settings.AGENT_BATCH_RETRIEVAL_SIZE)
+    generation = asyncio.Semaphore(concurrency)
+    window = asyncio.Semaphore(concurrency + group_size)
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    link = current_link()
+
+    vector_store = VectorStoreFactory.create(
+        store_type=settings.VECTOR_STORE_TYPE,
+        collection_name=f"kb_{kb_ids[0]}",
+        embedding_function=EmbeddingsFactory.create(),
+    )
+
+    async def answer(index: int, question: BatchQuestion, candidates: Optional[List[LangchainDocument]]):
+        try:
+            with start_trace("chat.batch_item", parent=link, index=index):
+                async with generation:
+                    await llm_admission.acquire_with_retry(settings.AGENT_BATCH_ADMISSION_WAIT)
+                    start = time.monotonic()
+                    try:
+                        reply = await answer_question(
+                            question.query,
+                            question.chat_history,
+                            kb_ids,
+                            question.mmr_lambda,
+                            question.mmr_fetch_k,
+                            candidates=candidates,
+                        )
+                    finally:
+                        llm_admission.release(time.monotonic() - start)
+            await finished.put((index, reply, None))
+        except Exception as e:
+            logger.warning(f"Batch question {index} failed: {str(e)}")
+            await finished.put((index, None, str(e)))
+        finally:
+            window.release()
+
+    async def produce():
+        scheduled = 0
+        try:
+            for start in range(0, len(questions), group_size):
+                group = list(enumerate(questions[start:start + group_size], start))
+                for _ in group:
+                    await window.acquire()
+
+                batched = [(index, question) for index, question in group if not uses_mmr(question.mmr_lambda)]
+                candidates = {}
+                if batched:
+                    try:
+                        with span("retrieve.batch", queries=len(batched)):
+                            hits = await vector_store.abatch_search(
+                                [question.query for _, question in batched],
+                                k=candidate_pool_size(TOP_K),
+                                weights=[0.4, 0.6],
+                            )
+                        candidates = {
+                            index: [doc for doc, _ in question_hits]
+                            for (index, _), question_hits in zip(batched, hits)
+                        }
+                    except Exception as e:
+                        # Each question then retrieves on its own
+                        logger.warning(f"Batched retrieval failed: {str(e)}")
+
+                for index, question in group:
+                    tasks.add(asyncio.create_task(answer(index, question, candidates.get(index))))
+                    scheduled += 1
+        except Exception as e:
+            for index in range(scheduled, len(questions)):
+                await finished.put((index, None, str(e)))
+
+    producer = asyncio.create_task(produce())
+    try:
+        for _ in range(len(questions)):
+            yield await finished.get()
     finally:
-        db.close()
\ No newline at end of file
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
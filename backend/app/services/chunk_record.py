@@ -1,15 +1,21 @@
 from typing import Optional, List, Dict, Set
-from sqlalchemy import create_engine, text
+import zlib
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.core.config import settings
+from app.db.engine import get_engine
 from app.models.knowledge import DocumentChunk
 import json
 
+
+def compress_text(content: str) -> bytes:
+    return zlib.compress(content.encode("utf-8"))
+
+
 class ChunkRecord:
     """Manages chunk-level record keeping for incremental updates"""
     def __init__(self, kb_id: int):
         self.kb_id = kb_id
-        self.engine = create_engine(settings.get_database_url)
+        self.engine = get_engine()
     
     def list_chunks(self, file_name: Optional[str] = None) -> Set[str]:
         """List all chunk hashes for the given file"""
@@ -30,12 +36,15 @@ class ChunkRecord:
             
         with Session(self.engine) as session:
             for chunk_data in chunks:
+                metadata = dict(chunk_data['metadata'])
+                content = chunk_data.get('content', metadata.pop('page_content', None))
                 chunk = DocumentChunk(
                     id=chunk_data['id'],
                     kb_id=chunk_data['kb_id'],
                     document_id=chunk_data['document_id'],
                     file_name=chunk_data['file_name'],
-                    chunk_metadata=chunk_data['metadata'],
+                    chunk_metadata=metadata,
+                    compressed_content=None if content is None else compress_text(content),
                     hash=chunk_data['hash']
                 )
                 session.merge(chunk)  # Use merge instead of add to handle updates
@@ -6,14 +6,8 @@ import traceback
 from datetime import datetime
 from app.db.session import SessionLocal
 from io import BytesIO
-from typing import Optional, List, Dict, Set
+from typing import Optional, List, Dict, Set, Tuple
 from fastapi import UploadFile
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    Docx2txtLoader,
-    UnstructuredMarkdownLoader,
-    TextLoader
-)
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
 from pydantic import BaseModel
@@ -21,16 +15,35 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.core.minio import get_minio_client
+from app.core.pubsub import task_events
+from app.core.registry import LazyRegistry
+from app.core.tracing import current_link, span, start_trace
 from app.models.knowledge import ProcessingTask, Document, DocumentChunk
-from app.services.chunk_record import ChunkRecord
+from app.services.chunk_record import ChunkRecord, compress_text
 import uuid
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredFileLoader
 from minio.error import MinioException
 from minio import Minio
 from minio.commonconfig import CopySource
 from app.services.vector_store import VectorStoreFactory
 from app.services.embedding.embedding_factory import EmbeddingsFactory
+from app.services.retrieval.tokens import count_tokens
+
+# Loaders by file extension, imported on first use so their parsers
+# (pypdf, docx2txt, unstructured) load only for the formats uploaded
+document_loaders: LazyRegistry[type] = LazyRegistry("document loader", {
+    ".pdf": "langchain_community.document_loaders:PyPDFLoader",
+    ".docx": "langchain_community.document_loaders:Docx2txtLoader",
+    ".md": "langchain_community.document_loaders:UnstructuredMarkdownLoader",
+    ".txt": "langchain_community.document_loaders:TextLoader",
+})
+
+
+def create_loader(path: str, ext: str):
+    """Loader for a file by its extension; unknown extensions load as text"""
+    loader_class = document_loaders.get(ext if ext in document_loaders else ".txt")
+    return loader_class(path)
+
 
 class UploadResult(BaseModel):
     file_path: str
@@ -47,6 +60,56 @@ class PreviewResult(BaseModel):
     chunks: List[TextChunk]
     total_chunks: int
 
+# Overall progress reported when each ingestion stage starts; storing chunks
+# advances from "store" towards "index" as batches are committed
+STAGE_PROGRESS = {
+    "download": 0.0,
+    "load": 0.05,
+    "split": 0.15,
+    "store": 0.2,
+    "index": 0.5,
+    "completed": 1.0,
+}
+
+# Chunk metadata sent to the vector store: ids, filter fields and what
+# citations and context packing read. The full loader metadata stays in
+# document_chunks.chunk_metadata.
+VECTOR_METADATA_KEYS = (
+    "chunk_id",
+    "kb_id",
+    "document_id",
+    "source",
+    "file_name",
+    "page",
+    "start_index",
+    "token_count",
+)
+
+def vector_metadata(metadata: Dict) -> Dict:
+    return {key: metadata[key] for key in VECTOR_METADATA_KEYS if key in metadata}
+
+def task_state(
+    task_id: int,
+    status: str,
+    upload_id: Optional[int] = None,
+    file_name: Optional[str] = None,
+    document_id: Optional[int] = None,
+    error_message: Optional[str] = None,
+    stage: Optional[str] = None,
+    progress: Optional[float] = None
+) -> Dict:
+    """State of a processing task as sent to clients, polled or streamed"""
+    return {
+        "task_id": task_id,
+        "document_id": document_id,
+        "status": status,
+        "error_message": error_message,
+        "upload_id": upload_id,
+        "file_name": file_name,
+        "stage": stage,
+        "progress": progress,
+    }
+
 
 async def process_document(file_path: str, file_name: str, kb_id: int, document_id: int, chunk_size: int = 1000, chunk_overlap: int = 200) -> None:
     """Process document and store in vector database with incremental updates"""
@@ -100,7 +163,8 @@ async def process_document(file_path: str, file_name: str, kb_id: int, document_
                 "chunk_id": chunk_id,
                 "file_name": file_name,
                 "kb_id": kb_id,
-                "document_id": document_id
+                "document_id": document_id,
+                "token_count": count_tokens(chunk.content)
             }
             
             new_chunks.append({
@@ -109,13 +173,14 @@ async def process_document(file_path: str, file_name: str, kb_id: int, document_
                 "document_id": document_id,
                 "file_name": file_name,
                 "metadata": metadata,
+                "content": chunk.content,
                 "hash": chunk_hash
             })
             
             # Prepare document for vector store
             doc = LangchainDocument(
                 page_content=chunk.content,
-                metadata=metadata
+                metadata=vector_metadata(metadata)
             )
             documents_to_update.append(doc)
         
@@ -123,14 +188,14 @@ async def process_document(file_path: str, file_name: str, kb_id: int, document_
         if new_chunks:
             logger.info(f"Adding {len(new_chunks)} new/updated chunks")
             chunk_manager.add_chunks(new_chunks)
-            vector_store.add_documents(documents_to_update)
+            await vector_store.aadd_documents(documents_to_update)
         
         # Delete removed chunks
         chunks_to_delete = chunk_manager.get_deleted_chunks(current_hashes, file_name)
         if chunks_to_delete:
             logger.info(f"Removing {len(chunks_to_delete)} deleted chunks")
             chunk_manager.delete_chunks(chunks_to_delete)
-            vector_store.delete(chunks_to_delete)
+            await vector_store.adelete(chunks_to_delete)
         
         logger.info("Document processing completed successfully")
         
@@ -199,14 +264,7 @@ async def preview_document(file_path: str, chunk_size: int = 1000, chunk_overlap
     
     try:
         # Select appropriate loader
-        if ext == ".pdf":
-            loader = PyPDFLoader(temp_path)
-        elif ext == ".docx":
-            loader = Docx2txtLoader(temp_path)
-        elif ext == ".md":
-            loader = UnstructuredMarkdownLoader(temp_path)
-        else:  # Default to text loader
-            loader = TextLoader(temp_path)
+        loader = create_loader(temp_path, ext)
         
         # Load and split the document
         documents = loader.load()
@@ -233,6 +291,29 @@ async def preview_document(file_path: str, chunk_size: int = 1000, chunk_overlap
         os.unlink(temp_path)
 
 async def process_document_background(
+    temp_path: str,
+    file_name: str,
+    kb_id: int,
+    task_id: int,
+    db: Session = None,
+    chunk_size: int = 2048,
+    chunk_overlap: int = 200,
+    trace_parent: Optional[Tuple[str, str]] = None
+) -> None:
+    """
+    Process document in background, traced as part of the request that
+    queued it (trace_parent from current_link(), or the current span).
+    """
+    with start_trace(
+        "ingest.process_document",
+        parent=trace_parent or current_link(),
+        kb_id=kb_id,
+        task_id=task_id,
+    ):
+        await _process_document(temp_path, file_name, kb_id, task_id, db, chunk_size, chunk_overlap)
+
+
+async def _process_document(
     temp_path: str,
     file_name: str,
     kb_id: int,
@@ -241,7 +322,6 @@ async def process_document_background(
     chunk_size: int = 2048,
     chunk_overlap: int = 200
 ) -> None:
-    """Process document in background"""
     logger = logging.getLogger(__name__)
     logger.info(f"Starting background processing for task {task_id}, file: {file_name}")
 
@@ -256,11 +336,21 @@ async def process_document_background(
     if not task:
         logger.error(f"Task {task_id} not found")
         return
+
+    upload_id = task.document_upload_id
+
+    def publish(status: str, stage: Optional[str] = None, progress: Optional[float] = None, **fields) -> None:
+        if progress is None:
+            progress = STAGE_PROGRESS.get(stage)
+        task_events.publish(kb_id, task_state(
+            task_id, status, upload_id, file_name, stage=stage, progress=progress, **fields
+        ))
     
     try:
         logger.info(f"Task {task_id}: Setting status to processing")
         task.status = "processing"
         db.commit()
+        publish("processing", "download")
         
         # 1. 从临时目录下载文件
         minio_client = get_minio_client()
@@ -285,26 +375,25 @@ async def process_document_background(
             
             logger.info(f"Task {task_id}: Loading document with extension {ext}")
             # 选择合适的加载器
-            if ext == ".pdf":
-                loader = PyPDFLoader(local_temp_path)
-            elif ext == ".docx":
-                loader = Docx2txtLoader(local_temp_path)
-            elif ext == ".md":
-                loader = UnstructuredMarkdownLoader(local_temp_path)
-            else:  # 默认使用文本加载器
-                loader = TextLoader(local_temp_path)
+            loader = create_loader(local_temp_path, ext)
             
             logger.info(f"Task {task_id}: Loading document content")
-            documents = loader.load()
+            publish("processing", "load")
+            with span("ingest.load"):
+                documents = loader.load()
             logger.info(f"Task {task_id}: Document loaded successfully")
             
             logger.info(f"Task {task_id}: Splitting document into chunks")
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                separators=["\n\n", "\n", " ", ""]
+                separators=["\n\n", "\n", " ", ""],
+                # Offsets let context packing merge neighbouring chunks
+                add_start_index=True
             )
-            chunks = text_splitter.split_documents(documents)
+            publish("processing", "split")
+            with span("ingest.split"):
+                chunks = text_splitter.split_documents(documents)
             logger.info(f"Task {task_id}: Document split into {len(chunks)} chunks")
             
             # 3. 创建向量存储
@@ -342,55 +431,61 @@ async def process_document_background(
                 logger.error(f"Task {task_id}: {error_msg}")
                 raise Exception(error_msg)
             
-            # 5. 创建文档记录
-            logger.info(f"Task {task_id}: Creating document record")
-            document = Document(
-                file_name=file_name,
-                file_path=permanent_path,
-                file_hash=task.document_upload.file_hash,
-                file_size=task.document_upload.file_size,
-                content_type=task.document_upload.content_type,
-                knowledge_base_id=kb_id
-            )
-            db.add(document)
-            db.commit()
-            db.refresh(document)
-            logger.info(f"Task {task_id}: Document record created with ID {document.id}")
+            with span("db.write", table="document_chunks"):
+                # 5. 创建文档记录
+                logger.info(f"Task {task_id}: Creating document record")
+                document = Document(
+                    file_name=file_name,
+                    file_path=permanent_path,
+                    file_hash=task.document_upload.file_hash,
+                    file_size=task.document_upload.file_size,
+                    content_type=task.document_upload.content_type,
+                    knowledge_base_id=kb_id
+                )
+                db.add(document)
+                db.commit()
+                db.refresh(document)
+                logger.info(f"Task {task_id}: Document record created with ID {document.id}")
             
-            # 6. 存储文档块
-            logger.info(f"Task {task_id}: Storing document chunks")
-            for i, chunk in enumerate(chunks):
-                # 为每个 chunk 生成唯一的 ID
-                chunk_id = hashlib.sha256(
-                    f"{kb_id}:{file_name}:{chunk.page_content}".encode()
-                ).hexdigest()
+                # 6. 存储文档块
+                logger.info(f"Task {task_id}: Storing document chunks")
+                publish("processing", "store")
+                for i, chunk in enumerate(chunks):
+                    # 为每个 chunk 生成唯一的 ID
+                    chunk_id = hashlib.sha256(
+                        f"{kb_id}:{file_name}:{chunk.page_content}".encode()
+                    ).hexdigest()
 
-                chunk.metadata["source"] = file_name
-                chunk.metadata["kb_id"] = kb_id
-                chunk.metadata["document_id"] = document.id
-                chunk.metadata["chunk_id"] = chunk_id
+                    chunk.metadata["source"] = file_name
+                    chunk.metadata["kb_id"] = kb_id
+                    chunk.metadata["document_id"] = document.id
+                    chunk.metadata["chunk_id"] = chunk_id
+                    chunk.metadata["token_count"] = count_tokens(chunk.page_content)
                 
-                doc_chunk = DocumentChunk(
-                    id=chunk_id,  # 添加 ID 字段
-                    document_id=document.id,
-                    kb_id=kb_id,
-                    file_name=file_name,
-                    chunk_metadata={
-                        "page_content": chunk.page_content,
-                        **chunk.metadata
-                    },
-                    hash=hashlib.sha256(
-                        (chunk.page_content + str(chunk.metadata)).encode()
-                    ).hexdigest()
-                )
-                db.add(doc_chunk)
-                if i > 0 and i % 100 == 0:
-                    logger.info(f"Task {task_id}: Stored {i} chunks")
-                    db.commit()  # 每 100 条提交一次，避免事务太大
+                    doc_chunk = DocumentChunk(
+                        id=chunk_id,  # 添加 ID 字段
+                        document_id=document.id,
+                        kb_id=kb_id,
+                        file_name=file_name,
+                        chunk_metadata=dict(chunk.metadata),
+                        compressed_content=compress_text(chunk.page_content),
+                        hash=hashlib.sha256(
+                            (chunk.page_content + str(chunk.metadata)).encode()
+                        ).hexdigest()
+                    )
+                    db.add(doc_chunk)
+                    chunk.metadata = vector_metadata(chunk.metadata)
+                    if i > 0 and i % 100 == 0:
+                        logger.info(f"Task {task_id}: Stored {i} chunks")
+                        db.commit()  # 每 100 条提交一次，避免事务太大
+                        store_share = STAGE_PROGRESS["index"] - STAGE_PROGRESS["store"]
+                        publish("processing", "store", STAGE_PROGRESS["store"] + store_share * i / len(chunks))
             
             # 7. 添加到向量存储
             logger.info(f"Task {task_id}: Adding chunks to vector store")
-            vector_store.add_documents(chunks)
+            publish("processing", "index")
+            with span("ingest.index", chunks=len(chunks)):
+                await vector_store.aadd_documents(chunks)
             # 移除 persist() 调用，因为新版本不需要
             logger.info(f"Task {task_id}: Chunks added to vector store")
             
@@ -406,6 +501,7 @@ async def process_document_background(
                 upload.status = "completed"
             
             db.commit()
+            publish("completed", "completed", document_id=document.id)
             logger.info(f"Task {task_id}: Processing completed successfully")
             
         finally:
@@ -424,6 +520,7 @@ async def process_document_background(
         task.status = "failed"
         task.error_message = str(e)
         db.commit()
+        publish("failed", error_message=str(e))
         
         # 清理临时文件
         try:
@@ -1,9 +1,40 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
 from app.core.config import settings
-from langchain_openai import OpenAIEmbeddings
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.embeddings import DashScopeEmbeddings
-# If you plan on adding other embeddings, import them here
-# from some_other_module import AnotherEmbeddingClass
+from app.core.registry import LazyRegistry
+from app.core.tracing import span
+
+# Embeddings classes by provider, imported when the provider is first used.
+# If you plan on adding other embeddings, register them here
+embeddings_classes: LazyRegistry[type] = LazyRegistry("embeddings provider", {
+    "openai": "langchain_openai:OpenAIEmbeddings",
+    "dashscope": "langchain_community.embeddings:DashScopeEmbeddings",
+    "ollama": "langchain_ollama:OllamaEmbeddings",
+})
+
+
+class TracedEmbeddings(Embeddings):
+    """Embeddings wrapper recording an "embed" span around every call"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed", texts=1):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed", texts=len(texts)):
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with span("embed", texts=1):
+            return await self.embeddings.aembed_query(text)
 
 
 class EmbeddingsFactory:
@@ -12,22 +43,27 @@ class EmbeddingsFactory:
         """
         Factory method to create an embeddings instance based on .env config.
         """
+        return TracedEmbeddings(EmbeddingsFactory._create())
+
+    @staticmethod
+    def _create() -> Embeddings:
         # Suppose your .env has a value like EMBEDDINGS_PROVIDER=openai
         embeddings_provider = settings.EMBEDDINGS_PROVIDER.lower()
+        embeddings_class = embeddings_classes.get(embeddings_provider)
 
         if embeddings_provider == "openai":
-            return OpenAIEmbeddings(
+            return embeddings_class(
                 openai_api_key=settings.OPENAI_API_KEY,
                 openai_api_base=settings.OPENAI_API_BASE,
                 model=settings.OPENAI_EMBEDDINGS_MODEL
             )
         elif embeddings_provider == "dashscope":
-            return DashScopeEmbeddings(
+            return embeddings_class(
                 model=settings.DASH_SCOPE_EMBEDDINGS_MODEL,
                 dashscope_api_key=settings.DASH_SCOPE_API_KEY
             )
         elif embeddings_provider == "ollama":
-            return OllamaEmbeddings(
+            return embeddings_class(
                 model=settings.OLLAMA_EMBEDDINGS_MODEL,
                 base_url=settings.OLLAMA_API_BASE
             )
@@ -0,0 +1,213 @@
+"""
+Background deletion of knowledge bases.
+
+DELETE /knowledge-base/{id} only tombstones the row (deleted_at), which
+hides it from every query at once. This job then removes what it owned:
+MinIO objects through bulk remove_objects calls, the vector collection,
+and the database rows in id batches rather than through ORM cascades,
+recording progress on the row as it goes. Every step is idempotent, so an
+interrupted job is simply started again (see resume_deletions).
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from minio.deleteobjects import DeleteObject
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.minio import get_minio_client
+from app.core.tracing import current_link, span, start_trace
+from app.db.session import SessionLocal
+from app.models.chat import chat_knowledge_bases
+from app.models.knowledge import (
+    Document,
+    DocumentChunk,
+    DocumentUpload,
+    KnowledgeBase,
+    ProcessingTask,
+)
+from app.services.embedding.embedding_factory import EmbeddingsFactory
+from app.services.vector_store import VectorStoreFactory
+
+logger = logging.getLogger(__name__)
+
+
+def new_deletion_progress() -> Dict[str, Any]:
+    return {
+        "stage": "pending",
+        "objects_removed": 0,
+        "chunks_deleted": 0,
+        "documents_deleted": 0,
+        "errors": [],
+        "updated_at": datetime.utcnow().isoformat(),
+    }
+
+
+class KnowledgeBaseDeletion:
+    def __init__(self, kb_id: int):
+        self.kb_id = kb_id
+        self.progress = new_deletion_progress()
+
+    def _save(self, db: Session) -> None:
+        self.progress["updated_at"] = datetime.utcnow().isoformat()
+        db.execute(
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == self.kb_id)
+            .values(deletion_progress=dict(self.progress))
+        )
+        db.commit()
+
+    def _set_stage(self, stage: str) -> None:
+        self.progress["stage"] = stage
+        with SessionLocal() as db:
+            self._save(db)
+
+    def remove_objects(self) -> None:
+        """Remove the kb_{id}/ objects from MinIO, a batch per request"""
+        self._set_stage("objects")
+        client = get_minio_client()
+        objects = client.list_objects(
+            settings.MINIO_BUCKET_NAME, prefix=f"kb_{self.kb_id}/", recursive=True
+        )
+        batch = []
+        for obj in objects:
+            batch.append(DeleteObject(obj.object_name))
+            if len(batch) >= settings.KB_DELETE_BATCH_SIZE:
+                self._remove_batch(client, batch)
+                batch = []
+        if batch:
+            self._remove_batch(client, batch)
+
+    def _remove_batch(self, client, batch) -> None:
+        # remove_objects is lazy: the request is sent while its errors are read
+        errors = list(client.remove_objects(settings.MINIO_BUCKET_NAME, batch))
+        for error in errors:
+            logger.warning(f"Failed to remove {error.name} for kb {self.kb_id}: {error.message}")
+        self.progress["objects_removed"] += len(batch) - len(errors)
+        with SessionLocal() as db:
+            self._save(db)
+
+    async def drop_vectors(self) -> None:
+        self._set_stage("vectors")
+        vector_store = VectorStoreFactory.create(
+            store_type=settings.VECTOR_STORE_TYPE,
+            collection_name=f"kb_{self.kb_id}",
+            embedding_function=EmbeddingsFactory.create(),
+        )
+        await vector_store.adelete_collection()
+
+    def delete_records(self) -> None:
+        """Delete the rows owned by the knowledge base, then the row itself"""
+        self._set_stage("records")
+        with SessionLocal() as db:
+            self._delete_in_batches(
+                db, DocumentChunk, DocumentChunk.id,
+                DocumentChunk.kb_id == self.kb_id, "chunks_deleted",
+            )
+            self._delete_in_batches(
+                db, ProcessingTask, ProcessingTask.id,
+                ProcessingTask.knowledge_base_id == self.kb_id,
+            )
+            self._delete_in_batches(
+                db, Document, Document.id,
+                Document.knowledge_base_id == self.kb_id, "documents_deleted",
+            )
+            self._delete_in_batches(
+                db, DocumentUpload, DocumentUpload.id,
+                DocumentUpload.knowledge_base_id == self.kb_id,
+            )
+            db.execute(
+                delete(chat_knowledge_bases)
+                .where(chat_knowledge_bases.c.knowledge_base_id == self.kb_id)
+            )
+            db.execute(delete(KnowledgeBase).where(KnowledgeBase.id == self.kb_id))
+            db.commit()
+
+    def _delete_in_batches(self, db: Session, model, key, criterion, counter: Optional[str] = None) -> None:
+        while True:
+            ids = db.execute(
+                select(key).where(criterion).limit(settings.KB_DELETE_BATCH_SIZE)
+            ).scalars().all()
+            if not ids:
+                return
+            db.execute(
+                delete(model)
+                .where(key.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+            if counter:
+                self.progress[counter] += len(ids)
+            self._save(db)
+
+    async def run(self) -> None:
+        logger.info(f"Deleting knowledge base {self.kb_id}")
+        try:
+            with span("kb.delete.objects"):
+                await asyncio.to_thread(self.remove_objects)
+        except Exception as e:
+            # The records still go; leftover objects are listed in the errors
+            logger.error(f"MinIO cleanup error for kb {self.kb_id}: {str(e)}")
+            self.progress["errors"].append(f"Failed to clean up MinIO files: {str(e)}")
+        try:
+            with span("kb.delete.vectors"):
+                await self.drop_vectors()
+        except Exception as e:
+            logger.error(f"Vector store cleanup error for kb {self.kb_id}: {str(e)}")
+            self.progress["errors"].append(f"Failed to clean up vector store: {str(e)}")
+        try:
+            with span("kb.delete.records"):
+                await asyncio.to_thread(self.delete_records)
+        except Exception as e:
+            logger.error(f"Failed to delete records of knowledge base {self.kb_id}: {str(e)}")
+            self.progress["errors"].append(f"Failed to delete records: {str(e)}")
+            self.progress["stage"] = "failed"
+            await asyncio.to_thread(self._save_failure)
+            return
+        logger.info(f"Knowledge base {self.kb_id} deleted: {self.progress}")
+
+    def _save_failure(self) -> None:
+        try:
+            with SessionLocal() as db:
+                self._save(db)
+        except Exception as e:
+            logger.error(f"Failed to record deletion failure of kb {self.kb_id}: {str(e)}")
+
+
+# Jobs running in this process, by knowledge base id; also keeps the tasks
+# referenced until they finish
+_running: Dict[int, asyncio.Task] = {}
+
+
+async def _run_deletion(kb_id: int, trace_parent: Optional[Tuple[str, str]]) -> None:
+    with start_trace("kb.delete", parent=trace_parent, kb_id=kb_id):
+        await KnowledgeBaseDeletion(kb_id).run()
+
+
+def schedule_deletion(kb_id: int, trace_parent: Optional[Tuple[str, str]] = None) -> None:
+    """Start the deletion job of a tombstoned knowledge base unless it is running"""
+    if kb_id in _running:
+        return
+    task = asyncio.create_task(_run_deletion(kb_id, trace_parent or current_link()))
+    _running[kb_id] = task
+    task.add_done_callback(lambda _: _running.pop(kb_id, None))
+
+
+def _tombstoned_ids() -> Set[int]:
+    with SessionLocal() as db:
+        return set(db.execute(
+            select(KnowledgeBase.id).where(KnowledgeBase.deleted_at.isnot(None))
+        ).scalars().all())
+
+
+async def resume_deletions() -> Set[int]:
+    """Restart the jobs of knowledge bases left tombstoned, e.g. by a restart"""
+    kb_ids = await asyncio.to_thread(_tombstoned_ids)
+    # Jobs are tasks, so they are scheduled on the event loop
+    for kb_id in kb_ids:
+        schedule_deletion(kb_id)
+    if kb_ids:
+        logger.info(f"Resumed deletion of knowledge bases {sorted(kb_ids)}")
+    return kb_ids
@@ -1,52 +1,144 @@
-from typing import Optional
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import httpx
 from langchain_core.language_models import BaseChatModel
-from langchain_openai import ChatOpenAI
-from langchain_deepseek import ChatDeepSeek
-from langchain_ollama import OllamaLLM
 from app.core.config import settings
+from app.core.registry import LazyRegistry
+
+logger = logging.getLogger(__name__)
+
+# Client classes by provider, imported when the provider is first used
+llm_classes: LazyRegistry[type] = LazyRegistry("LLM provider", {
+    "openai": "langchain_openai:ChatOpenAI",
+    "deepseek": "langchain_deepseek:ChatDeepSeek",
+    "ollama": "langchain_ollama:OllamaLLM",
+})
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Process-wide keep-alive pool for OpenAI-compatible providers"""
+    return httpx.Client(limits=_pool_limits(), timeout=_timeout())
+
+
+@lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of get_http_client"""
+    return httpx.AsyncClient(limits=_pool_limits(), timeout=_timeout())
+
 
 class LLMFactory:
-    @staticmethod
+    # Clients built so far, keyed by (provider, temperature, streaming). Chat
+    # models hold no per-conversation state, so one instance serves all turns.
+    _registry: Dict[Tuple[str, float, bool], BaseChatModel] = {}
+    _lock = threading.Lock()
+
+    @classmethod
     def create(
+        cls,
         provider: Optional[str] = None,
         temperature: float = 0,
         streaming: bool = True,
     ) -> BaseChatModel:
         """
-        Create a LLM instance based on the provider
+        Return the LLM client for the provider, building it on first use
         """
         # If no provider specified, use the one from settings
-        provider = 'ollama'
+        provider = (provider or settings.CHAT_PROVIDER).lower()
+        key = (provider, temperature, streaming)
+        client = cls._registry.get(key)
+        if client is None:
+            with cls._lock:
+                client = cls._registry.get(key)
+                if client is None:
+                    client = cls._build(provider, temperature, streaming)
+                    cls._registry[key] = client
+        return client
 
-        if provider.lower() == "openai":
-            return ChatOpenAI(
+    @staticmethod
+    def _build(provider: str, temperature: float, streaming: bool) -> BaseChatModel:
+        """
+        Create a LLM instance based on the provider
+        """
+        llm_class = llm_classes.get(provider)
+        if provider == "openai":
+            return llm_class(
                 temperature=temperature,
                 streaming=streaming,
                 model=settings.OPENAI_MODEL,
                 openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_API_BASE
+                openai_api_base=settings.OPENAI_API_BASE,
+                http_client=get_http_client(),
+                http_async_client=get_async_http_client(),
             )
-        elif provider.lower() == "deepseek":
-            return ChatDeepSeek(
+        elif provider == "deepseek":
+            return llm_class(
                 temperature=temperature,
                 streaming=streaming,
                 model=settings.DEEPSEEK_MODEL,
                 api_key=settings.DEEPSEEK_API_KEY,
-                api_base=settings.DEEPSEEK_API_BASE
+                api_base=settings.DEEPSEEK_API_BASE,
+                http_client=get_http_client(),
+                http_async_client=get_async_http_client(),
             )
-        elif provider.lower() == "ollama":
-            # Initialize Ollama model
-            return OllamaLLM(
+        elif provider == "ollama":
+            # Initialize Ollama model. The Ollama client builds its own httpx
+            # pools from client_kwargs, once per registry entry.
+            return llm_class(
                 model=settings.OLLAMA_MODEL,
                 base_url=settings.OLLAMA_API_BASE,
                 temperature=0.0,
                 streaming=True,
                 repetition_penalty=1.2,
                 top_p=0.9,
-                top_k=50
+                top_k=50,
+                num_ctx=settings.LLM_CONTEXT_WINDOW,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                client_kwargs={"limits": _pool_limits(), "timeout": _timeout()},
             )
         # Add more providers here as needed
-        # elif provider.lower() == "anthropic":
+        # elif provider == "anthropic":
         #     return ChatAnthropic(...)
         else:
-            raise ValueError(f"Unsupported LLM provider: {provider}")
\ No newline at end of file
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+
+    @classmethod
+    async def warmup(cls) -> None:
+        """
+        Build the configured client and, for Ollama, load the chat and
+        embedding models into memory so the first request does not wait
+        for them.
+        """
+        provider = settings.CHAT_PROVIDER.lower()
+        try:
+            cls.create(provider)
+            if provider == "ollama":
+                from ollama import AsyncClient
+
+                client = AsyncClient(host=settings.OLLAMA_API_BASE, timeout=_timeout())
+                # An empty prompt only loads the model
+                await client.generate(
+                    model=settings.OLLAMA_MODEL, prompt="", keep_alive=settings.OLLAMA_KEEP_ALIVE
+                )
+            if settings.EMBEDDINGS_PROVIDER.lower() == "ollama":
+                from app.services.embedding.embedding_factory import EmbeddingsFactory
+
+                await EmbeddingsFactory.create().aembed_query("warmup")
+            logger.info(f"LLM warmup completed for provider {provider}")
+        except Exception as e:
+            logger.warning(f"LLM warmup failed for provider {provider}: {str(e)}")
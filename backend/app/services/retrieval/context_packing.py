@@ -0,0 +1,141 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from .tokens import count_tokens
+
+# Shortest suffix/prefix match treated as chunk overlap when chunks carry no
+# start_index (ingested before it was recorded)
+_MIN_TEXT_OVERLAP = 20
+
+
+def chunk_tokens(doc: Document) -> int:
+    """Token count recorded at ingest, counted on the fly for older chunks"""
+    tokens = doc.metadata.get("token_count")
+    return tokens if isinstance(tokens, int) else count_tokens(doc.page_content)
+
+
+def _group_key(doc: Document) -> Optional[Tuple[Hashable, Hashable]]:
+    document_id = doc.metadata.get("document_id")
+    if document_id is None:
+        return None
+    return document_id, doc.metadata.get("page")
+
+
+def _text_overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    for size in range(min(len(left), len(right), max_overlap), _MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Block:
+    """A run of consecutive chunks from one document page"""
+
+    def __init__(self, doc: Document, rank: int):
+        self.docs = [doc]
+        self.rank = rank
+        self.text = doc.page_content
+        self.tokens = chunk_tokens(doc)
+        self.start = doc.metadata.get("start_index")
+        self.end = None if self.start is None else self.start + len(doc.page_content)
+
+    def try_append(self, doc: Document, rank: int, max_overlap: int) -> bool:
+        """Append doc if it continues this block, dropping the repeated text"""
+        start = doc.metadata.get("start_index")
+        if self.end is not None and start is not None:
+            if start > self.end or start < self.start:
+                return False
+            overlap = self.end - start
+        else:
+            overlap = _text_overlap(self.text, doc.page_content, max_overlap)
+            if not overlap:
+                return False
+
+        added = doc.page_content[overlap:]
+        if doc.page_content:
+            self.tokens += round(chunk_tokens(doc) * len(added) / len(doc.page_content))
+        self.text += added
+        self.docs.append(doc)
+        self.rank = min(self.rank, rank)
+        if self.end is not None and start is not None:
+            self.end = max(self.end, start + len(doc.page_content))
+        return True
+
+    def to_document(self, text: Optional[str] = None) -> Document:
+        metadata = dict(self.docs[0].metadata)
+        if len(self.docs) > 1:
+            metadata["chunk_ids"] = [d.metadata.get("chunk_id") for d in self.docs]
+        metadata["token_count"] = self.tokens
+        return Document(page_content=self.text if text is None else text, metadata=metadata)
+
+
+def pack_context(
+    documents: List[Document],
+    token_budget: int,
+    max_overlap: int = 200,
+) -> List[Document]:
+    """
+    Fit retrieved chunks into a prompt token budget.
+
+    Chunks from the same document and page are ordered by position and
+    consecutive ones are merged with their overlapping text removed. Blocks
+    are then added best-ranked first until the budget is spent; blocks that
+    do not fit are skipped in favour of smaller ones further down. If not
+    even the best block fits, its text is truncated to the budget.
+
+    Args:
+        documents: Retrieved chunks, most relevant first.
+        token_budget: Tokens available for context in the prompt.
+        max_overlap: Longest overlap searched for in chunk text when
+            start_index is missing; the ingest chunk_overlap.
+
+    Returns:
+        Packed documents, most relevant first.
+    """
+    groups: Dict[Hashable, List[Tuple[int, Document]]] = {}
+    blocks: List[_Block] = []
+    seen = set()
+    for rank, doc in enumerate(documents):
+        identity = doc.metadata.get("chunk_id") or doc.page_content
+        if identity in seen:
+            continue
+        seen.add(identity)
+        key = _group_key(doc)
+        if key is None:
+            blocks.append(_Block(doc, rank))
+        else:
+            groups.setdefault(key, []).append((rank, doc))
+
+    for members in groups.values():
+        if all(doc.metadata.get("start_index") is not None for _, doc in members):
+            members.sort(key=lambda item: item[1].metadata["start_index"])
+        current = None
+        for rank, doc in members:
+            if current is None or not current.try_append(doc, rank, max_overlap):
+                current = _Block(doc, rank)
+                blocks.append(current)
+
+    blocks.sort(key=lambda block: block.rank)
+    packed, used = [], 0
+    for block in blocks:
+        if used + block.tokens <= token_budget:
+            packed.append(block.to_document())
+            used += block.tokens
+    if not packed and blocks and token_budget > 0:
+        best = blocks[0]
+        keep = int(len(best.text) * token_budget / max(best.tokens, 1))
+        best.tokens = token_budget
+        packed.append(best.to_document(best.text[:keep]))
+    return packed
+
+
+def context_token_budget(*prompt_texts: str) -> int:
+    """
+    Tokens left for retrieved context once the reserved answer/system prompt
+    share and the given prompt texts (query, history) are accounted for.
+    """
+    used = sum(count_tokens(text) for text in prompt_texts)
+    return max(0, settings.LLM_CONTEXT_WINDOW - settings.LLM_RESERVED_TOKENS - used)
@@ -0,0 +1,61 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    query_embedding: Optional[Sequence[float]],
+    candidate_embeddings: Sequence[Sequence[float]],
+    k: int = 5,
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """
+    Pick k diverse candidates by maximal marginal relevance.
+
+    All cosine similarities are computed up front with two matrix products;
+    each selection step then only updates a running "closest selected
+    candidate" vector, so the loop is O(k * n) instead of O(k^2 * n).
+
+    Args:
+        query_embedding: Query vector; may be None when relevance is given.
+        candidate_embeddings: One vector per candidate.
+        k: Number of candidates to select.
+        lambda_mult: Trade-off between relevance to the query (1) and
+            dissimilarity to already selected candidates (0).
+        relevance: Relevance of each candidate in [0, 1], e.g. from a
+            reranker, used instead of cosine similarity to the query.
+
+    Returns:
+        Indices into candidate_embeddings, in selection order.
+    """
+    if not 0.0 <= lambda_mult <= 1.0:
+        raise ValueError(f"lambda_mult must be between 0 and 1, got {lambda_mult}")
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
+
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        relevance = candidates @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+
+    pairwise = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
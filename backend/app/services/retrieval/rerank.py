@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.tracing import run_in_context, span
+from app.services.vector_store.base import document_key
+
+logger = logging.getLogger(__name__)
+
+# Reranking is CPU-bound; a small dedicated pool keeps it from starving the
+# vector store pool and caps how many cores it can take
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.RERANK_MAX_INFLIGHT),
+    thread_name_prefix="rerank",
+)
+
+# Reranks currently running; above RERANK_MAX_INFLIGHT the stage is skipped
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+
+def query_hash(query: str) -> str:
+    """Stable key for a query, insensitive to case and whitespace"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """Thread-safe LRU cache of relevance scores"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._scores: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[Hashable]) -> Dict[Hashable, float]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+        return found
+
+    def put_many(self, items: Dict[Hashable, float]) -> None:
+        with self._lock:
+            for key, score in items.items():
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+class BaseReranker(ABC):
+    """
+    Reorders retrieved candidates by a query-document relevance score.
+
+    Scores are cached per (query hash, chunk id), so only candidates not seen
+    for this query before are scored, all of them in one batch.
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        self.cache = ScoreCache(cache_size)
+
+    @abstractmethod
+    def score(self, query: str, documents: List[Document]) -> np.ndarray:
+        """Relevance of each document to the query, higher is better"""
+        pass
+
+    def rerank(self, query: str, documents: List[Document], top_n: Optional[int] = None) -> List[Document]:
+        if not documents:
+            return []
+        qhash = query_hash(query)
+        keys = [(qhash, document_key(doc)) for doc in documents]
+        scores = self.cache.get_many(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        if missing:
+            fresh = self.score(query, [documents[i] for i in missing])
+            computed = {keys[i]: float(s) for i, s in zip(missing, fresh)}
+            self.cache.put_many(computed)
+            scores.update(computed)
+
+        # Stable sort keeps the fused order between equal scores
+        order = sorted(range(len(documents)), key=lambda i: -scores[keys[i]])
+        return [documents[i] for i in order[:top_n]]
+
+
+class LexicalReranker(BaseReranker):
+    """
+    Dependency-free scorer blending saturated query-term frequency with
+    character trigram overlap, which tolerates inflections and typos that
+    exact terms miss. Scores depend only on the query and the chunk, never
+    on the rest of the candidate pool, so they are safe to cache.
+    """
+
+    def __init__(self, cache_size: int = 10000, trigram_weight: float = 0.5, k1: float = 1.2):
+        super().__init__(cache_size)
+        self.trigram_weight = trigram_weight
+        self.k1 = k1
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        text = " " + " ".join(text.lower().split()) + " "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def score(self, query: str, documents: List[Document]) -> np.ndarray:
+        terms = list(dict.fromkeys(query.lower().split()))
+        query_grams = self._trigrams(query)
+        if not terms:
+            return np.zeros(len(documents))
+
+        vocab = {term: j for j, term in enumerate(terms)}
+        tf = np.zeros((len(documents), len(terms)))
+        overlap = np.zeros(len(documents))
+        for d, doc in enumerate(documents):
+            text = doc.page_content.lower()
+            for token in text.split():
+                j = vocab.get(token)
+                if j is not None:
+                    tf[d, j] += 1
+            overlap[d] = len(query_grams & self._trigrams(text)) / max(len(query_grams), 1)
+
+        # BM25-style saturation: each term contributes at most 1
+        coverage = (tf / (tf + self.k1)).mean(axis=1) * (1 + self.k1)
+        w = self.trigram_weight
+        return (1 - w) * coverage + w * overlap
+
+
+class CrossEncoderReranker(BaseReranker):
+    """Small sentence-transformers cross-encoder run on CPU"""
+
+    def __init__(self, model_name: str, cache_size: int = 10000, max_length: int = 512):
+        super().__init__(cache_size)
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ValueError(
+                "RERANKER=cross-encoder requires the sentence-transformers package"
+            ) from e
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def score(self, query: str, documents: List[Document]) -> np.ndarray:
+        pairs = [(query, doc.page_content) for doc in documents]
+        return np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False))
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> Optional[BaseReranker]:
+    """Process-wide reranker selected by settings.RERANKER, or None if disabled"""
+    kind = settings.RERANKER.lower()
+    if kind == "none":
+        return None
+    if kind == "lexical":
+        return LexicalReranker(cache_size=settings.RERANK_CACHE_SIZE)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(settings.RERANK_MODEL, cache_size=settings.RERANK_CACHE_SIZE)
+    raise ValueError(
+        f"Unsupported reranker: {kind}. Supported types are: none, lexical, cross-encoder"
+    )
+
+
+def candidate_pool_size(top_k: int) -> int:
+    """How many candidates retrieval should return so reranking has a wider pool"""
+    if get_reranker() is None:
+        return top_k
+    return max(top_k, settings.RERANK_FETCH_K)
+
+
+async def rerank_documents(query: str, documents: List[Document], top_n: int) -> List[Document]:
+    """
+    Rerank retrieved candidates and keep the best top_n.
+
+    Falls back to the retrieval order when reranking is disabled or when
+    RERANK_MAX_INFLIGHT reranks are already running.
+    """
+    global _inflight
+    reranker = get_reranker()
+    if reranker is None or len(documents) <= 1:
+        return documents[:top_n]
+
+    with _inflight_lock:
+        if _inflight >= settings.RERANK_MAX_INFLIGHT:
+            logger.info("Skipping rerank under load (%d in flight)", _inflight)
+            return documents[:top_n]
+        _inflight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with span("rerank", candidates=len(documents), reranker=settings.RERANKER):
+            return await loop.run_in_executor(
+                _executor, run_in_context(reranker.rerank), query, documents, top_n
+            )
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
@@ -0,0 +1,72 @@
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.vector_store.base import BaseVectorStore, document_key
+from app.services.vector_store.hybrid import reciprocal_rank_fusion
+
+
+def uses_mmr(mmr_lambda: Optional[float] = None) -> bool:
+    """Whether the MMR stage runs for this request's lambda (default settings.MMR_LAMBDA)"""
+    return (settings.MMR_LAMBDA if mmr_lambda is None else mmr_lambda) < 1.0
+
+
+async def hybrid_retrieve(
+    vector_store: BaseVectorStore,
+    query: str,
+    k: int = 5,
+    weights: List[float] = [0.4, 0.6],
+    mmr_lambda: Optional[float] = None,
+    mmr_fetch_k: Optional[int] = None,
+) -> List[Document]:
+    """
+    Hybrid search with an optional MMR diversification stage.
+
+    Args:
+        mmr_lambda: MMR trade-off for this request; defaults to
+            settings.MMR_LAMBDA. 1.0 skips the stage.
+        mmr_fetch_k: Candidate pool size for MMR; defaults to
+            settings.MMR_FETCH_K.
+    """
+    if not uses_mmr(mmr_lambda):
+        return await vector_store.ahybrid_search(query, k=k, weights=weights)
+    lambda_mult = settings.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    fetch_k = max(k, mmr_fetch_k or settings.MMR_FETCH_K)
+    return await vector_store.ammr_search(
+        query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, weights=weights
+    )
+
+
+async def diversify(
+    vector_store: BaseVectorStore,
+    documents: List[Document],
+    k: int,
+    mmr_lambda: Optional[float] = None,
+) -> List[Document]:
+    """
+    MMR over an already ranked (e.g. reranked) pool, keeping k documents.
+
+    Used when a stage after retrieval reorders the candidates: MMR then has
+    to run last for its diversity to reach the result.
+    """
+    if not uses_mmr(mmr_lambda) or len(documents) <= k:
+        return documents[:k]
+    lambda_mult = settings.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    return await vector_store.adiversify(documents, k, lambda_mult)
+
+
+def query_divergence(query: str, other: str) -> float:
+    """1 - Jaccard similarity of the two queries' lower-cased term sets"""
+    a, b = set(query.lower().split()), set(other.lower().split())
+    if not a and not b:
+        return 0.0
+    return 1.0 - len(a & b) / len(a | b)
+
+
+def merge_candidates(candidate_lists: Sequence[List[Document]]) -> List[Document]:
+    """Merge ranked candidate lists with equal-weight RRF, dropping duplicates"""
+    fused = reciprocal_rank_fusion(
+        candidate_lists, [1.0] * len(candidate_lists), key=document_key
+    )
+    return [doc for doc, _ in fused]
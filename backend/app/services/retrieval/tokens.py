@@ -0,0 +1,25 @@
+from functools import lru_cache
+from typing import Callable
+
+
+@lru_cache(maxsize=1)
+def _encoder() -> Callable[[str], list]:
+    """tiktoken's cl100k encoder when available, else a ~4 chars/token estimate"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base").encode
+    except Exception:
+        return lambda text: range((len(text) + 3) // 4)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate prompt tokens of a text.
+
+    Local models use their own tokenizers, so this is an estimate meant for
+    budgeting, not an exact count.
+    """
+    if not text:
+        return 0
+    return len(_encoder()(text))
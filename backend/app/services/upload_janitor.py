@@ -0,0 +1,189 @@
+"""
+Periodic cleanup of temporary uploads.
+
+Uploaded files wait under kb_{id}/temp/ with a document_uploads row until
+they are processed. The janitor removes what is left behind:
+
+- expired uploads (older than UPLOAD_TTL_HOURS and not being processed):
+  their rows are read in id batches, their objects removed with one bulk
+  MinIO request per batch, and the batch deleted in one statement;
+- orphaned temp objects with no upload row, once older than the same TTL.
+
+Batches are UPLOAD_JANITOR_BATCH_SIZE rows or objects, with
+UPLOAD_JANITOR_BATCH_PAUSE seconds between them so a large backlog does not
+load the database or MinIO.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from minio.deleteobjects import DeleteObject
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.core.minio import get_minio_client
+from app.db.session import SessionLocal
+from app.models.knowledge import DocumentUpload, ProcessingTask
+
+logger = logging.getLogger(__name__)
+
+janitor_removed = Counter(
+    "upload_janitor_removed_total",
+    "Expired upload rows deleted and orphaned temp objects removed by the janitor",
+    ("kind",),
+)
+
+
+@dataclass
+class SweepResult:
+    expired_uploads: int = 0
+    orphaned_objects: int = 0
+
+
+class UploadJanitor:
+    def _pause(self) -> None:
+        if settings.UPLOAD_JANITOR_BATCH_PAUSE > 0:
+            time.sleep(settings.UPLOAD_JANITOR_BATCH_PAUSE)
+
+    def _remove_objects(self, client, names: List[str]) -> int:
+        """Remove objects in one request; returns how many were removed"""
+        if not names:
+            return 0
+        # remove_objects is lazy: the request is sent while its errors are read
+        errors = list(client.remove_objects(
+            settings.MINIO_BUCKET_NAME, [DeleteObject(name) for name in names]
+        ))
+        for error in errors:
+            logger.warning(f"Janitor failed to remove {error.name}: {error.message}")
+        return len(names) - len(errors)
+
+    def sweep_expired_uploads(self) -> int:
+        """Delete expired upload rows and their temp objects; returns rows deleted"""
+        cutoff = datetime.utcnow() - timedelta(hours=settings.UPLOAD_TTL_HOURS)
+        client = get_minio_client()
+        in_flight = (
+            select(ProcessingTask.document_upload_id)
+            .where(
+                ProcessingTask.document_upload_id.isnot(None),
+                ProcessingTask.status.in_(("pending", "processing"))
+            )
+        )
+        deleted = 0
+        last_id = 0
+        with SessionLocal() as db:
+            while True:
+                rows = db.execute(
+                    select(DocumentUpload.id, DocumentUpload.temp_path)
+                    .where(
+                        DocumentUpload.id > last_id,
+                        DocumentUpload.created_at < cutoff,
+                        DocumentUpload.id.notin_(in_flight)
+                    )
+                    .order_by(DocumentUpload.id)
+                    .limit(settings.UPLOAD_JANITOR_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                ids = [row.id for row in rows]
+
+                # Re-uploads of a file reuse its temp path; keep objects a
+                # newer upload still points to
+                paths = {row.temp_path for row in rows}
+                paths -= set(db.execute(
+                    select(DocumentUpload.temp_path)
+                    .where(
+                        DocumentUpload.temp_path.in_(paths),
+                        DocumentUpload.id.notin_(ids)
+                    )
+                ).scalars().all())
+                self._remove_objects(client, sorted(paths))
+                # Finished tasks keep their history without the upload
+                db.execute(
+                    update(ProcessingTask)
+                    .where(ProcessingTask.document_upload_id.in_(ids))
+                    .values(document_upload_id=None)
+                    .execution_options(synchronize_session=False)
+                )
+                db.execute(
+                    delete(DocumentUpload)
+                    .where(DocumentUpload.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                deleted += len(ids)
+                janitor_removed.inc(len(ids), kind="upload")
+                self._pause()
+        return deleted
+
+    def sweep_orphaned_objects(self) -> int:
+        """Remove expired kb_*/temp/ objects no upload row points to"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.UPLOAD_TTL_HOURS)
+        client = get_minio_client()
+        removed = 0
+        kb_prefixes = [
+            obj.object_name
+            for obj in client.list_objects(settings.MINIO_BUCKET_NAME, prefix="kb_")
+            if obj.is_dir
+        ]
+        for kb_prefix in kb_prefixes:
+            try:
+                kb_id = int(kb_prefix[len("kb_"):].rstrip("/"))
+            except ValueError:
+                continue
+            # One indexed lookup per knowledge base rather than per object
+            with SessionLocal() as db:
+                referenced = set(db.execute(
+                    select(DocumentUpload.temp_path)
+                    .where(DocumentUpload.knowledge_base_id == kb_id)
+                ).scalars().all())
+
+            batch: List[str] = []
+            objects = client.list_objects(
+                settings.MINIO_BUCKET_NAME, prefix=f"{kb_prefix}temp/", recursive=True
+            )
+            for obj in objects:
+                if obj.object_name in referenced:
+                    continue
+                if obj.last_modified is not None and obj.last_modified > cutoff:
+                    continue
+                batch.append(obj.object_name)
+                if len(batch) >= settings.UPLOAD_JANITOR_BATCH_SIZE:
+                    removed += self._remove_orphans(client, batch)
+                    batch = []
+            if batch:
+                removed += self._remove_orphans(client, batch)
+        return removed
+
+    def _remove_orphans(self, client, names: List[str]) -> int:
+        removed = self._remove_objects(client, names)
+        janitor_removed.inc(removed, kind="orphan")
+        self._pause()
+        return removed
+
+    def sweep(self) -> SweepResult:
+        result = SweepResult()
+        result.expired_uploads = self.sweep_expired_uploads()
+        result.orphaned_objects = self.sweep_orphaned_objects()
+        if result.expired_uploads or result.orphaned_objects:
+            logger.info(
+                f"Upload janitor removed {result.expired_uploads} expired uploads "
+                f"and {result.orphaned_objects} orphaned temp objects"
+            )
+        return result
+
+    async def run(self) -> None:
+        """Sweep every UPLOAD_JANITOR_INTERVAL seconds until cancelled"""
+        while True:
+            await asyncio.sleep(settings.UPLOAD_JANITOR_INTERVAL)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Upload janitor sweep failed: {str(e)}")
+
+
+upload_janitor = UploadJanitor()
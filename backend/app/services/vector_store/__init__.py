@@ -1,11 +1,26 @@
 from .base import BaseVectorStore
-from .chroma import ChromaVectorStore
-from .qdrant import QdrantStore
+from .sharded import ShardedVectorStore
 from .factory import VectorStoreFactory
 
 __all__ = [
     'BaseVectorStore',
     'ChromaVectorStore',
     'QdrantStore',
+    'ShardedVectorStore',
     'VectorStoreFactory'
-] 
\ No newline at end of file
+]
+
+# Store implementations import their client libraries, so they are loaded
+# only when used (see VectorStoreFactory)
+_lazy = {
+    'ChromaVectorStore': '.chroma',
+    'QdrantStore': '.qdrant',
+}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        import importlib
+
+        return getattr(importlib.import_module(_lazy[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,42 +1,352 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Dict, Any, Callable, Sequence, Tuple, TypeVar
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import BaseModel, Field
+from app.core.config import settings
+from app.core.tracing import run_in_context, span
+from .hybrid import bm25_scores, top_k_indices, reciprocal_rank_fusion
+from app.services.retrieval.mmr import maximal_marginal_relevance
+
+T = TypeVar("T")
+
+# Shared, bounded pool for backends without a native async client. Keeping it
+# bounded stops a burst of requests from opening unlimited connections.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.VECTOR_STORE_MAX_WORKERS,
+    thread_name_prefix="vector-store",
+)
+
+
+async def run_in_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking vector store call on the shared thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, run_in_context(partial(func, *args, **kwargs)))
+
+
+def document_key(doc: Document) -> str:
+    """Identity of a retrieved chunk, used to merge result lists"""
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def dedupe_by_id(documents: List[Document]) -> Tuple[List[str], List[Document]]:
+    """Pair documents with their chunk ids, dropping repeated chunks.
+
+    Returns empty ids when any document lacks a chunk id, so the backend
+    falls back to generating its own.
+    """
+    ids = [doc.metadata.get("chunk_id") for doc in documents]
+    if not all(ids):
+        return [], documents
+    unique = dict(zip(ids, documents))
+    return list(unique.keys()), list(unique.values())
+
+
+class StaticListRetriever(BaseRetriever, BaseModel):
+    """Retriever returning a fixed list of already retrieved documents"""
+
+    docs: List[Document] = Field(...)
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        return self.docs
+
+    class Config:
+        arbitrary_types_allowed = True
+
 
 class BaseVectorStore(ABC):
     """Abstract base class for vector store implementations"""
-    
+
+    # Whether similarity_search_with_score returns a distance (lower is
+    # better) rather than a similarity
+    score_is_distance: bool = False
+
     @abstractmethod
     def __init__(self, collection_name: str, embedding_function: Embeddings, **kwargs):
         """Initialize the vector store"""
         pass
-    
+
     @abstractmethod
     def add_documents(self, documents: List[Document]) -> None:
         """Add documents to the vector store"""
         pass
-    
+
     @abstractmethod
     def delete(self, ids: List[str]) -> None:
         """Delete documents from the vector store"""
         pass
-    
+
     @abstractmethod
     def as_retriever(self, **kwargs: Any):
         """Return a retriever interface for the vector store"""
         pass
-    
+
     @abstractmethod
     def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
         """Search for similar documents"""
         pass
-    
+
     @abstractmethod
     def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
         """Search for similar documents with score"""
         pass
 
+    @abstractmethod
+    def hybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
+        """Search combining vector similarity and BM25 keyword scores"""
+        pass
+
+    @abstractmethod
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Run one vector search per embedding, in a single round-trip where supported"""
+        pass
+
+    @abstractmethod
+    def similarity_search_by_vectors_with_embeddings(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float, List[float]]]]:
+        """Like similarity_search_by_vectors, with each hit's stored embedding"""
+        pass
+
+    @abstractmethod
+    def _load_documents(self) -> List[Document]:
+        """Return every document in the collection, used as the BM25 corpus"""
+        pass
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """Names of all collections on the backend"""
+        pass
+
+    @abstractmethod
+    def list_ids(self) -> List[str]:
+        """Ids of every document in the collection"""
+        pass
+
+    @abstractmethod
+    def get_with_embeddings(self, ids: List[str]) -> Tuple[List[Document], List[List[float]]]:
+        """Fetch documents and their stored embeddings by id"""
+        pass
+
+    @abstractmethod
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings: List[List[float]]) -> None:
+        """Upsert documents with precomputed embeddings, without re-embedding"""
+        pass
+
+    def batch_search(
+        self,
+        queries: Sequence[str],
+        k: int = 10,
+        weights: List[float] = [0.4, 0.6],
+        hybrid: bool = True,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Search many queries against the collection at once.
+
+        Queries are embedded in one batch call and sent to the backend as one
+        batched vector search. In hybrid mode the BM25 corpus is loaded once and
+        all queries are scored together, then each query's vector and BM25
+        rankings are merged with weighted Reciprocal Rank Fusion.
+
+        Args:
+            queries: Query strings.
+            k: Number of results per query.
+            weights: Weights for [vector, bm25] rankings.
+            hybrid: Whether to fuse in BM25 results.
+
+        Returns:
+            One list of (Document, score) pairs per query. Scores are backend
+            similarity scores when hybrid is False, fused RRF scores otherwise.
+        """
+        if not queries:
+            return []
+        query_embeddings = self._embedding_function.embed_documents(list(queries))
+        if not hybrid:
+            return self.similarity_search_by_vectors(query_embeddings, k=k)
+        return self._hybrid_search_by_vectors(queries, query_embeddings, k=k, weights=weights)
+
+    def _bm25_search(self, queries: Sequence[str], k: int) -> List[List[Tuple[Document, float]]]:
+        """The k best documents by BM25 for each query, with their scores"""
+        corpus = self._load_documents()
+        scores = bm25_scores([doc.page_content for doc in corpus], queries)
+        return [
+            [(corpus[i], float(row[i])) for i in indices]
+            for row, indices in zip(scores, top_k_indices(scores, k))
+        ]
+
+    def _hybrid_search_by_vectors(
+        self,
+        queries: Sequence[str],
+        query_embeddings: List[List[float]],
+        k: int = 10,
+        weights: List[float] = [0.4, 0.6],
+    ) -> List[List[Tuple[Document, float]]]:
+        """Hybrid search for already embedded queries, fused with weighted RRF"""
+        with span("retrieve.vector", queries=len(queries), k=k):
+            vector_results = self.similarity_search_by_vectors(query_embeddings, k=k)
+        return self._fuse_with_bm25(queries, vector_results, k=k, weights=weights)
+
+    def _fuse_with_bm25(
+        self,
+        queries: Sequence[str],
+        vector_results: List[List[Tuple]],
+        k: int = 10,
+        weights: List[float] = [0.4, 0.6],
+    ) -> List[List[Tuple[Document, float]]]:
+        """Fuse each query's vector hits with its BM25 results by weighted RRF"""
+        with span("retrieve.bm25", queries=len(queries), k=k):
+            bm25_results = self._bm25_search(queries, k)
+        results = []
+        with span("retrieve.fusion", queries=len(queries)):
+            for vector_hits, bm25_hits in zip(vector_results, bm25_results):
+                fused = reciprocal_rank_fusion(
+                    [[hit[0] for hit in vector_hits], [doc for doc, _ in bm25_hits]],
+                    weights,
+                    key=document_key,
+                )
+                results.append(fused[:k])
+        return results
+
+    def mmr_search(
+        self,
+        query: str,
+        k: int = 5,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        weights: List[float] = [0.4, 0.6],
+    ) -> List[Document]:
+        """
+        Hybrid search followed by maximal marginal relevance diversification.
+
+        The query is embedded once and used for the vector leg and for MMR.
+        Vector hits come back with their stored embeddings; candidates found
+        only by BM25 get theirs as in diversify.
+
+        Args:
+            query: Query string.
+            k: Number of documents to return.
+            fetch_k: Size of the hybrid candidate pool MMR selects from.
+            lambda_mult: 1 favours relevance only, 0 favours diversity only.
+            weights: Weights for [vector, bm25] rankings.
+        """
+        query_embedding = self._embedding_function.embed_query(query)
+        with span("retrieve.vector", queries=1, k=fetch_k):
+            vector_hits = self.similarity_search_by_vectors_with_embeddings([query_embedding], k=fetch_k)
+        fused = self._fuse_with_bm25([query], vector_hits, k=fetch_k, weights=weights)[0]
+        candidates = [doc for doc, _ in fused]
+        if len(candidates) <= k:
+            return candidates
+
+        known = {document_key(doc): embedding for doc, _, embedding in vector_hits[0]}
+        selected = maximal_marginal_relevance(
+            query_embedding,
+            self._embeddings_for(candidates, known),
+            k=k,
+            lambda_mult=lambda_mult,
+        )
+        return [candidates[i] for i in selected]
+
+    def diversify(self, documents: List[Document], k: int, lambda_mult: float) -> List[Document]:
+        """
+        Pick k of already ranked documents by maximal marginal relevance.
+
+        Their order (e.g. after reranking) is taken as relevance and their
+        embeddings as redundancy, so the diversity added here is not undone
+        by a later stage.
+        """
+        if len(documents) <= k:
+            return documents
+        selected = maximal_marginal_relevance(
+            None,
+            self._embeddings_for(documents),
+            k=k,
+            lambda_mult=lambda_mult,
+            relevance=[1.0 - rank / len(documents) for rank in range(len(documents))],
+        )
+        return [documents[i] for i in selected]
+
+    def _embeddings_for(
+        self, documents: List[Document], known: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[float]]:
+        """
+        An embedding for every document, in order: from known, else stored
+        under its chunk id, else computed from its text (points written
+        without their chunk id as key are not found by id)
+        """
+        found = dict(known or {})
+        missing = [
+            doc.metadata["chunk_id"] for doc in documents
+            if doc.metadata.get("chunk_id") and document_key(doc) not in found
+        ]
+        if missing:
+            stored_docs, stored_embeddings = self.get_with_embeddings(missing)
+            found.update(
+                (document_key(doc), embedding) for doc, embedding in zip(stored_docs, stored_embeddings)
+            )
+        unembedded = [doc for doc in documents if document_key(doc) not in found]
+        if unembedded:
+            with span("retrieve.mmr.embed", documents=len(unembedded)):
+                computed = self._embedding_function.embed_documents([doc.page_content for doc in unembedded])
+            found.update((document_key(doc), embedding) for doc, embedding in zip(unembedded, computed))
+        return [found[document_key(doc)] for doc in documents]
+
     @abstractmethod
     def delete_collection(self) -> None:
         """Delete the entire collection"""
-        pass 
\ No newline at end of file
+        pass
+
+    # Async variants. Implementations with a native async client override
+    # these; the defaults offload the sync call to the shared thread pool.
+
+    async def aadd_documents(self, documents: List[Document]) -> None:
+        """Add documents to the vector store without blocking the event loop"""
+        await run_in_executor(self.add_documents, documents)
+
+    async def adelete(self, ids: List[str]) -> None:
+        """Delete documents without blocking the event loop"""
+        await run_in_executor(self.delete, ids)
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Search for similar documents with score without blocking the event loop"""
+        return await run_in_executor(self.similarity_search_with_score, query, k=k, **kwargs)
+
+    async def ahybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
+        """Hybrid search without blocking the event loop"""
+        return await run_in_executor(self.hybrid_search, query, k=k, weights=weights)
+
+    async def abatch_search(
+        self,
+        queries: Sequence[str],
+        k: int = 10,
+        weights: List[float] = [0.4, 0.6],
+        hybrid: bool = True,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Batched search without blocking the event loop"""
+        return await run_in_executor(self.batch_search, queries, k=k, weights=weights, hybrid=hybrid)
+
+    async def ammr_search(
+        self,
+        query: str,
+        k: int = 5,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        weights: List[float] = [0.4, 0.6],
+    ) -> List[Document]:
+        """MMR-diversified hybrid search without blocking the event loop"""
+        return await run_in_executor(
+            self.mmr_search, query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, weights=weights
+        )
+
+    async def adiversify(self, documents: List[Document], k: int, lambda_mult: float) -> List[Document]:
+        """MMR over ranked documents without blocking the event loop"""
+        return await run_in_executor(self.diversify, documents, k, lambda_mult)
+
+    async def adelete_collection(self) -> None:
+        """Delete the entire collection without blocking the event loop"""
+        await run_in_executor(self.delete_collection)
@@ -1,11 +1,11 @@
-from typing import List, Any
+from typing import List, Any, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_chroma import Chroma
 import chromadb 
 from app.core.config import settings
 from langchain.schema import BaseRetriever, Document
-from .base import BaseVectorStore
+from .base import BaseVectorStore, StaticListRetriever, dedupe_by_id
 
 
 from langchain.schema import BaseRetriever, Document
@@ -16,23 +16,11 @@ from typing import List
 from langchain.schema import BaseRetriever, Document
 from typing import List
 
-from typing import List
-from langchain.schema import BaseRetriever, Document
-from pydantic import BaseModel, Field
-
-class StaticListRetriever(BaseRetriever, BaseModel):
-    docs: List[Document] = Field(...)
-
-    def get_relevant_documents(self, query: str) -> List[Document]:
-        return self.docs
-
-    class Config:
-        arbitrary_types_allowed = True
-
-
 
 class ChromaVectorStore(BaseVectorStore):
     """Chroma vector store implementation"""
+
+    score_is_distance = True
     
     def __init__(self, collection_name: str, embedding_function: Embeddings, **kwargs):
         """Initialize Chroma vector store"""
@@ -49,12 +37,14 @@ class ChromaVectorStore(BaseVectorStore):
             collection_name=collection_name,
             embedding_function=embedding_function,
         )
+        self._embedding_function = embedding_function
         self._bm25_retriever = None  # Placeholder for BM25 retriever
 
         
     def add_documents(self, documents: List[Document]) -> None:
-        """Add documents to Chroma"""
-        self._store.add_documents(documents)
+        """Add documents to Chroma, keyed by chunk id when available"""
+        ids, documents = dedupe_by_id(documents)
+        self._store.add_documents(documents, ids=ids or None)
     
     def delete(self, ids: List[str]) -> None:
         """Delete documents from Chroma"""
@@ -72,14 +62,84 @@ class ChromaVectorStore(BaseVectorStore):
         """Search for similar documents in Chroma with score"""
         return self._store.similarity_search_with_score(query, k=k, **kwargs)
 
-    def build_bm25_retriever(self, k: int = 10) -> None:
-        """Build BM25 retriever from current documents in the collection."""
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], k: int = 10
+    ) -> List[List[Tuple[Document, float]]]:
+        """Query Chroma with all embeddings in a single request"""
+        result = self._store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            [
+                (Document(page_content=doc, metadata=meta or {}), distance)
+                for doc, meta, distance in zip(docs, metas, distances)
+            ]
+            for docs, metas, distances in zip(
+                result["documents"], result["metadatas"], result["distances"]
+            )
+        ]
+
+    def similarity_search_by_vectors_with_embeddings(
+        self, embeddings: List[List[float]], k: int = 10
+    ) -> List[List[Tuple[Document, float, List[float]]]]:
+        """Query Chroma with all embeddings in a single request, returning stored vectors"""
+        result = self._store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        return [
+            [
+                (Document(page_content=doc, metadata=meta or {}), distance, list(embedding))
+                for doc, meta, distance, embedding in zip(docs, metas, distances, vectors)
+            ]
+            for docs, metas, distances, vectors in zip(
+                result["documents"], result["metadatas"], result["distances"], result["embeddings"]
+            )
+        ]
+
+    def _load_documents(self) -> List[Document]:
+        """Fetch every document in the collection"""
         raw_docs = self._store.get(include=["documents", "metadatas"])
-        documents = [
+        return [
             Document(page_content=doc, metadata=meta)
             for doc, meta in zip(raw_docs["documents"], raw_docs["metadatas"])
         ]
-        self._bm25_retriever = BM25Retriever.from_documents(documents, k=k)
+
+    def list_collections(self) -> List[str]:
+        """Names of all collections on the Chroma server"""
+        return [
+            getattr(collection, "name", collection)
+            for collection in self._store._client.list_collections()
+        ]
+
+    def list_ids(self) -> List[str]:
+        """Ids of every document in the collection"""
+        return self._store.get(include=[])["ids"]
+
+    def get_with_embeddings(self, ids: List[str]) -> Tuple[List[Document], List[List[float]]]:
+        """Fetch documents and their stored embeddings by id"""
+        raw = self._store._collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        documents = [
+            Document(page_content=doc, metadata=meta or {})
+            for doc, meta in zip(raw["documents"], raw["metadatas"])
+        ]
+        return documents, [list(embedding) for embedding in raw["embeddings"]]
+
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings: List[List[float]]) -> None:
+        """Upsert documents with precomputed embeddings"""
+        self._store._collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata or None for doc in documents],
+        )
+
+    def build_bm25_retriever(self, k: int = 10) -> None:
+        """Build BM25 retriever from current documents in the collection."""
+        self._bm25_retriever = BM25Retriever.from_documents(self._load_documents(), k=k)
 
     def hybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
         """
@@ -1,59 +1,63 @@
-from typing import Dict, Type, Any
+from typing import Type, Any, Optional
 from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from app.core.registry import LazyRegistry
 
 from .base import BaseVectorStore
-from .chroma import ChromaVectorStore
-from .qdrant import QdrantStore
+from .sharded import ShardedVectorStore
 
 class VectorStoreFactory:
     """Factory for creating vector store instances"""
-    
-    _stores: Dict[str, Type[BaseVectorStore]] = {
-        'chroma': ChromaVectorStore,
-        'qdrant': QdrantStore
-    }
-    
+
+    # Implementations are imported when first created, so only the
+    # configured store's client library is loaded
+    _stores: LazyRegistry[Type[BaseVectorStore]] = LazyRegistry("vector store type", {
+        'chroma': 'app.services.vector_store.chroma:ChromaVectorStore',
+        'qdrant': 'app.services.vector_store.qdrant:QdrantStore',
+    })
+
     @classmethod
     def create(
         cls,
         store_type: str,
         collection_name: str,
         embedding_function: Embeddings,
+        shards: Optional[int] = None,
         **kwargs: Any
     ) -> BaseVectorStore:
         """Create a vector store instance
-        
+
         Args:
             store_type: Type of vector store ('chroma', 'qdrant', etc.)
             collection_name: Name of the collection
             embedding_function: Embedding function to use
+            shards: Number of backend collections to spread the collection
+                over; defaults to settings.VECTOR_STORE_SHARDS
             **kwargs: Additional arguments for specific vector store implementations
-            
+
         Returns:
             An instance of the requested vector store
-            
+
         Raises:
             ValueError: If store_type is not supported
         """
-        store_class = cls._stores.get(store_type.lower())
-        if not store_class:
-            raise ValueError(
-                f"Unsupported vector store type: {store_type}. "
-                f"Supported types are: {', '.join(cls._stores.keys())}"
-            )
-        
-        return store_class(
+        store_class = cls._stores.get(store_type)
+
+        return ShardedVectorStore(
             collection_name=collection_name,
             embedding_function=embedding_function,
+            store_class=store_class,
+            shard_count=shards or settings.VECTOR_STORE_SHARDS,
             **kwargs
         )
-    
+
     @classmethod
     def register_store(cls, name: str, store_class: Type[BaseVectorStore]) -> None:
         """Register a new vector store implementation
-        
+
         Args:
             name: Name of the vector store type
-            store_class: Vector store class implementation
+            store_class: Vector store class implementation, or its
+                "module:ClassName" path to import on first use
         """
-        cls._stores[name.lower()] = store_class 
\ No newline at end of file
+        cls._stores.register(name, store_class)
@@ -0,0 +1,182 @@
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+def default_tokenize(text: str) -> List[str]:
+    """Whitespace tokenizer, same as BM25Retriever's default preprocess_func"""
+    return text.split()
+
+
+def bm25_scores(
+    corpus: Sequence[str],
+    queries: Sequence[str],
+    k1: float = 1.5,
+    b: float = 0.75,
+    epsilon: float = 0.25,
+    tokenize: Callable[[str], List[str]] = default_tokenize,
+) -> np.ndarray:
+    """
+    Score every query against every document with Okapi BM25 in one pass.
+
+    Produces the same scores as rank_bm25.BM25Okapi.get_scores, but the term
+    frequency matrix is built once for the union of query terms and all queries
+    are scored with a single matrix product.
+
+    Args:
+        corpus: Document texts.
+        queries: Query texts.
+        k1, b, epsilon: BM25Okapi parameters.
+        tokenize: Tokenizer applied to documents and queries.
+
+    Returns:
+        Array of shape (len(queries), len(corpus)).
+    """
+    query_tokens = [tokenize(q) for q in queries]
+    vocab: Dict[str, int] = {}
+    for tokens in query_tokens:
+        for token in tokens:
+            vocab.setdefault(token, len(vocab))
+
+    n_docs = len(corpus)
+    if not n_docs or not vocab:
+        return np.zeros((len(queries), n_docs), dtype=np.float32)
+
+    tf = np.zeros((n_docs, len(vocab)), dtype=np.float32)
+    doc_len = np.empty(n_docs, dtype=np.float32)
+    doc_freq: Counter = Counter()
+    for d, text in enumerate(corpus):
+        tokens = tokenize(text)
+        doc_len[d] = len(tokens)
+        doc_freq.update(set(tokens))
+        for token in tokens:
+            j = vocab.get(token)
+            if j is not None:
+                tf[d, j] += 1
+
+    # IDF over the whole corpus vocabulary so the epsilon floor matches rank_bm25
+    all_idf = {
+        term: np.log(n_docs - freq + 0.5) - np.log(freq + 0.5)
+        for term, freq in doc_freq.items()
+    }
+    floor = epsilon * (sum(all_idf.values()) / len(all_idf)) if all_idf else 0.0
+    idf = np.zeros(len(vocab), dtype=np.float32)
+    for term, j in vocab.items():
+        if term in all_idf:
+            idf[j] = all_idf[term] if all_idf[term] >= 0 else floor
+
+    avgdl = doc_len.mean() or 1.0
+    norm = k1 * (1 - b + b * doc_len / avgdl)
+    weights = idf * (tf * (k1 + 1)) / (tf + norm[:, None])
+
+    query_counts = np.zeros((len(queries), len(vocab)), dtype=np.float32)
+    for i, tokens in enumerate(query_tokens):
+        for token in tokens:
+            query_counts[i, vocab[token]] += 1
+
+    return query_counts @ weights.T
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed corpus with an inverted index, for corpora
+    searched many times: documents are tokenized once, and a query only
+    touches the postings of its own terms. Scores match bm25_scores.
+    """
+
+    def __init__(
+        self,
+        corpus: Sequence[str],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        tokenize: Callable[[str], List[str]] = default_tokenize,
+    ):
+        self.k1 = k1
+        self.tokenize = tokenize
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        doc_len = np.empty(len(corpus), dtype=np.float32)
+        for d, text in enumerate(corpus):
+            tokens = tokenize(text)
+            doc_len[d] = len(tokens)
+            for token, count in Counter(tokens).items():
+                ids, tf = postings.setdefault(token, ([], []))
+                ids.append(d)
+                tf.append(count)
+        self.size = len(corpus)
+        self._postings = {
+            token: (np.asarray(ids), np.asarray(tf, dtype=np.float32))
+            for token, (ids, tf) in postings.items()
+        }
+
+        # Same IDF and epsilon floor as bm25_scores
+        n_docs = self.size
+        idf = {
+            term: float(np.log(n_docs - len(ids) + 0.5) - np.log(len(ids) + 0.5))
+            for term, (ids, _) in self._postings.items()
+        }
+        floor = epsilon * (sum(idf.values()) / len(idf)) if idf else 0.0
+        self._idf = {term: value if value >= 0 else floor for term, value in idf.items()}
+        avgdl = (doc_len.mean() if n_docs else 0.0) or 1.0
+        self._norm = k1 * (1 - b + b * doc_len / avgdl)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token, count in Counter(self.tokenize(query)).items():
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            ids, tf = posting
+            scores[ids] += count * self._idf[token] * (tf * (self.k1 + 1)) / (tf + self._norm[ids])
+        return scores
+
+    def search(self, queries: Sequence[str], k: int) -> List[List[Tuple[int, float]]]:
+        """(document index, score) of the k best documents per query, best first"""
+        if not queries:
+            return []
+        scores = np.stack([self.scores(query) for query in queries])
+        return [
+            [(i, float(row[i])) for i in indices]
+            for row, indices in zip(scores, top_k_indices(scores, k))
+        ]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> List[List[int]]:
+    """Indices of the k highest scores in each row, best first"""
+    if scores.shape[1] == 0:
+        return [[] for _ in range(scores.shape[0])]
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    rows = np.arange(scores.shape[0])[:, None]
+    order = np.argsort(-scores[rows, part], axis=1)
+    return part[rows, order].tolist()
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[T]],
+    weights: Sequence[float],
+    key: Callable[[T], Hashable],
+    c: int = 60,
+) -> List[Tuple[T, float]]:
+    """
+    Weighted Reciprocal Rank Fusion, as used by LangChain's EnsembleRetriever.
+
+    Returns:
+        (item, fused score) pairs sorted by descending score.
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, T] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(ranked, start=1):
+            item_key = key(item)
+            items.setdefault(item_key, item)
+            scores[item_key] = scores.get(item_key, 0.0) + weight / (rank + c)
+    return sorted(
+        ((items[item_key], score) for item_key, score in scores.items()),
+        key=lambda pair: pair[1],
+        reverse=True,
+    )
@@ -1,43 +1,312 @@
-from typing import List, Any
+import uuid
+from functools import lru_cache
+from typing import List, Any, Optional, Set, Tuple
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import Qdrant
+from langchain_community.retrievers import BM25Retriever
+from langchain.retrievers import EnsembleRetriever
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
 from app.core.config import settings
 
-from .base import BaseVectorStore
+from .base import BaseVectorStore, dedupe_by_id
+
+
+# Collections already checked or created by this process
+_known_collections: Set[str] = set()
+
+
+def build_quantization_config(kind: str) -> Optional[models.QuantizationConfig]:
+    """Map a VECTOR_STORE_QUANTIZATION value to Qdrant's quantization config"""
+    kind = kind.lower()
+    if kind == "none":
+        return None
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+    if kind == "product":
+        return models.ProductQuantization(
+            product=models.ProductQuantizationConfig(
+                compression=models.CompressionRatio.X8,
+                always_ram=True,
+            )
+        )
+    raise ValueError(
+        f"Unsupported quantization: {kind}. Supported types are: none, scalar, product"
+    )
+
+
+def to_point_id(document_id: str) -> str:
+    """Qdrant ids must be UUIDs; map chunk ids to a stable UUID"""
+    try:
+        return str(uuid.UUID(document_id))
+    except ValueError:
+        return str(uuid.uuid5(uuid.NAMESPACE_OID, document_id))
+
+
+@lru_cache(maxsize=1)
+def get_qdrant_client() -> QdrantClient:
+    """Process-wide sync Qdrant client, so connections are reused across requests"""
+    return QdrantClient(url=settings.QDRANT_URL, prefer_grpc=settings.QDRANT_PREFER_GRPC)
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Process-wide async Qdrant client"""
+    return AsyncQdrantClient(url=settings.QDRANT_URL, prefer_grpc=settings.QDRANT_PREFER_GRPC)
+
 
 class QdrantStore(BaseVectorStore):
     """Qdrant vector store implementation"""
-    
-    def __init__(self, collection_name: str, embedding_function: Embeddings, **kwargs):
-        """Initialize Qdrant vector store"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding_function: Embeddings,
+        quantization: Optional[str] = None,
+        **kwargs
+    ):
+        """Initialize Qdrant vector store
+
+        Args:
+            quantization: 'none', 'scalar' or 'product'; defaults to
+                settings.VECTOR_STORE_QUANTIZATION. Only applied when the
+                collection is created.
+        """
         self._store = Qdrant(
+            client=get_qdrant_client(),
+            async_client=get_async_qdrant_client(),
             collection_name=collection_name,
             embeddings=embedding_function,
-            url=settings.QDRANT_URL,
-            prefer_grpc=settings.QDRANT_PREFER_GRPC
         )
-    
+        self._embedding_function = embedding_function
+        self._quantization_config = build_quantization_config(
+            quantization or settings.VECTOR_STORE_QUANTIZATION
+        )
+        # Search the quantized index, then re-score the oversampled
+        # candidates with the original vectors kept on disk
+        self._search_params = None
+        if self._quantization_config is not None:
+            self._search_params = models.SearchParams(
+                quantization=models.QuantizationSearchParams(
+                    rescore=True,
+                    oversampling=settings.VECTOR_STORE_RESCORE_OVERSAMPLING,
+                )
+            )
+
+    def _collection_params(self, vector_size: int) -> dict:
+        """Arguments for create_collection with the configured storage mode"""
+        return {
+            "collection_name": self._store.collection_name,
+            "vectors_config": models.VectorParams(
+                size=vector_size,
+                distance=models.Distance.COSINE,
+                on_disk=self._quantization_config is not None,
+            ),
+            "quantization_config": self._quantization_config,
+        }
+
+    def _ensure_collection(self, documents: List[Document]) -> None:
+        """Create the collection with the configured storage mode if missing"""
+        name = self._store.collection_name
+        if name in _known_collections or not documents:
+            return
+        client = self._store.client
+        if not client.collection_exists(name):
+            vector_size = len(self._embedding_function.embed_query(documents[0].page_content))
+            client.create_collection(**self._collection_params(vector_size))
+        _known_collections.add(name)
+
+    async def _aensure_collection(self, documents: List[Document]) -> None:
+        """Async counterpart of _ensure_collection"""
+        name = self._store.collection_name
+        if name in _known_collections or not documents:
+            return
+        client = self._store.async_client
+        if not await client.collection_exists(name):
+            embedding = await self._embedding_function.aembed_query(documents[0].page_content)
+            await client.create_collection(**self._collection_params(len(embedding)))
+        _known_collections.add(name)
+
+    def _search_kwargs(self, kwargs: dict) -> dict:
+        """Add rescoring search params for quantized collections"""
+        if self._search_params is not None:
+            kwargs.setdefault("search_params", self._search_params)
+        return kwargs
+
     def add_documents(self, documents: List[Document]) -> None:
-        """Add documents to Qdrant"""
-        self._store.add_documents(documents)
-    
+        """Add documents to Qdrant, keyed by chunk id when available"""
+        self._ensure_collection(documents)
+        ids, documents = dedupe_by_id(documents)
+        self._store.add_documents(documents, ids=[to_point_id(i) for i in ids] or None)
+
     def delete(self, ids: List[str]) -> None:
         """Delete documents from Qdrant"""
-        self._store.delete(ids)
-    
+        self._store.delete([to_point_id(i) for i in ids])
+
     def as_retriever(self, **kwargs: Any):
         """Return a retriever interface"""
         return self._store.as_retriever(**kwargs)
-    
+
     def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
         """Search for similar documents in Qdrant"""
-        return self._store.similarity_search(query, k=k, **kwargs)
-    
+        return self._store.similarity_search(query, k=k, **self._search_kwargs(kwargs))
+
     def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
         """Search for similar documents in Qdrant with score"""
-        return self._store.similarity_search_with_score(query, k=k, **kwargs)
+        return self._store.similarity_search_with_score(query, k=k, **self._search_kwargs(kwargs))
+
+    def _document_from_point(self, point: Any) -> Document:
+        """Convert a Qdrant point into a LangChain Document"""
+        return self._store._document_from_scored_point(
+            point,
+            self._store.collection_name,
+            self._store.content_payload_key,
+            self._store.metadata_payload_key,
+        )
+
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Run all vector searches in one Qdrant batch request"""
+        return [
+            [(self._document_from_point(point), point.score) for point in response.points]
+            for response in self._query_batch(embeddings, k, with_vectors=False)
+        ]
+
+    def similarity_search_by_vectors_with_embeddings(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float, List[float]]]]:
+        """Batched vector search returning each hit's stored vector"""
+        return [
+            [(self._document_from_point(point), point.score, point.vector) for point in response.points]
+            for response in self._query_batch(embeddings, k, with_vectors=True)
+        ]
+
+    def _query_batch(self, embeddings: List[List[float]], k: int, with_vectors: bool) -> List[Any]:
+        return self._store.client.query_batch_points(
+            collection_name=self._store.collection_name,
+            requests=[
+                models.QueryRequest(
+                    query=embedding,
+                    limit=k,
+                    with_payload=True,
+                    with_vector=with_vectors,
+                    params=self._search_params,
+                )
+                for embedding in embeddings
+            ],
+        )
+
+    def _load_documents(self) -> List[Document]:
+        """Scroll through the whole collection and return its documents"""
+        documents = []
+        offset = None
+        while True:
+            points, offset = self._store.client.scroll(
+                collection_name=self._store.collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            documents.extend(self._document_from_point(point) for point in points)
+            if offset is None:
+                return documents
+
+    def list_collections(self) -> List[str]:
+        """Names of all collections on the Qdrant server"""
+        return [c.name for c in self._store.client.get_collections().collections]
+
+    def list_ids(self) -> List[str]:
+        """Chunk ids of every document in the collection"""
+        key = self._store.metadata_payload_key
+        ids = []
+        offset = None
+        while True:
+            points, offset = self._store.client.scroll(
+                collection_name=self._store.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=[f"{key}.chunk_id"],
+                with_vectors=False,
+            )
+            ids.extend(
+                (point.payload or {}).get(key, {}).get("chunk_id") or str(point.id)
+                for point in points
+            )
+            if offset is None:
+                return ids
+
+    def get_with_embeddings(self, ids: List[str]) -> Tuple[List[Document], List[List[float]]]:
+        """Fetch documents and their stored vectors by chunk id"""
+        points = self._store.client.retrieve(
+            collection_name=self._store.collection_name,
+            ids=[to_point_id(i) for i in ids],
+            with_payload=True,
+            with_vectors=True,
+        )
+        return [self._document_from_point(point) for point in points], [point.vector for point in points]
+
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings: List[List[float]]) -> None:
+        """Upsert documents with precomputed vectors"""
+        name = self._store.collection_name
+        if name not in _known_collections and embeddings:
+            if not self._store.client.collection_exists(name):
+                self._store.client.create_collection(**self._collection_params(len(embeddings[0])))
+            _known_collections.add(name)
+        self._store.client.upsert(
+            collection_name=self._store.collection_name,
+            points=[
+                models.PointStruct(
+                    id=to_point_id(point_id),
+                    vector=embedding,
+                    payload={
+                        self._store.content_payload_key: doc.page_content,
+                        self._store.metadata_payload_key: doc.metadata,
+                    },
+                )
+                for point_id, doc, embedding in zip(ids, documents, embeddings)
+            ],
+        )
+
+    def hybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
+        """Hybrid search combining Qdrant vector similarity and BM25 keyword search"""
+        bm25_retriever = BM25Retriever.from_documents(self._load_documents(), k=k)
+        vector_retriever = self._store.as_retriever(search_kwargs=self._search_kwargs({"k": k}))
+        ensemble = EnsembleRetriever(
+            retrievers=[vector_retriever, bm25_retriever],
+            weights=weights,
+        )
+        return ensemble.invoke(query)
 
     def delete_collection(self) -> None:
         """Delete the entire collection"""
-        self._store._client.delete_collection(self._store._collection_name) 
\ No newline at end of file
+        self._store.client.delete_collection(self._store.collection_name)
+        _known_collections.discard(self._store.collection_name)
+
+    # Native async implementations backed by AsyncQdrantClient
+
+    async def aadd_documents(self, documents: List[Document]) -> None:
+        """Add documents to Qdrant via the async client"""
+        await self._aensure_collection(documents)
+        ids, documents = dedupe_by_id(documents)
+        await self._store.aadd_documents(documents, ids=[to_point_id(i) for i in ids] or None)
+
+    async def adelete(self, ids: List[str]) -> None:
+        """Delete documents from Qdrant via the async client"""
+        await self._store.adelete([to_point_id(i) for i in ids])
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Search for similar documents in Qdrant with score via the async client"""
+        return await self._store.asimilarity_search_with_score(query, k=k, **self._search_kwargs(kwargs))
+
+    async def adelete_collection(self) -> None:
+        """Delete the entire collection via the async client"""
+        await self._store.async_client.delete_collection(self._store.collection_name)
+        _known_collections.discard(self._store.collection_name)
@@ -0,0 +1,443 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Type, TypeVar
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.tracing import run_in_context, span
+from app.db.engine import get_engine
+from .base import BaseVectorStore, dedupe_by_id, document_key, run_in_executor
+from .hybrid import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Fan-out pool, separate from the async executor in base.py so a sharded call
+# running on that executor never waits for a slot in its own pool
+_shard_executor = ThreadPoolExecutor(
+    max_workers=settings.VECTOR_STORE_MAX_WORKERS,
+    thread_name_prefix="vector-shard",
+)
+
+# Layouts, as (collection name, shard count), already checked for leftover
+# shards by this process, and the leftovers still being drained into them
+_checked_layouts: Set[Tuple[str, int]] = set()
+_legacy_collections: Dict[Tuple[str, int], List[str]] = {}
+_lock = threading.Lock()
+
+_REBALANCE_BATCH_SIZE = 500
+
+# BM25 indexes of backend collections, by collection name, as (built at,
+# documents, index). Rebuilt after BM25_INDEX_TTL seconds, or at once when
+# this process writes to the collection.
+_bm25_indexes: Dict[str, Tuple[float, List[Document], BM25Index]] = {}
+_bm25_lock = threading.Lock()
+
+
+def shard_name(collection_name: str, index: int, shard_count: int) -> str:
+    """Collection name of one shard; a single shard keeps the plain name"""
+    if shard_count == 1:
+        return collection_name
+    return f"{collection_name}_s{index}"
+
+
+def shard_index(document_id: str, shard_count: int) -> int:
+    """Stable shard assignment by id hash"""
+    digest = hashlib.md5(document_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def _invalidate_bm25(names: Sequence[str]) -> None:
+    with _bm25_lock:
+        for name in names:
+            _bm25_indexes.pop(name, None)
+
+
+@contextmanager
+def _rebalance_lock(collection_name: str) -> Iterator[bool]:
+    """
+    MySQL named lock held while one process rebalances a collection, so the
+    other workers that notice the same layout change leave it alone. Yields
+    whether the lock was acquired.
+    """
+    name = f"rebalance:{collection_name}"
+    with get_engine().connect() as connection:
+        acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": name}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+
+
+def _routing_id(doc: Document) -> str:
+    """Chunk id of a document, assigning a content hash if it has none"""
+    if not doc.metadata.get("chunk_id"):
+        doc.metadata["chunk_id"] = hashlib.sha256(doc.page_content.encode()).hexdigest()
+    return doc.metadata["chunk_id"]
+
+
+class _ShardedRetriever(BaseRetriever):
+    store: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        return self.store.similarity_search(query, k=self.k)
+
+
+class ShardedVectorStore(BaseVectorStore):
+    """
+    Spreads one logical collection across N backend collections.
+
+    Documents are routed by chunk id hash to `{collection_name}_s{i}`.
+    Searches fan out to every shard in parallel and the per-shard top-k lists
+    are merged; BM25 runs per shard on a cached index. When the shard count
+    changes, collections from the previous layout are still searched while a
+    background rebalance moves their documents (with their stored
+    embeddings) to the current shards.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding_function: Embeddings,
+        store_class: Type[BaseVectorStore],
+        shard_count: int = 1,
+        **kwargs
+    ):
+        """Initialize the shards and start a rebalance if the layout changed"""
+        if shard_count < 1:
+            raise ValueError(f"shard_count must be at least 1, got {shard_count}")
+        self._collection_name = collection_name
+        self._embedding_function = embedding_function
+        self._store_class = store_class
+        self._store_kwargs = kwargs
+        self._shard_count = shard_count
+        self._layout = (collection_name, shard_count)
+        self.score_is_distance = store_class.score_is_distance
+        self._shard_names = [shard_name(collection_name, i, shard_count) for i in range(shard_count)]
+        self._shards = [self._open(name) for name in self._shard_names]
+        self._legacy_names, needs_rebalance = self._find_legacy()
+        self._legacy = [self._open(name) for name in self._legacy_names]
+        if needs_rebalance:
+            _shard_executor.submit(self._rebalance_in_background)
+
+    def _open(self, name: str) -> BaseVectorStore:
+        """Instantiate the backend store for one collection"""
+        return self._store_class(
+            collection_name=name,
+            embedding_function=self._embedding_function,
+            **self._store_kwargs
+        )
+
+    def _find_legacy(self) -> Tuple[List[str], bool]:
+        """
+        Collections left over from a different shard count.
+
+        Returns:
+            The leftover names, and whether this instance is the first in the
+            process to notice them and should start the rebalance.
+        """
+        with _lock:
+            if self._layout in _checked_layouts:
+                return list(_legacy_collections.get(self._layout, [])), False
+            _checked_layouts.add(self._layout)
+
+        current = set(self._shard_names)
+        pattern = re.compile(rf"^{re.escape(self._collection_name)}(_s\d+)?$")
+        try:
+            names = self._shards[0].list_collections()
+        except Exception as e:
+            # Search the current shards only and check again on the next
+            # construction, so a backend hiccup does not fail every caller
+            logger.warning(f"Could not list collections for {self._collection_name}: {e}")
+            with _lock:
+                _checked_layouts.discard(self._layout)
+            return [], False
+        legacy = sorted(n for n in names if pattern.match(n) and n not in current)
+        if not legacy:
+            return [], False
+        with _lock:
+            _legacy_collections[self._layout] = legacy
+        logger.info(
+            f"Collection {self._collection_name} changed to {self._shard_count} shards, "
+            f"rebalancing from {legacy}"
+        )
+        return legacy, True
+
+    def _rebalance_in_background(self) -> None:
+        """Run rebalance, allowing a retry on the next construction if it fails"""
+        try:
+            with _rebalance_lock(self._collection_name) as acquired:
+                if not acquired:
+                    # Another worker is rebalancing; look again on a later
+                    # construction, which finds no leftovers once it is done
+                    logger.info(f"Rebalance of {self._collection_name} is running in another process")
+                    with _lock:
+                        _checked_layouts.discard(self._layout)
+                    return
+                self.rebalance()
+        except Exception as e:
+            logger.error(f"Rebalance of {self._collection_name} failed: {e}")
+            with _lock:
+                _checked_layouts.discard(self._layout)
+
+    def _target(self, document_id: str) -> int:
+        return shard_index(document_id, self._shard_count)
+
+    def _all_stores(self) -> List[BaseVectorStore]:
+        return self._shards + self._legacy
+
+    def _all_names(self) -> List[str]:
+        """Collection names of _all_stores(), in the same order"""
+        return self._shard_names + self._legacy_names
+
+    def _single_store(self) -> Optional[BaseVectorStore]:
+        """The only backing store when unsharded, so calls can go straight to it"""
+        stores = self._all_stores()
+        return stores[0] if len(stores) == 1 else None
+
+    def _fan_out(self, fn: Callable[[Any], T], items: List[Any] = None) -> List[T]:
+        """Call fn on every item (by default every store) in parallel"""
+        items = self._all_stores() if items is None else items
+        if len(items) == 1:
+            return [fn(items[0])]
+        # One context copy per call: a context cannot be entered by two threads
+        futures = [_shard_executor.submit(run_in_context(fn), item) for item in items]
+        return [future.result() for future in futures]
+
+    def _merge(self, hits: List[List[Tuple[Document, float]]], k: int) -> List[Tuple[Document, float]]:
+        merged = [hit for shard_hits in hits for hit in shard_hits]
+        merged.sort(key=lambda hit: hit[1], reverse=not self.score_is_distance)
+        return merged[:k]
+
+    def add_documents(self, documents: List[Document]) -> None:
+        """Route documents to their shard by chunk id"""
+        for doc in documents:
+            _routing_id(doc)
+        ids, documents = dedupe_by_id(documents)
+        groups: Dict[int, List[Document]] = {}
+        for doc_id, doc in zip(ids, documents):
+            groups.setdefault(self._target(doc_id), []).append(doc)
+        self._fan_out(
+            lambda item: self._shards[item[0]].add_documents(item[1]),
+            list(groups.items()),
+        )
+        _invalidate_bm25([self._shard_names[index] for index in groups])
+
+    def delete(self, ids: List[str]) -> None:
+        """Delete ids from their shard, and from any shard being drained"""
+        groups: Dict[int, List[str]] = {}
+        for doc_id in ids:
+            groups.setdefault(self._target(doc_id), []).append(doc_id)
+        for index, shard_ids in groups.items():
+            self._shards[index].delete(shard_ids)
+        for store in self._legacy:
+            store.delete(ids)
+        _invalidate_bm25(self._all_names())
+
+    def as_retriever(self, **kwargs: Any):
+        """Return a retriever that searches all shards"""
+        search_kwargs = kwargs.get("search_kwargs", {})
+        return _ShardedRetriever(store=self, k=search_kwargs.get("k", 4))
+
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Batched vector search on every shard, merged per query"""
+        per_shard = self._fan_out(lambda store: store.similarity_search_by_vectors(embeddings, k=k))
+        return [
+            self._merge([shard_hits[i] for shard_hits in per_shard], k)
+            for i in range(len(embeddings))
+        ]
+
+    def similarity_search_by_vectors_with_embeddings(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float, List[float]]]]:
+        """Batched vector search with stored embeddings on every shard, merged per query"""
+        per_shard = self._fan_out(
+            lambda store: store.similarity_search_by_vectors_with_embeddings(embeddings, k=k)
+        )
+        return [
+            self._merge([shard_hits[i] for shard_hits in per_shard], k)
+            for i in range(len(embeddings))
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Embed once, search every shard in parallel, merge the top k"""
+        if self._single_store():
+            return self._single_store().similarity_search_with_score(query, k=k, **kwargs)
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vectors([embedding], k=k)[0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Search all shards for similar documents"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _load_documents(self) -> List[Document]:
+        """Documents of every shard"""
+        return [doc for docs in self._fan_out(lambda store: store._load_documents()) for doc in docs]
+
+    def _bm25_index(self, store: BaseVectorStore, name: str) -> Tuple[List[Document], BM25Index]:
+        """The cached BM25 index of one backend collection, built if missing or stale"""
+        now = time.monotonic()
+        with _bm25_lock:
+            cached = _bm25_indexes.get(name)
+        if cached is not None and now - cached[0] < settings.BM25_INDEX_TTL:
+            return cached[1], cached[2]
+        with span("retrieve.bm25.index", collection=name):
+            documents = store._load_documents()
+            index = BM25Index([doc.page_content for doc in documents])
+        if settings.BM25_INDEX_TTL > 0:
+            with _bm25_lock:
+                _bm25_indexes[name] = (now, documents, index)
+        return documents, index
+
+    def _bm25_search(self, queries: Sequence[str], k: int) -> List[List[Tuple[Document, float]]]:
+        """
+        BM25 top k of every shard, searched in parallel on cached indexes and
+        merged by score. Each shard scores with its own term statistics,
+        which hash routing keeps close to those of the whole collection.
+        """
+        def search(item: Tuple[BaseVectorStore, str]) -> List[List[Tuple[Document, float]]]:
+            documents, index = self._bm25_index(*item)
+            return [
+                [(documents[i], score) for i, score in hits]
+                for hits in index.search(queries, k)
+            ]
+
+        per_shard = self._fan_out(search, list(zip(self._all_stores(), self._all_names())))
+        results = []
+        for i in range(len(queries)):
+            merged = [hit for shard_hits in per_shard for hit in shard_hits[i]]
+            merged.sort(key=lambda hit: hit[1], reverse=True)
+            results.append(merged[:k])
+        return results
+
+    def hybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
+        """
+        Hybrid search over the merged vector results and the BM25 results of
+        all shards, fused with weighted Reciprocal Rank Fusion. The legs run
+        here rather than in the backend's EnsembleRetriever so each one is
+        timed in its own span.
+        """
+        with span("retrieve.vector", k=k):
+            vector_docs = [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+        with span("retrieve.bm25", k=k):
+            bm25_docs = [doc for doc, _ in self._bm25_search([query], k)[0]]
+        with span("retrieve.fusion"):
+            fused = reciprocal_rank_fusion(
+                [vector_docs, bm25_docs],
+                weights,
+                key=document_key,
+            )
+        return [doc for doc, _ in fused]
+
+    def list_collections(self) -> List[str]:
+        """Names of all collections on the backend"""
+        return self._shards[0].list_collections()
+
+    def list_ids(self) -> List[str]:
+        """Ids of every document across shards"""
+        return [doc_id for ids in self._fan_out(lambda store: store.list_ids()) for doc_id in ids]
+
+    def get_with_embeddings(self, ids: List[str]) -> Tuple[List[Document], List[List[float]]]:
+        """Fetch documents and embeddings by id from whichever shard holds them"""
+        results = self._fan_out(lambda store: store.get_with_embeddings(ids))
+        documents = [doc for docs, _ in results for doc in docs]
+        embeddings = [embedding for _, shard_embeddings in results for embedding in shard_embeddings]
+        return documents, embeddings
+
+    def add_embeddings(self, ids: List[str], documents: List[Document], embeddings: List[List[float]]) -> None:
+        """Route documents with precomputed embeddings to their shard"""
+        groups: Dict[int, Tuple[List[str], List[Document], List[List[float]]]] = {}
+        for doc_id, doc, embedding in zip(ids, documents, embeddings):
+            group = groups.setdefault(self._target(doc_id), ([], [], []))
+            group[0].append(doc_id)
+            group[1].append(doc)
+            group[2].append(embedding)
+        for index, (group_ids, group_docs, group_embeddings) in groups.items():
+            self._shards[index].add_embeddings(group_ids, group_docs, group_embeddings)
+        _invalidate_bm25([self._shard_names[index] for index in groups])
+
+    def rebalance(self) -> int:
+        """
+        Move every document to the shard its id maps to under the current
+        shard count, then drop collections from the previous layout.
+
+        Documents are moved with their stored embeddings, so nothing is
+        re-embedded.
+
+        Returns:
+            Number of documents moved.
+        """
+        moved = 0
+        sources = [(store, None) for store in self._legacy]
+        sources += [(store, index) for index, store in enumerate(self._shards)]
+        for store, index in sources:
+            misplaced = [
+                doc_id for doc_id in store.list_ids()
+                if index is None or self._target(doc_id) != index
+            ]
+            for start in range(0, len(misplaced), _REBALANCE_BATCH_SIZE):
+                batch = misplaced[start:start + _REBALANCE_BATCH_SIZE]
+                documents, embeddings = store.get_with_embeddings(batch)
+                batch_ids = [_routing_id(doc) for doc in documents]
+                self.add_embeddings(batch_ids, documents, embeddings)
+                store.delete(batch)
+                moved += len(batch)
+            if index is None:
+                store.delete_collection()
+
+        with _lock:
+            _legacy_collections.pop(self._layout, None)
+        _invalidate_bm25(self._all_names())
+        self._legacy = []
+        self._legacy_names = []
+        logger.info(f"Rebalanced {self._collection_name} into {self._shard_count} shards, moved {moved} documents")
+        return moved
+
+    # Unsharded collections keep the backend's native async implementation
+
+    async def aadd_documents(self, documents: List[Document]) -> None:
+        store = self._single_store()
+        if store:
+            await store.aadd_documents(documents)
+            _invalidate_bm25(self._all_names())
+            return
+        await run_in_executor(self.add_documents, documents)
+
+    async def adelete(self, ids: List[str]) -> None:
+        store = self._single_store()
+        if store:
+            await store.adelete(ids)
+            _invalidate_bm25(self._all_names())
+            return
+        await run_in_executor(self.delete, ids)
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        store = self._single_store()
+        if store:
+            return await store.asimilarity_search_with_score(query, k=k, **kwargs)
+        return await run_in_executor(self.similarity_search_with_score, query, k=k, **kwargs)
+
+    async def ahybrid_search(self, query: str, k: int = 10, weights: List[float] = [0.4, 0.6]) -> List[Document]:
+        return await run_in_executor(self.hybrid_search, query, k=k, weights=weights)
+
+    def delete_collection(self) -> None:
+        """Delete every shard, including ones still being drained"""
+        self._fan_out(lambda store: store.delete_collection())
+        _invalidate_bm25(self._all_names())
+        with _lock:
+            _checked_layouts.discard(self._layout)
+            _legacy_collections.pop(self._layout, None)
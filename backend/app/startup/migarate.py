@@ -3,12 +3,14 @@ from contextlib import contextmanager
 from pathlib import Path
 from typing import Generator, Tuple
 
+from alembic import command
 from alembic.config import Config
-from alembic.config import main as alembic_main
 from alembic.migration import MigrationContext
-from sqlalchemy import create_engine
+from alembic.script import ScriptDirectory
 from sqlalchemy.engine import Connection
 
+from app.db.engine import get_engine
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,9 +31,7 @@ class DatabaseMigrator:
         Yields:
             SQLAlchemy connection object
         """
-        engine = create_engine(
-            self.db_url, connect_args={"connect_timeout": 3}  # 设置连接超时为3秒
-        )
+        engine = get_engine(self.db_url)
         try:
             with engine.connect() as connection:
                 yield connection
@@ -49,17 +49,17 @@ class DatabaseMigrator:
                 - str: Current revision
                 - str: Head revision
         """
+        # The script heads come from parsing the revision files, and the
+        # current revision from one alembic_version query, so an up-to-date
+        # database costs no more than that at startup
+        heads = set(ScriptDirectory.from_config(self.alembic_cfg).get_heads())
         with self.database_connection() as connection:
             context = MigrationContext.configure(connection)
-            current_rev = context.get_current_revision()
-            heads = context.get_current_heads()
-
-        if not heads:
-            logger.warning("No migration heads found. Database might not be initialized.")
-            return True, current_rev or "None", "head"
+            current = set(context.get_current_heads())
 
-        head_rev = heads[0]
-        return current_rev != head_rev, current_rev or "None", head_rev
+        current_rev = ",".join(sorted(current)) or "None"
+        head_rev = ",".join(sorted(heads)) or "None"
+        return current != heads, current_rev, head_rev
 
     def _get_alembic_config(self) -> Config:
         """
@@ -88,8 +88,10 @@ class DatabaseMigrator:
                 logger.info(f"Current revision: {current_rev}, upgrading to: {head_rev}")
                 self.alembic_cfg.set_main_option("sqlalchemy.url", self.db_url)
 
-                # 执行 alembic 升级
-                alembic_main(argv=["--raiseerr", "upgrade", "head"], config=self.alembic_cfg)
+                # 执行 alembic 升级, on a connection from the shared pool
+                with get_engine(self.db_url).begin() as connection:
+                    self.alembic_cfg.attributes["connection"] = connection
+                    command.upgrade(self.alembic_cfg, "head")
 
                 logger.info("Database migrations completed successfully")
             else:
@@ -0,0 +1,74 @@
+"""
+Readiness of this instance to serve traffic.
+
+Startup registers the steps that must finish before requests are routed
+here (MinIO bucket, migrations, model warmup), runs them in the background
+and records each outcome. /api/health only says the process is up;
+/api/ready answers 200 once every step has finished, so a load balancer
+sends traffic to warm instances only.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    def __init__(self):
+        self._steps: Dict[str, Dict[str, Any]] = {}
+
+    def expect(self, *names: str) -> None:
+        """Register steps that must finish before the instance is ready"""
+        for name in names:
+            self._steps.setdefault(name, {"status": "pending"})
+
+    def succeeded(self, name: str) -> bool:
+        return self._steps.get(name, {}).get("status") == "done"
+
+    async def run(self, name: str, step: Awaitable, required: bool = True) -> bool:
+        """
+        Await step and record its outcome; returns whether it succeeded.
+
+        A failed optional step (required=False) still counts as finished,
+        e.g. a model that could not be warmed is loaded on first use instead.
+        """
+        self.expect(name)
+        start = time.perf_counter()
+        self._steps[name] = {"status": "running"}
+        try:
+            await step
+        except Exception as e:
+            status = "failed" if required else "skipped"
+            logger.error(f"Startup step {name} failed: {str(e)}")
+            self._steps[name] = {
+                "status": status,
+                "error": str(e),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            return False
+        self._steps[name] = {
+            "status": "done",
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        logger.info(f"Startup step {name} finished in {self._steps[name]['seconds']}s")
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return all(step["status"] in ("done", "skipped") for step in self._steps.values())
+
+    def report(self) -> Dict[str, Any]:
+        if self.ready:
+            status = "ready"
+        elif any(step["status"] == "failed" for step in self._steps.values()):
+            status = "failed"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "steps": {name: dict(step) for name, step in self._steps.items()},
+        }
+
+
+readiness = Readiness()
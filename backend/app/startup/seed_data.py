@@ -4,7 +4,6 @@ import hashlib
 from typing import List, Any, Dict
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
 from sqlalchemy.orm import Session
-from langchain_chroma import Chroma
 from sqlalchemy import text
 import logging
 from datetime import datetime, timedelta
@@ -0,0 +1,151 @@
+"""
+Recall / latency trade-off of quantized vector storage in Qdrant.
+
+Loads the same vectors into temporary Qdrant collections created by
+QdrantStore with VECTOR_STORE_QUANTIZATION none, scalar (int8) and product,
+so the collection config and the rescore search params are the ones
+production uses, and compares their top-k against exact cosine search.
+Needs the Qdrant server at QDRANT_URL; the collections are dropped afterwards.
+
+Qdrant only builds the quantized index when it optimizes a segment, which it
+does once a segment holds more than its indexing threshold (20000 vectors by
+default); below that every mode searches the original vectors.
+
+Usage (from the backend directory):
+    python -m benchmarks.quantization_benchmark --kb-id 1
+    python -m benchmarks.quantization_benchmark --synthetic 100000 --dim 768
+"""
+import argparse
+import time
+import uuid
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.embedding.embedding_factory import EmbeddingsFactory
+from app.services.vector_store.qdrant import QdrantStore, models
+
+UPLOAD_BATCH_SIZE = 1000
+
+
+def load_kb_vectors(kb_id: int) -> np.ndarray:
+    """Read every stored embedding of a knowledge base collection"""
+    from app.services.vector_store import VectorStoreFactory
+
+    store = VectorStoreFactory.create(
+        store_type=settings.VECTOR_STORE_TYPE,
+        collection_name=f"kb_{kb_id}",
+        embedding_function=EmbeddingsFactory.create(),
+    )
+    _, vectors = store.get_with_embeddings(store.list_ids())
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 200), dim))
+    labels = rng.integers(0, len(centers), size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale vectors to unit length so inner product equals cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def recall_at_k(found: List[np.ndarray], truth: List[np.ndarray], k: int) -> float:
+    hits = sum(len(np.intersect1d(f[:k], t[:k])) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def build(store: QdrantStore, corpus: np.ndarray) -> float:
+    """Upload the corpus and wait until Qdrant has finished optimizing it"""
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), UPLOAD_BATCH_SIZE):
+        ids = [str(i) for i in range(offset, min(offset + UPLOAD_BATCH_SIZE, len(corpus)))]
+        store.add_embeddings(
+            ids,
+            [Document(page_content="", metadata={"chunk_id": i}) for i in ids],
+            corpus[offset:offset + len(ids)].tolist(),
+        )
+    client = store._store.client
+    while client.get_collection(store._store.collection_name).status != models.CollectionStatus.GREEN:
+        time.sleep(0.5)
+    return time.perf_counter() - start
+
+
+def search(store: QdrantStore, queries: np.ndarray, k: int):
+    """Top-k ids and per-query latencies through the store's search path"""
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        [hits] = store.similarity_search_by_vectors([query.tolist()], k=k)
+        latencies.append(time.perf_counter() - start)
+        found.append(np.array([int(doc.metadata["chunk_id"]) for doc, _ in hits]))
+    return found, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--kb-id", type=int, help="Benchmark the vectors of this knowledge base")
+    source.add_argument("--synthetic", type=int, help="Benchmark N synthetic vectors")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out vectors used as queries")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument(
+        "--oversampling",
+        type=float,
+        default=settings.VECTOR_STORE_RESCORE_OVERSAMPLING,
+        help="Rescore oversampling (VECTOR_STORE_RESCORE_OVERSAMPLING)",
+    )
+    args = parser.parse_args()
+    settings.VECTOR_STORE_RESCORE_OVERSAMPLING = args.oversampling
+
+    vectors = load_kb_vectors(args.kb_id) if args.kb_id else synthetic_vectors(args.synthetic, args.dim)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    n_queries = min(args.queries, len(vectors) // 10 or 1)
+    queries = normalize(vectors[order[:n_queries]])
+    corpus = normalize(vectors[order[n_queries:]])
+    print(f"corpus: {corpus.shape[0]} x {corpus.shape[1]}, queries: {n_queries}, k={args.k}")
+
+    truth = [np.argsort(-(corpus @ query))[:args.k] for query in queries]
+    embeddings = EmbeddingsFactory.create()
+
+    rows = []
+    for quantization in ("none", "scalar", "product"):
+        store = QdrantStore(
+            collection_name=f"bench_quantization_{quantization}_{uuid.uuid4().hex[:8]}",
+            embedding_function=embeddings,
+            quantization=quantization,
+        )
+        try:
+            build_s = build(store, corpus)
+            found, latencies = search(store, queries, args.k)
+        finally:
+            store.delete_collection()
+        rows.append((
+            quantization,
+            recall_at_k(found, truth, args.k),
+            percentile_ms(latencies, 50),
+            percentile_ms(latencies, 95),
+            build_s,
+        ))
+
+    print(f"{'quantization':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'build s':>9}")
+    for name, recall, p50, p95, build_s in rows:
+        print(f"{name:<16}{recall:>10.4f}{p50:>10.2f}{p95:>10.2f}{build_s:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Import time and memory of the application at cold start.
+
+Imports a module (app.main by default) in fresh interpreters and reports
+the median import time, the peak RSS against a bare interpreter, and which
+provider, vector store and loader libraries were loaded. None of these
+should load at import: they are resolved on first use through the lazy
+registries (app/core/registry.py).
+
+With --check the run fails (exit code 1) when a provider library was
+imported or a --max-* budget is exceeded, so it can guard against
+regressions in CI.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --runs 10 --check --max-seconds 3 --max-rss-mb 250
+    python -m benchmarks.startup_benchmark --importtime 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# Libraries only the configured provider, store or file format should need
+HEAVY_MODULES = [
+    "langchain_openai",
+    "langchain_deepseek",
+    "langchain_ollama",
+    "langchain_chroma",
+    "chromadb",
+    "qdrant_client",
+    "langchain_community.vectorstores",
+    "langchain_community.document_loaders",
+    "langchain_community.embeddings",
+    "dashscope",
+    "unstructured",
+    "pypdf",
+    "docx2txt",
+]
+
+CHILD = """
+import json, resource, sys, time
+heavy = json.loads(sys.argv[2])
+start = time.perf_counter()
+if sys.argv[1]:
+    __import__(sys.argv[1])
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "seconds": seconds,
+    "rss": rss,
+    "modules": len(sys.modules),
+    "heavy": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+def rss_mb(value: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return value / 2**20 if sys.platform == "darwin" else value / 2**10
+
+
+def measure(module: str) -> Dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, module, json.dumps(HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_times(module: str, top: int) -> List[str]:
+    """The slowest imports by cumulative time, from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    rows.sort(reverse=True)
+    return [f"{cumulative / 1e6:>8.3f}s  {name}" for cumulative, name in rows[:top]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports")
+    parser.add_argument("--check", action="store_true", help="Fail on provider imports or exceeded budgets")
+    parser.add_argument("--max-seconds", type=float, help="Budget for the median import time")
+    parser.add_argument("--max-rss-mb", type=float, help="Budget for the peak RSS added by the import")
+    args = parser.parse_args()
+
+    bare = measure("")
+    runs = [measure(args.module) for _ in range(args.runs)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    added_rss = statistics.median(rss_mb(run["rss"]) - rss_mb(bare["rss"]) for run in runs)
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+
+    print(f"module: {args.module}, runs: {args.runs}")
+    print(f"import time   median {seconds:.3f}s (min {min(run['seconds'] for run in runs):.3f}s)")
+    print(f"peak RSS      {rss_mb(bare['rss']) + added_rss:.1f} MB ({added_rss:+.1f} MB over a bare interpreter)")
+    print(f"modules       {runs[0]['modules']}")
+    print(f"heavy modules {', '.join(heavy) or 'none'}")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for line in import_times(args.module, args.importtime):
+            print(line)
+
+    if not args.check:
+        return
+    failures = []
+    if heavy:
+        failures.append(f"provider libraries imported at startup: {', '.join(heavy)}")
+    if args.max_seconds is not None and seconds > args.max_seconds:
+        failures.append(f"import time {seconds:.3f}s is over the {args.max_seconds}s budget")
+    if args.max_rss_mb is not None and added_rss > args.max_rss_mb:
+        failures.append(f"RSS {added_rss:.1f} MB is over the {args.max_rss_mb} MB budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ import { useRouter } from "next/navigation";
 import { useChat } from "ai/react";
 import { Send, User, Bot } from "lucide-react";
 import DashboardLayout from "@/components/layout/dashboard-layout";
-import { api, ApiError } from "@/lib/api";
+import { api, ApiError, Page } from "@/lib/api";
 import { useToast } from "@/components/ui/use-toast";
 import { Answer } from "@/components/chat/answer";
 
@@ -23,12 +23,6 @@ interface ChatMessage {
   created_at: string;
 }
 
-interface Chat {
-  id: number;
-  title: string;
-  messages: ChatMessage[];
-}
-
 interface Citation {
   id: number;
   text: string;
@@ -82,8 +76,18 @@ export default function ChatPage({ params }: { params: { id: string } }) {
 
   const fetchChat = async () => {
     try {
-      const data: Chat = await api.get(`/api/chat/${params.id}`);
-      const formattedMessages = data.messages.map((msg) => {
+      // Pages run newest first; messages within a page are oldest first
+      const pages: ChatMessage[][] = [];
+      let cursor: number | null = null;
+      do {
+        const page: Page<ChatMessage> = await api.get(
+          `/api/chat/${params.id}/messages` +
+            (cursor === null ? "" : `?cursor=${cursor}`)
+        );
+        pages.unshift(page.items);
+        cursor = page.next_cursor;
+      } while (cursor !== null);
+      const formattedMessages = pages.flat().map((msg) => {
         if (msg.role !== "assistant" || !msg.content)
           return {
             id: msg.id.toString(),
@@ -31,7 +31,7 @@ export default function NewChatPage() {
   const fetchKnowledgeBases = async () => {
     try {
       const data = await api.get("/api/knowledge-base");
-      setKnowledgeBases(data);
+      setKnowledgeBases(data.items);
       setIsLoading(false);
     } catch (error) {
       console.error("Failed to fetch knowledge bases:", error);
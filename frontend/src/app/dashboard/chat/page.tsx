@@ -11,7 +11,8 @@ interface Chat {
   id: number;
   title: string;
   created_at: string;
-  messages: Message[];
+  message_count: number;
+  last_message: Message | null;
   knowledge_base_ids: number[];
 }
 
@@ -34,7 +35,7 @@ export default function ChatPage() {
   const fetchChats = async () => {
     try {
       const data = await api.get("/api/chat");
-      setChats(data);
+      setChats(data.items);
     } catch (error) {
       console.error("Failed to fetch chats:", error);
       if (error instanceof ApiError) {
@@ -125,20 +126,14 @@ export default function ChatPage() {
                         {chat.title}
                       </h3>
                       <p className="text-sm text-muted-foreground mt-1">
-                        {chat.messages.length} messages •{" "}
+                        {chat.message_count} messages •{" "}
                         {new Date(chat.created_at).toLocaleDateString()}
                       </p>
                     </div>
                   </div>
-                  {chat.messages.length > 0 && (
+                  {chat.last_message && (
                     <p className="text-sm text-muted-foreground mt-4 line-clamp-2">
-                      {chat.messages[chat.messages.length - 1].content.includes(
-                        "__LLM_RESPONSE__"
-                      )
-                        ? chat.messages[chat.messages.length - 1].content.split(
-                            "__LLM_RESPONSE__"
-                          )[1]
-                        : chat.messages[chat.messages.length - 1].content}
+                      {chat.last_message.content}
                     </p>
                   )}
                 </div>
@@ -12,7 +12,7 @@ import {
   Loader2,
 } from "lucide-react";
 import DashboardLayout from "@/components/layout/dashboard-layout";
-import { api, ApiError } from "@/lib/api";
+import { api, ApiError, streamTaskStates, TaskState } from "@/lib/api";
 import { useToast } from "@/components/ui/use-toast";
 
 interface FileStatus {
@@ -44,14 +44,6 @@ interface ProcessingTask {
   task_id: number;
 }
 
-interface TaskStatus {
-  document_id: number | null;
-  status: string;
-  error_message: string | null;
-  upload_id: number;
-  file_name: string;
-}
-
 export default function UploadPage({ params }: { params: { id: string } }) {
   const router = useRouter();
   const [files, setFiles] = useState<FileStatus[]>([]);
@@ -178,64 +170,65 @@ export default function UploadPage({ params }: { params: { id: string } }) {
     }
   };
 
-  const checkProcessingStatus = async () => {
-    if (processingTasks.length === 0) return;
+  useEffect(() => {
+    if (!isProcessing || processingTasks.length === 0) return;
 
-    try {
-      const taskIds = processingTasks.map((t) => t.task_id).join(",");
-      const status: Record<string, TaskStatus> = await api.get(
-        `/api/knowledge-base/${params.id}/documents/tasks?task_ids=${taskIds}`
-      );
+    const controller = new AbortController();
+    const states: Record<number, TaskState> = {};
 
-      let allCompleted = true;
+    const applyState = (state: TaskState) => {
+      states[state.task_id] = state;
       setFiles((prev) =>
         prev.map((f) => {
           const task = processingTasks.find((t) => t.upload_id === f.uploadId);
-          if (task && status[task.task_id]) {
-            const taskStatus = status[task.task_id];
-            if (taskStatus.status !== "completed") {
-              allCompleted = false;
-            }
-            return {
-              ...f,
-              status:
-                taskStatus.status === "completed"
-                  ? "completed"
-                  : taskStatus.status === "failed"
-                  ? "error"
-                  : "processing",
-              documentId: taskStatus.document_id || undefined,
-              error: taskStatus.error_message || undefined,
-            };
-          }
-          return f;
+          if (!task || task.task_id !== state.task_id) return f;
+          return {
+            ...f,
+            status:
+              state.status === "completed"
+                ? "completed"
+                : state.status === "failed"
+                ? "error"
+                : "processing",
+            documentId: state.document_id || undefined,
+            error: state.error_message || undefined,
+          };
         })
       );
+    };
 
-      if (allCompleted) {
+    streamTaskStates(
+      params.id,
+      processingTasks.map((t) => t.task_id),
+      applyState,
+      controller.signal
+    )
+      .then(() => {
+        if (controller.signal.aborted) return;
         setIsProcessing(false);
-        setShowSuccessModal(true);
-        toast({
-          title: "Success",
-          description: "All files have been processed successfully",
-          duration: Infinity,
-        });
-      }
-    } catch (error) {
-      console.error("Failed to check processing status:", error);
-    }
-  };
+        const allCompleted = processingTasks.every(
+          (t) => states[t.task_id]?.status === "completed"
+        );
+        if (allCompleted) {
+          setShowSuccessModal(true);
+          toast({
+            title: "Success",
+            description: "All files have been processed successfully",
+            duration: Infinity,
+          });
+        } else {
+          toast({
+            title: "Processing completed with errors",
+            description: "Some files failed to process.",
+            variant: "destructive",
+          });
+        }
+      })
+      .catch((error) => {
+        console.error("Failed to follow processing status:", error);
+      });
 
-  useEffect(() => {
-    let interval: NodeJS.Timeout;
-    if (isProcessing) {
-      interval = setInterval(checkProcessingStatus, 2000);
-    }
-    return () => {
-      if (interval) {
-        clearInterval(interval);
-      }
-    };
+    return () => controller.abort();
   }, [isProcessing, processingTasks]);
 
   const removeFile = (file: File) => {
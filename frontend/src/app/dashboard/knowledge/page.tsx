@@ -12,19 +12,15 @@ interface KnowledgeBase {
   id: number;
   name: string;
   description: string;
-  documents: Document[];
+  document_count: number;
+  recent_documents: Document[];
   created_at: string;
 }
 interface Document {
   id: number;
   file_name: string;
-  file_path: string;
-  file_size: number;
   content_type: string;
-  knowledge_base_id: number;
   created_at: string;
-  updated_at: string;
-  processing_tasks: any[];
 }
 
 export default function KnowledgeBasePage() {
@@ -39,7 +35,7 @@ export default function KnowledgeBasePage() {
   const fetchKnowledgeBases = async () => {
     try {
       const data = await api.get("/api/knowledge-base");
-      setKnowledgeBases(data);
+      setKnowledgeBases(data.items);
     } catch (error) {
       console.error("Failed to fetch knowledge bases:", error);
       if (error instanceof ApiError) {
@@ -110,7 +106,7 @@ export default function KnowledgeBasePage() {
                     {kb.description || "No description"}
                   </p>
                   <p className="text-sm text-muted-foreground mt-1">
-                    {kb.documents.length} documents •{" "}
+                    {kb.document_count} documents •{" "}
                     {new Date(kb.created_at).toLocaleDateString()}
                   </p>
                 </div>
@@ -137,11 +133,11 @@ export default function KnowledgeBasePage() {
                 </div>
               </div>
 
-              {kb.documents.length > 0 && (
+              {kb.recent_documents.length > 0 && (
                 <div className="border-t pt-4">
                   <h4 className="text-sm font-medium mb-2">Documents</h4>
                   <div className="flex flex-wrap gap-2 max-h-[400px] overflow-y-auto">
-                    {kb.documents.slice(0, 9).map((doc) => (
+                    {kb.recent_documents.map((doc) => (
                       <div
                         key={doc.id}
                         className="flex flex-col items-center gap-2 p-2 rounded-lg border bg-card hover:bg-accent/50 cursor-pointer transition-colors w-[150px] h-[150px] justify-center"
@@ -173,7 +169,7 @@ export default function KnowledgeBasePage() {
                         </span>
                       </div>
                     ))}
-                    {kb.documents.length > 9 && (
+                    {kb.document_count > kb.recent_documents.length && (
                       <Link
                         href={`/dashboard/knowledge/${kb.id}`}
                         className="flex flex-col items-center p-2 rounded-lg border bg-card hover:bg-accent/50 cursor-pointer transition-colors w-[150px] h-[150px] justify-center"
@@ -185,7 +181,7 @@ export default function KnowledgeBasePage() {
                           View All Documents
                         </span>
                         <span className="text-xs text-muted-foreground mt-1">
-                          {kb.documents.length} total
+                          {kb.document_count} total
                         </span>
                       </Link>
                     )}
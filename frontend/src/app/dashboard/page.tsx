@@ -44,8 +44,8 @@ export default function DashboardPage() {
         ]);
 
         setStats({
-          knowledgeBases: kbData.length,
-          chats: chatData.length,
+          knowledgeBases: kbData.items.length,
+          chats: chatData.items.length,
         });
       } catch (error) {
         console.error("Failed to fetch stats:", error);
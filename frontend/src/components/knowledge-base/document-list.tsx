@@ -3,7 +3,7 @@
 import { useEffect, useState } from "react";
 import { Badge } from "@/components/ui/badge";
 import { formatDistanceToNow } from "date-fns";
-import { api, ApiError } from "@/lib/api";
+import { ApiError, fetchAllPages } from "@/lib/api";
 import { FileIcon, defaultStyles } from "react-file-icon";
 import {
   Table,
@@ -29,13 +29,6 @@ interface Document {
   }>;
 }
 
-interface KnowledgeBase {
-  id: number;
-  name: string;
-  description: string;
-  documents: Document[];
-}
-
 interface DocumentListProps {
   knowledgeBaseId: number;
 }
@@ -48,8 +41,10 @@ export function DocumentList({ knowledgeBaseId }: DocumentListProps) {
   useEffect(() => {
     const fetchDocuments = async () => {
       try {
-        const data = await api.get(`/api/knowledge-base/${knowledgeBaseId}`);
-        setDocuments(data.documents);
+        const data = await fetchAllPages<Document>(
+          `/api/knowledge-base/${knowledgeBaseId}/documents`
+        );
+        setDocuments(data);
       } catch (error) {
         if (error instanceof ApiError) {
           setError(error.message);
@@ -11,7 +11,7 @@ import { Label } from "@/components/ui/label";
 import { useToast } from "@/components/ui/use-toast";
 import { Loader2, Upload, X, Settings, FileText } from "lucide-react";
 import { cn } from "@/lib/utils";
-import { api, ApiError } from "@/lib/api";
+import { api, ApiError, streamTaskStates } from "@/lib/api";
 import { useDropzone } from "react-dropzone";
 import {
   Select,
@@ -84,10 +84,6 @@ interface TaskStatusMap {
   [key: number]: TaskStatus;
 }
 
-interface TaskStatusResponse {
-  [key: string]: TaskStatus;
-}
-
 export function DocumentUploadSteps({
   knowledgeBaseId,
   onComplete,
@@ -282,66 +278,45 @@ export function DocumentUploadSteps({
     }
   };
 
-  // Poll task status
+  // Follow task status over the server's event stream
   const pollTaskStatus = async (taskIds: number[]) => {
-    const poll = async () => {
-      try {
-        const response = (await api.get(
-          `/api/knowledge-base/${knowledgeBaseId}/documents/tasks?task_ids=${taskIds.join(
-            ","
-          )}`
-        )) as TaskStatusResponse;
-
-        // Convert string keys to numbers
-        const data = Object.entries(response).reduce<TaskStatusMap>(
-          (acc, [key, value]) => ({
-            ...acc,
-            [parseInt(key)]: value,
-          }),
-          {}
-        );
-
-        setTaskStatuses(data);
-
-        // Check if all tasks are completed or failed
-        const allDone = Object.values(data).every(
-          (task) => task.status === "completed" || task.status === "failed"
-        );
-
-        if (allDone) {
-          setIsLoading(false);
-          const hasErrors = Object.values(data).some(
-            (task) => task.status === "failed"
-          );
-          if (!hasErrors) {
-            toast({
-              title: "Processing completed",
-              description: "All documents have been processed successfully.",
-            });
-            onComplete?.();
-          } else {
-            toast({
-              title: "Processing completed with errors",
-              description: "Some documents failed to process.",
-              variant: "destructive",
-            });
-          }
-        } else {
-          // Continue polling
-          setTimeout(poll, 2000);
-        }
-      } catch (error) {
-        setIsLoading(false);
+    const data: TaskStatusMap = {};
+    try {
+      await streamTaskStates(knowledgeBaseId, taskIds, (state) => {
+        data[state.task_id] = {
+          document_id: state.document_id as number,
+          status: state.status as TaskStatus["status"],
+          error_message: state.error_message || undefined,
+        };
+        setTaskStatuses({ ...data });
+      });
+
+      setIsLoading(false);
+      const hasErrors = Object.values(data).some(
+        (task) => task.status === "failed"
+      );
+      if (!hasErrors) {
+        toast({
+          title: "Processing completed",
+          description: "All documents have been processed successfully.",
+        });
+        onComplete?.();
+      } else {
         toast({
-          title: "Status check failed",
-          description:
-            error instanceof ApiError ? error.message : "Something went wrong",
+          title: "Processing completed with errors",
+          description: "Some documents failed to process.",
           variant: "destructive",
         });
       }
-    };
-
-    poll();
+    } catch (error) {
+      setIsLoading(false);
+      toast({
+        title: "Status check failed",
+        description:
+          error instanceof ApiError ? error.message : "Something went wrong",
+        variant: "destructive",
+      });
+    }
   };
 
   const handleProcessClick = (e: React.MouseEvent) => {
@@ -92,3 +92,83 @@ export const api = {
   patch: (url: string, data?: any, options?: Omit<FetchOptions, 'method'>) =>
     fetchApi(url, { ...options, method: 'PATCH', data }),
 };
+
+export interface Page<T> {
+  items: T[];
+  next_cursor: number | null;
+}
+
+// Follow next_cursor until the last page of a paginated endpoint
+export async function fetchAllPages<T>(url: string): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: number | null = null;
+  do {
+    const separator = url.includes('?') ? '&' : '?';
+    const page: Page<T> = await api.get(
+      cursor === null ? url : `${url}${separator}cursor=${cursor}`
+    );
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor !== null);
+  return items;
+}
+
+export interface TaskState {
+  task_id: number;
+  document_id: number | null;
+  status: string;
+  error_message: string | null;
+  upload_id: number | null;
+  file_name: string | null;
+  stage: string | null;
+  progress: number | null;
+}
+
+// Follow processing tasks over server-sent events. fetch is used instead of
+// EventSource so the Authorization header can be sent. Resolves once every
+// task has completed or failed, or when signal is aborted.
+export async function streamTaskStates(
+  knowledgeBaseId: number | string,
+  taskIds: number[],
+  onState: (state: TaskState) => void,
+  signal?: AbortSignal
+): Promise<void> {
+  const token =
+    typeof window !== 'undefined' ? localStorage.getItem('token') || '' : '';
+  const response = await fetch(
+    `/api/knowledge-base/${knowledgeBaseId}/documents/tasks/stream?task_ids=${taskIds.join(',')}`,
+    {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      signal,
+    }
+  );
+  if (!response.ok || !response.body) {
+    throw new ApiError(response.status, 'Failed to follow processing status');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) return;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const lines = block.split('\n');
+        const event = lines.find((l) => l.startsWith('event: '))?.slice(7);
+        const data = lines.find((l) => l.startsWith('data: '))?.slice(6);
+        if (event === 'done') return;
+        if (event === 'task' && data) onState(JSON.parse(data));
+      }
+    }
+  } catch (error) {
+    if (signal?.aborted) return;
+    throw error;
+  } finally {
+    reader.releaseLock();
+  }
+}